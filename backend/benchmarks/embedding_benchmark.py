@@ -0,0 +1,98 @@
+"""Benchmark embedding backends: document throughput and query-embed latency.
+
+Usage (from the backend directory):
+    python benchmarks/embedding_benchmark.py --model local:sentence-transformers/all-MiniLM-L6-v2
+    python benchmarks/embedding_benchmark.py --model text-embedding-ada-002 --chunks 200
+    python benchmarks/embedding_benchmark.py --model text-embedding-ada-002 --batch-queries --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_backends import create_embeddings
+from services.embedding_batcher import QueryEmbeddingBatcher
+
+SAMPLE_TEXT = (
+    "Apple reported quarterly revenue of $89.5 billion, down 1 percent year over year, "
+    "while services revenue reached an all-time high. The company returned over $25 billion "
+    "to shareholders during the quarter through dividends and share repurchases. "
+)
+
+def make_chunks(count: int, size: int):
+    """Build distinct synthetic chunks of roughly ``size`` characters"""
+    base = (SAMPLE_TEXT * (size // len(SAMPLE_TEXT) + 1))[:size]
+    return [f"[{i}] {base}" for i in range(count)]
+
+def benchmark_documents(embeddings, chunks):
+    """Measure bulk document embedding throughput"""
+    start = time.perf_counter()
+    embeddings.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+    return len(chunks) / elapsed, elapsed
+
+async def benchmark_queries(embed_query, queries: int, concurrency: int):
+    """Measure query-embed latency with ``concurrency`` callers in flight"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await embed_query(f"What was Apple's revenue in quarter {i}?")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "queries_per_sec": queries / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "max_ms": latencies[-1]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--model", default=None, help="Embedding model (defaults to EMBEDDING_MODEL)")
+    parser.add_argument("--chunks", type=int, default=1000, help="Number of document chunks")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Characters per chunk")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query embeds")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent query callers")
+    parser.add_argument("--batch-queries", action="store_true", help="Route query embeds through the query batcher")
+    parser.add_argument("--batch-size", type=int, default=32, help="Query batcher max batch size")
+    parser.add_argument("--batch-wait-ms", type=float, default=3.0, help="Query batcher window")
+    args = parser.parse_args()
+
+    embeddings = create_embeddings(args.model)
+
+    # Warm up so model loading is not counted
+    embeddings.embed_query("warmup")
+
+    throughput, elapsed = benchmark_documents(embeddings, make_chunks(args.chunks, args.chunk_size))
+    print(f"Documents: {args.chunks} chunks in {elapsed:.2f}s -> {throughput:.1f} chunks/sec")
+
+    batcher = None
+    embed_query = embeddings.aembed_query
+    if args.batch_queries:
+        batcher = QueryEmbeddingBatcher(embeddings, args.batch_size, args.batch_wait_ms)
+        embed_query = batcher.embed
+
+    results = asyncio.run(benchmark_queries(embed_query, args.queries, args.concurrency))
+    print(
+        f"Queries (concurrency={args.concurrency}): {results['queries_per_sec']:.1f} q/s, "
+        f"p50={results['p50_ms']:.1f}ms p95={results['p95_ms']:.1f}ms max={results['max_ms']:.1f}ms"
+    )
+
+    if batcher is not None:
+        print(f"Batcher stats: {batcher.get_stats()}")
+    if hasattr(embeddings, "get_stats"):
+        print(f"Backend stats: {embeddings.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Profile cold start: per-module import time and time until /health answers.
+
+Usage (from the backend directory):
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --top 30 --port 8765
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profile_imports(module: str):
+    """Import ``module`` under ``-X importtime`` and parse the per-module timings"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented under the module that triggered them
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+def time_to_health(port: int, timeout: float) -> float:
+    """Start the API with uvicorn and measure seconds until /health responds"""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile API cold start")
+    parser.add_argument("--module", default="main", help="Module to profile imports for")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to show")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the /health measurement")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for /health")
+    parser.add_argument("--skip-server", action="store_true", help="Only profile imports")
+    args = parser.parse_args()
+
+    timings = profile_imports(args.module)
+    total_us = next((cumulative for name, _, cumulative in timings if name == args.module), 0)
+    print(f"Import of {args.module}: {total_us / 1000:.1f}ms cumulative, {len(timings)} modules")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(timings, key=lambda t: t[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    if not args.skip_server:
+        elapsed = time_to_health(args.port, args.timeout)
+        print(f"Time from process start to /health: {elapsed * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
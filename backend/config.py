@@ -20,6 +20,16 @@ class Config:
     
     # MCP Server Configuration
     MCP_SERVER_URL: str = os.getenv("MCP_SERVER_URL", "http://localhost:3001")
+    MCP_POOL_SIZE: int = int(os.getenv("MCP_POOL_SIZE", "20"))
+    MCP_KEEPALIVE_SECONDS: float = float(os.getenv("MCP_KEEPALIVE_SECONDS", "30"))
+    MCP_CONNECT_TIMEOUT: float = float(os.getenv("MCP_CONNECT_TIMEOUT", "2"))
+    # Deadline for a tool call, retries included, when the tool has no entry in TOOL_TIMEOUTS
+    MCP_TOOL_TIMEOUT: float = float(os.getenv("MCP_TOOL_TIMEOUT", "5"))
+    MCP_MAX_RETRIES: int = int(os.getenv("MCP_MAX_RETRIES", "2"))
+    MCP_RETRY_BASE_DELAY: float = float(os.getenv("MCP_RETRY_BASE_DELAY", "0.2"))
+    MCP_BREAKER_FAILURES: int = int(os.getenv("MCP_BREAKER_FAILURES", "5"))
+    MCP_BREAKER_RESET_SECONDS: float = float(os.getenv("MCP_BREAKER_RESET_SECONDS", "30"))
+    MCP_RECONNECT_INTERVAL_SECONDS: float = float(os.getenv("MCP_RECONNECT_INTERVAL_SECONDS", "30"))
     
     # Application Configuration
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
@@ -40,9 +50,103 @@ class Config:
     # RAG Configuration
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    CHUNK_LENGTH_UNIT: str = os.getenv("CHUNK_LENGTH_UNIT", "chars")  # "chars" or "tokens"
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
     
+    # Local Embedding Backend Configuration (used when EMBEDDING_MODEL is not an OpenAI model)
+    EMBEDDING_DEVICE: str = os.getenv("EMBEDDING_DEVICE", "cpu")
+    EMBEDDING_RUNTIME: str = os.getenv("EMBEDDING_RUNTIME", "torch")  # "torch" or "onnx"
+    EMBEDDING_QUANTIZE: bool = os.getenv("EMBEDDING_QUANTIZE", "False").lower() == "true"
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    
+    # Chat Routing Configuration
+    INTENT_ROUTING_ENABLED: bool = os.getenv("INTENT_ROUTING_ENABLED", "True").lower() == "true"
+    CHAT_ENRICHMENT_ENABLED: bool = os.getenv("CHAT_ENRICHMENT_ENABLED", "True").lower() == "true"
+    # Per-source deadlines (seconds) when enriching answers with live data
+    ENRICH_QUOTE_TIMEOUT: float = float(os.getenv("ENRICH_QUOTE_TIMEOUT", "2"))
+    ENRICH_RECOMMENDATION_TIMEOUT: float = float(os.getenv("ENRICH_RECOMMENDATION_TIMEOUT", "4"))
+    ENRICH_NEWS_TIMEOUT: float = float(os.getenv("ENRICH_NEWS_TIMEOUT", "3"))
+    ENRICH_RAG_TIMEOUT: float = float(os.getenv("ENRICH_RAG_TIMEOUT", "20"))
+    
+    # Query Embedding Batching Configuration
+    QUERY_EMBED_BATCHING: bool = os.getenv("QUERY_EMBED_BATCHING", "True").lower() == "true"
+    QUERY_EMBED_BATCH_SIZE: int = int(os.getenv("QUERY_EMBED_BATCH_SIZE", "32"))
+    QUERY_EMBED_BATCH_WAIT_MS: float = float(os.getenv("QUERY_EMBED_BATCH_WAIT_MS", "3"))
+    
+    # Query Concurrency Configuration
+    MAX_INFLIGHT_LLM_CALLS: int = int(os.getenv("MAX_INFLIGHT_LLM_CALLS", "32"))
+    RETRIEVAL_WORKERS: int = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+    
+    # Ingestion Configuration
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    INGEST_CONCURRENCY: int = int(os.getenv("INGEST_CONCURRENCY", "4"))
+    
+    # Vector Store Configuration
+    COLLECTION_NAME: str = os.getenv("COLLECTION_NAME", "finance_knowledge")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_CONSTRUCTION_EF: int = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+    HNSW_SEARCH_EF: int = int(os.getenv("HNSW_SEARCH_EF", "10"))
+    
+    # Hybrid Retrieval Configuration
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "True").lower() == "true"
+    HYBRID_VECTOR_WEIGHT: float = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_KEYWORD_WEIGHT: float = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "1.0"))
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    KEYWORD_INDEX_PATH: str = os.getenv("KEYWORD_INDEX_PATH", "./data/keyword_index.pkl")
+    KEYWORD_MAX_POSTINGS: int = int(os.getenv("KEYWORD_MAX_POSTINGS", "20000"))
+    
+    # Index Maintenance Configuration
+    INDEX_MAINTENANCE_INTERVAL_SECONDS: int = int(os.getenv("INDEX_MAINTENANCE_INTERVAL_SECONDS", "300"))
+    KEYWORD_INDEX_COMPACT_RATIO: float = float(os.getenv("KEYWORD_INDEX_COMPACT_RATIO", "0.2"))
+    DOCUMENT_RETENTION_DAYS: float = float(os.getenv("DOCUMENT_RETENTION_DAYS", "0"))
+    
+    # Rerank Configuration
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS: float = float(os.getenv("RERANK_BUDGET_MS", "150"))
+    
+    # Context Assembly Configuration (0 = budget derived from LLM_MODEL)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+    
+    # Embedding Cache Configuration
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+    
+    # Conversation Memory Configuration
+    CONVERSATION_DATA_DIR: str = os.getenv("CONVERSATION_DATA_DIR", "./data/conversations")
+    CONVERSATION_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+    CONVERSATION_SUMMARIZE: bool = os.getenv("CONVERSATION_SUMMARIZE", "True").lower() == "true"
+    CONVERSATION_IDLE_SECONDS: int = int(os.getenv("CONVERSATION_IDLE_SECONDS", "900"))
+    CONVERSATION_MAX_IN_MEMORY: int = int(os.getenv("CONVERSATION_MAX_IN_MEMORY", "1000"))
+    
+    # Semantic Answer Cache Configuration
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+    
+    # WebSocket Configuration
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "1024"))
+    # What to do when a client's send queue is full: drop_oldest, coalesce or disconnect
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+    # Chat requests answered at once per connection, and whether a new message cancels the
+    # one still being answered in the same conversation
+    WS_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("WS_MAX_CONCURRENT_REQUESTS", "4"))
+    WS_CANCEL_ON_NEW_MESSAGE: bool = os.getenv("WS_CANCEL_ON_NEW_MESSAGE", "True").lower() == "true"
+    # Compress frames for clients that negotiate permessage-deflate
+    WS_PER_MESSAGE_DEFLATE: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "True").lower() == "true"
+    # Cross-worker fan-out: none, redis (uses REDIS_URL) or memory (single process, for tests)
+    WS_BACKPLANE: str = os.getenv("WS_BACKPLANE", "none").lower()
+    WS_BACKPLANE_CHANNEL: str = os.getenv("WS_BACKPLANE_CHANNEL", "ws:fanout")
+    WS_BACKPLANE_BATCH_SIZE: int = int(os.getenv("WS_BACKPLANE_BATCH_SIZE", "100"))
+    WS_BACKPLANE_BATCH_WAIT_MS: float = float(os.getenv("WS_BACKPLANE_BATCH_WAIT_MS", "2"))
+    
     # Cache Configuration
     CACHE_DURATION_MINUTES: int = int(os.getenv("CACHE_DURATION_MINUTES", "5"))
     
@@ -1,25 +1,45 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import uvicorn
 import asyncio
-import json
 from typing import List, Dict, Any
 import logging
 
+from config import Config
 from routers import chat, news, stocks, rag
 from services.websocket_manager import ConnectionManager
-from services.news_scraper import NewsScraper
-from services.rag_service import RAGService
+from services.backplane import create_backplane
+from services.chat_session import ChatSession
+from services.wire_format import negotiate
+from services.container import container
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Attach the WebSocket backplane, warm services up in the background and release both on shutdown"""
+    logger.info("Starting Finance RAG Chatbot...")
+    backplane = create_backplane()
+    if backplane is not None:
+        await manager.attach_backplane(backplane)
+    warmup_task = asyncio.create_task(
+        container.warmup([stock["symbol"] for stock in stocks.POPULAR_STOCKS])
+    )
+    yield
+    logger.info("Shutting down Finance RAG Chatbot...")
+    warmup_task.cancel()
+    await manager.detach_backplane()
+    await container.close()
+
 app = FastAPI(
     title="Finance RAG Chatbot",
     description="A comprehensive RAG-powered finance chatbot with real-time news and stock analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -34,22 +54,6 @@ app.add_middleware(
 # WebSocket connection manager
 manager = ConnectionManager()
 
-# Initialize services
-news_scraper = NewsScraper()
-rag_service = RAGService()
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize services on startup"""
-    logger.info("Starting Finance RAG Chatbot...")
-    await rag_service.initialize()
-    logger.info("Services initialized successfully")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on shutdown"""
-    logger.info("Shutting down Finance RAG Chatbot...")
-
 # Include routers
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(news.router, prefix="/api/news", tags=["news"])
@@ -70,35 +74,42 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "services": ["rag", "news", "stocks"]}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 503 until the RAG service is initialized and warmup has run"""
+    status = container.get_status()
+    if not status["ready"]:
+        state = "failed" if status["warmup_error"] else "warming_up"
+        return JSONResponse(status_code=503, content={"status": state, **status})
+    return {"status": "ready", **status}
+
 @app.websocket("/ws/chat")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time chat"""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time chat.
+    
+    Frames are JSON text by default. Clients that offer the ``msgpack``
+    subprotocol (or connect with ``?format=msgpack``) get MessagePack binary
+    frames instead, and may send them too. Frames are objects:
+    ``{"message": ..., "conversation_id": ..., "stream": ..., "request_id": ...}``
+    asks a question; ``{"type": "cancel", "request_id": ...}`` stops one (or all,
+    without an id) and ``{"type": "ping"}`` gets a pong. Questions without a
+    conversation_id start a new conversation, whose id comes back in every reply.
+    """
+    # Resolve services before accepting, so a failure here never leaves a
+    # registered connection and writer behind
+    router = await container.get_intent_router()
+    wire_format, subprotocol = negotiate(websocket)
+    await manager.connect(websocket, wire_format=wire_format, subprotocol=subprotocol)
     try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            # Process message through RAG service
-            response = await rag_service.process_query(message.get("message", ""))
-            
-            # Send response back to client
-            await manager.send_personal_message(
-                json.dumps({
-                    "type": "response",
-                    "message": response,
-                    "timestamp": asyncio.get_event_loop().time()
-                }),
-                websocket
-            )
+        await ChatSession(websocket, manager, router).run()
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        await manager.send_personal_message(
-            json.dumps({"type": "error", "message": "An error occurred"}),
-            websocket
-        )
+        await manager.send_personal_json({"type": "error", "message": "An error occurred"}, websocket)
+        await manager.close(websocket)
+    finally:
+        manager.disconnect(websocket)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -106,5 +117,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=Config.WS_PER_MESSAGE_DEFLATE
     ) 
\ No newline at end of file
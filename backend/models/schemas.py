@@ -15,6 +15,14 @@ class ChatMessage(BaseModel):
     timestamp: Optional[datetime] = None
     metadata: Optional[Dict[str, Any]] = None
 
+class HistoryMessage(BaseModel):
+    """A stored conversation message; answers are not bound by the input length limit"""
+    id: Optional[str] = None
+    content: str
+    message_type: MessageType = MessageType.USER
+    timestamp: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
+
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=1000)
     conversation_id: Optional[str] = None
@@ -63,10 +71,18 @@ class NewsRequest(BaseModel):
     limit: int = Field(default=10, ge=1, le=50)
     sources: Optional[List[str]] = None
 
+class RAGFilter(BaseModel):
+    source: Optional[str] = None
+    type: Optional[str] = None
+    ticker: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
 class RAGQuery(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = Field(default=5, ge=1, le=20)
     include_sources: bool = True
+    filters: Optional[RAGFilter] = None
 
 class RAGResponse(BaseModel):
     answer: str
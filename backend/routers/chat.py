@@ -1,31 +1,36 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+from datetime import datetime
 import json
 import logging
+import uuid
 
-from models.schemas import ChatRequest, ChatResponse, ChatMessage
+from models.schemas import ChatRequest, ChatResponse, HistoryMessage, MessageType
+from services.intent_router import IntentRouter
 from services.rag_service import RAGService
+from services.container import get_rag_service, get_intent_router
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize RAG service
-rag_service = RAGService()
-
 @router.post("/send", response_model=ChatResponse)
-async def send_message(request: ChatRequest):
+async def send_message(request: ChatRequest, intent_router: IntentRouter = Depends(get_intent_router)):
     """Send a chat message and get AI response"""
     try:
-        # Process message through RAG service
-        response_data = await rag_service.process_query(request.message, request.conversation_id)
+        # Give new conversations their own memory rather than a shared one
+        conversation_id = request.conversation_id or uuid.uuid4().hex
+        
+        # Answer lookups directly, everything else through the RAG service
+        response_data = await intent_router.process_query(request.message, conversation_id)
         
         # Parse the JSON response
         response_dict = json.loads(response_data)
         
         return ChatResponse(
             message=response_dict.get("answer", "I couldn't process your request."),
-            conversation_id=request.conversation_id or "default",
-            timestamp=response_dict.get("timestamp"),
+            conversation_id=conversation_id,
+            timestamp=datetime.now(),
             sources=response_dict.get("sources"),
             confidence=response_dict.get("confidence")
         )
@@ -34,24 +39,42 @@ async def send_message(request: ChatRequest):
         logger.error(f"Failed to process chat message: {e}")
         raise HTTPException(status_code=500, detail="Failed to process message")
 
-@router.get("/history/{conversation_id}", response_model=List[ChatMessage])
-async def get_conversation_history(conversation_id: str):
+@router.post("/stream")
+async def stream_message(request: ChatRequest, intent_router: IntentRouter = Depends(get_intent_router)):
+    """Send a chat message and stream the AI response as server-sent events"""
+    conversation_id = request.conversation_id or uuid.uuid4().hex
+    
+    async def event_stream():
+        async for event in intent_router.stream_query(request.message, conversation_id):
+            event = {**event, "conversation_id": conversation_id}
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Conversation-Id": conversation_id}
+    )
+
+@router.get("/history/{conversation_id}", response_model=List[HistoryMessage])
+async def get_conversation_history(conversation_id: str, rag_service: RAGService = Depends(get_rag_service)):
     """Get conversation history for a specific conversation"""
     try:
-        # In a real implementation, you'd fetch from a database
-        # For now, return empty list
-        return []
+        messages = []
+        for question, answer in await rag_service.get_conversation_turns(conversation_id):
+            messages.append(HistoryMessage(content=question, message_type=MessageType.USER))
+            messages.append(HistoryMessage(content=answer, message_type=MessageType.BOT))
+        return messages
         
     except Exception as e:
         logger.error(f"Failed to get conversation history: {e}")
         raise HTTPException(status_code=500, detail="Failed to get conversation history")
 
 @router.delete("/history/{conversation_id}")
-async def clear_conversation_history(conversation_id: str):
+async def clear_conversation_history(conversation_id: str, rag_service: RAGService = Depends(get_rag_service)):
     """Clear conversation history"""
     try:
         # Clear memory for the conversation
-        await rag_service.clear_memory()
+        await rag_service.clear_memory(conversation_id)
         return {"message": "Conversation history cleared"}
         
     except Exception as e:
@@ -59,14 +82,15 @@ async def clear_conversation_history(conversation_id: str):
         raise HTTPException(status_code=500, detail="Failed to clear conversation history")
 
 @router.get("/stats")
-async def get_chat_stats():
+async def get_chat_stats(intent_router: IntentRouter = Depends(get_intent_router)):
     """Get chat statistics"""
     try:
-        stats = await rag_service.get_collection_stats()
+        stats = await intent_router.rag_service.get_collection_stats()
         return {
             "total_conversations": 1,  # Placeholder
             "total_messages": 0,  # Placeholder
-            "rag_stats": stats
+            "rag_stats": stats,
+            "intent_stats": intent_router.get_stats()
         }
         
     except Exception as e:
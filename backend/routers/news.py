@@ -1,21 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 import logging
 
 from models.schemas import NewsArticle, NewsRequest
 from services.news_scraper import NewsScraper
+from services.container import get_news_scraper
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize news scraper
-news_scraper = NewsScraper()
-
 @router.get("/latest", response_model=List[NewsArticle])
 async def get_latest_news(
     query: Optional[str] = Query(None, description="Search query for news"),
     limit: int = Query(20, ge=1, le=50, description="Number of articles to return"),
-    category: Optional[str] = Query(None, description="News category")
+    category: Optional[str] = Query(None, description="News category"),
+    news_scraper: NewsScraper = Depends(get_news_scraper)
 ):
     """Get latest financial news"""
     try:
@@ -29,7 +28,8 @@ async def get_latest_news(
 @router.get("/stock/{symbol}", response_model=List[NewsArticle])
 async def get_stock_news(
     symbol: str,
-    limit: int = Query(10, ge=1, le=20, description="Number of articles to return")
+    limit: int = Query(10, ge=1, le=20, description="Number of articles to return"),
+    news_scraper: NewsScraper = Depends(get_news_scraper)
 ):
     """Get news specific to a stock symbol"""
     try:
@@ -92,7 +92,7 @@ async def get_news_categories():
         raise HTTPException(status_code=500, detail="Failed to get news categories")
 
 @router.post("/search", response_model=List[NewsArticle])
-async def search_news(request: NewsRequest):
+async def search_news(request: NewsRequest, news_scraper: NewsScraper = Depends(get_news_scraper)):
     """Search for news articles"""
     try:
         articles = await news_scraper.get_latest_news(request.query, request.limit)
@@ -1,31 +1,35 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query
 from typing import List, Optional
+from datetime import datetime, timedelta
 import logging
 import json
+import time
+import uuid
 
-from models.schemas import RAGQuery, RAGResponse
+from models.schemas import RAGQuery, RAGResponse, RAGFilter
+from config import Config
+from services.ingestion import iter_upload_sources, iter_chunks
 from services.rag_service import RAGService
-from langchain.schema import Document
+from services.container import get_rag_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize RAG service
-rag_service = RAGService()
-
 @router.post("/query", response_model=RAGResponse)
-async def query_rag(request: RAGQuery):
+async def query_rag(request: RAGQuery, rag_service: RAGService = Depends(get_rag_service)):
     """Query the RAG system"""
     try:
         # Process query through RAG service
-        response_data = await rag_service.process_query(request.query)
+        response_data = await rag_service.process_query(
+            request.query, top_k=request.top_k, filters=request.filters
+        )
         
         # Parse the JSON response
         response_dict = json.loads(response_data)
         
         return RAGResponse(
             answer=response_dict.get("answer", "No answer found"),
-            sources=response_dict.get("sources", []),
+            sources=response_dict.get("sources", []) if request.include_sources else [],
             confidence=response_dict.get("confidence", 0.0),
             processing_time=response_dict.get("processing_time", 0.0)
         )
@@ -35,10 +39,20 @@ async def query_rag(request: RAGQuery):
         raise HTTPException(status_code=500, detail="Failed to process query")
 
 @router.get("/search")
-async def search_similar(query: str, top_k: int = 5):
+async def search_similar(
+    query: str,
+    top_k: int = Query(5, ge=1, le=50, description="Number of results to return"),
+    source: Optional[str] = Query(None, description="Only match chunks from this source"),
+    type: Optional[str] = Query(None, description="Only match chunks of this document type"),
+    ticker: Optional[str] = Query(None, description="Only match chunks tagged with this ticker"),
+    date_from: Optional[datetime] = Query(None, description="Only match chunks ingested at or after this time"),
+    date_to: Optional[datetime] = Query(None, description="Only match chunks ingested at or before this time"),
+    rag_service: RAGService = Depends(get_rag_service)
+):
     """Search for similar documents"""
     try:
-        results = await rag_service.search_similar(query, top_k)
+        filters = RAGFilter(source=source, type=type, ticker=ticker, date_from=date_from, date_to=date_to)
+        results = await rag_service.search_similar(query, top_k, filters)
         return {"results": results}
         
     except Exception as e:
@@ -46,7 +60,7 @@ async def search_similar(query: str, top_k: int = 5):
         raise HTTPException(status_code=500, detail="Failed to search documents")
 
 @router.get("/stats")
-async def get_rag_stats():
+async def get_rag_stats(rag_service: RAGService = Depends(get_rag_service)):
     """Get RAG system statistics"""
     try:
         stats = await rag_service.get_collection_stats()
@@ -57,39 +71,72 @@ async def get_rag_stats():
         raise HTTPException(status_code=500, detail="Failed to get RAG statistics")
 
 @router.post("/add-documents")
-async def add_documents(file: UploadFile = File(...)):
-    """Add documents to the RAG system"""
+async def add_documents(
+    files: Optional[List[UploadFile]] = File(None),
+    file: Optional[UploadFile] = File(None),
+    job_id: Optional[str] = Form(None),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Add documents to the RAG system.
+    
+    Accepts one or more plain-text files or zip/tar archives. Uploads are read,
+    chunked and embedded incrementally; poll ``/ingest/{job_id}`` for progress.
+    """
+    uploads = list(files or []) + ([file] if file else [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    
+    progress = rag_service.start_ingestion_job(job_id or uuid.uuid4().hex)
+    progress.files_total = len(uploads)
+    
+    def chunk_stream():
+        for upload in uploads:
+            progress.current_file = upload.filename
+            try:
+                for source, text_stream in iter_upload_sources(upload.filename, upload.file, progress):
+                    yield from iter_chunks(
+                        text_stream,
+                        metadata={"source": source, "type": "uploaded_file"},
+                        chunk_size=Config.CHUNK_SIZE,
+                        chunk_overlap=Config.CHUNK_OVERLAP
+                    )
+            except Exception as e:
+                logger.error(f"Failed to read upload {upload.filename}: {e}")
+                progress.errors.append(f"{upload.filename}: {e}")
+            progress.files_done += 1
+    
     try:
-        # Read file content
-        content = await file.read()
-        text_content = content.decode('utf-8')
-        
-        # Create document
-        document = Document(
-            page_content=text_content,
-            metadata={
-                "source": file.filename,
-                "type": "uploaded_file",
-                "size": len(text_content)
-            }
-        )
-        
-        # Add to RAG system
-        chunks_added = await rag_service.add_documents([document])
+        chunks_added = await rag_service.add_document_stream(chunk_stream(), progress)
+        progress.status = "completed"
         
         return {
-            "message": f"Successfully added document",
+            "message": f"Successfully added {progress.files_done} file(s)",
             "chunks_added": chunks_added,
-            "filename": file.filename
+            "filenames": [upload.filename for upload in uploads],
+            "progress": progress.to_dict()
         }
         
     except Exception as e:
+        progress.status = "failed"
+        progress.errors.append(str(e))
         logger.error(f"Failed to add document: {e}")
         raise HTTPException(status_code=500, detail="Failed to add document")
+    finally:
+        progress.finished_at = time.time()
+
+@router.get("/ingest/{job_id}")
+async def get_ingestion_progress(job_id: str, rag_service: RAGService = Depends(get_rag_service)):
+    """Get progress for a document ingestion job"""
+    progress = rag_service.get_ingestion_job(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return progress.to_dict()
 
 @router.post("/add-text")
-async def add_text(text: str, metadata: Optional[dict] = None):
+async def add_text(text: str, metadata: Optional[dict] = None, rag_service: RAGService = Depends(get_rag_service)):
     """Add text content to the RAG system"""
+    from langchain.schema import Document
+    
     try:
         # Create document
         document = Document(
@@ -112,8 +159,41 @@ async def add_text(text: str, metadata: Optional[dict] = None):
         logger.error(f"Failed to add text: {e}")
         raise HTTPException(status_code=500, detail="Failed to add text content")
 
+@router.delete("/documents/by-source")
+async def delete_documents_by_source(
+    source: str = Query(..., min_length=1, description="Source whose chunks should be removed"),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Remove every chunk ingested from a source"""
+    try:
+        deleted = await rag_service.delete_by_source(source)
+        return {"message": f"Deleted {deleted} chunks", "source": source, "chunks_deleted": deleted}
+        
+    except Exception as e:
+        logger.error(f"Failed to delete documents for source {source}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to delete documents")
+
+@router.delete("/documents/by-age")
+async def delete_documents_by_age(
+    older_than_days: Optional[float] = Query(None, gt=0, description="Remove chunks ingested more than this many days ago"),
+    before: Optional[datetime] = Query(None, description="Remove chunks ingested before this time"),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Remove chunks ingested before a cutoff"""
+    if (older_than_days is None) == (before is None):
+        raise HTTPException(status_code=400, detail="Specify exactly one of older_than_days or before")
+    
+    cutoff = before or datetime.now() - timedelta(days=older_than_days)
+    try:
+        deleted = await rag_service.delete_older_than(cutoff)
+        return {"message": f"Deleted {deleted} chunks", "cutoff": cutoff, "chunks_deleted": deleted}
+        
+    except Exception as e:
+        logger.error(f"Failed to delete documents older than {cutoff}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to delete documents")
+
 @router.delete("/clear")
-async def clear_rag_system():
+async def clear_rag_system(rag_service: RAGService = Depends(get_rag_service)):
     """Clear the RAG system (reset vector database)"""
     try:
         # Clear memory
@@ -126,7 +206,7 @@ async def clear_rag_system():
         raise HTTPException(status_code=500, detail="Failed to clear RAG system")
 
 @router.get("/health")
-async def rag_health_check():
+async def rag_health_check(rag_service: RAGService = Depends(get_rag_service)):
     """Health check for RAG system"""
     try:
         stats = await rag_service.get_collection_stats()
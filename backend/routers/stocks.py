@@ -1,18 +1,30 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 import logging
 
 from models.schemas import StockInfo, StockRecommendation
 from services.stock_service import StockService
+from services.container import get_stock_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Initialize stock service
-stock_service = StockService()
+# Quotes for these are primed during startup warmup
+POPULAR_STOCKS = [
+    {"symbol": "AAPL", "name": "Apple Inc."},
+    {"symbol": "MSFT", "name": "Microsoft Corporation"},
+    {"symbol": "GOOGL", "name": "Alphabet Inc."},
+    {"symbol": "AMZN", "name": "Amazon.com Inc."},
+    {"symbol": "TSLA", "name": "Tesla Inc."},
+    {"symbol": "META", "name": "Meta Platforms Inc."},
+    {"symbol": "NVDA", "name": "NVIDIA Corporation"},
+    {"symbol": "JPM", "name": "JPMorgan Chase & Co."},
+    {"symbol": "JNJ", "name": "Johnson & Johnson"},
+    {"symbol": "V", "name": "Visa Inc."}
+]
 
 @router.get("/info/{symbol}", response_model=StockInfo)
-async def get_stock_info(symbol: str):
+async def get_stock_info(symbol: str, stock_service: StockService = Depends(get_stock_service)):
     """Get comprehensive stock information"""
     try:
         stock_info = await stock_service.get_stock_info(symbol)
@@ -27,7 +39,7 @@ async def get_stock_info(symbol: str):
         raise HTTPException(status_code=500, detail="Failed to fetch stock information")
 
 @router.get("/recommendation/{symbol}", response_model=StockRecommendation)
-async def get_stock_recommendation(symbol: str):
+async def get_stock_recommendation(symbol: str, stock_service: StockService = Depends(get_stock_service)):
     """Get AI-powered stock recommendation"""
     try:
         recommendation = await stock_service.get_stock_recommendation(symbol)
@@ -42,7 +54,7 @@ async def get_stock_recommendation(symbol: str):
         raise HTTPException(status_code=500, detail="Failed to generate recommendation")
 
 @router.get("/market-overview")
-async def get_market_overview():
+async def get_market_overview(stock_service: StockService = Depends(get_stock_service)):
     """Get market overview with major indices"""
     try:
         overview = await stock_service.get_market_overview()
@@ -53,7 +65,10 @@ async def get_market_overview():
         raise HTTPException(status_code=500, detail="Failed to fetch market overview")
 
 @router.get("/search")
-async def search_stocks(query: str = Query(..., min_length=1, description="Search query for stocks")):
+async def search_stocks(
+    query: str = Query(..., min_length=1, description="Search query for stocks"),
+    stock_service: StockService = Depends(get_stock_service)
+):
     """Search for stocks by symbol or company name"""
     try:
         results = await stock_service.search_stocks(query)
@@ -64,25 +79,12 @@ async def search_stocks(query: str = Query(..., min_length=1, description="Searc
         raise HTTPException(status_code=500, detail="Failed to search stocks")
 
 @router.get("/popular")
-async def get_popular_stocks():
+async def get_popular_stocks(stock_service: StockService = Depends(get_stock_service)):
     """Get list of popular stocks"""
     try:
-        popular_stocks = [
-            {"symbol": "AAPL", "name": "Apple Inc."},
-            {"symbol": "MSFT", "name": "Microsoft Corporation"},
-            {"symbol": "GOOGL", "name": "Alphabet Inc."},
-            {"symbol": "AMZN", "name": "Amazon.com Inc."},
-            {"symbol": "TSLA", "name": "Tesla Inc."},
-            {"symbol": "META", "name": "Meta Platforms Inc."},
-            {"symbol": "NVDA", "name": "NVIDIA Corporation"},
-            {"symbol": "JPM", "name": "JPMorgan Chase & Co."},
-            {"symbol": "JNJ", "name": "Johnson & Johnson"},
-            {"symbol": "V", "name": "Visa Inc."}
-        ]
-        
         # Get current info for each stock
         stock_data = []
-        for stock in popular_stocks:
+        for stock in POPULAR_STOCKS:
             try:
                 info = await stock_service.get_stock_info(stock["symbol"])
                 if info:
@@ -98,7 +100,7 @@ async def get_popular_stocks():
         raise HTTPException(status_code=500, detail="Failed to fetch popular stocks")
 
 @router.get("/watchlist")
-async def get_watchlist():
+async def get_watchlist(stock_service: StockService = Depends(get_stock_service)):
     """Get user's watchlist (placeholder - would be user-specific in real app)"""
     try:
         # This would typically fetch from a database based on user ID
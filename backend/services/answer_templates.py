@@ -0,0 +1,37 @@
+from typing import List
+
+from models.schemas import NewsArticle, StockInfo, StockRecommendation
+
+def format_quote(info: StockInfo) -> str:
+    """One-line summary of a stock quote"""
+    line = f"{info.name} ({info.symbol}) is trading at ${info.price:,.2f}"
+    if info.change is not None and info.change_percent is not None:
+        direction = "up" if info.change >= 0 else "down"
+        line += f", {direction} ${abs(info.change):,.2f} ({info.change_percent:+.2f}%) today"
+    details = []
+    if info.market_cap:
+        details.append(f"market cap ${info.market_cap / 1e9:,.1f}B")
+    if info.pe_ratio:
+        details.append(f"P/E {info.pe_ratio:.1f}")
+    if info.volume:
+        details.append(f"volume {info.volume:,}")
+    return line + (f" ({', '.join(details)})." if details else ".")
+
+def format_recommendation(recommendation: StockRecommendation) -> str:
+    """Short summary of a stock recommendation"""
+    text = (
+        f"{recommendation.symbol}: {recommendation.recommendation.upper()} "
+        f"with {recommendation.confidence:.0%} confidence, {recommendation.risk_level} risk. "
+        f"{recommendation.reasoning}"
+    )
+    if recommendation.price_target:
+        text += f" Price target: ${recommendation.price_target:,.2f}."
+    return text
+
+def format_news(symbol: str, articles: List[NewsArticle], limit: int = 5) -> str:
+    """Bulleted list of recent headlines for a symbol"""
+    lines = [f"Latest news on {symbol}:"]
+    for article in articles[:limit]:
+        published = f", {article.published_at:%b %d}" if article.published_at else ""
+        lines.append(f"- {article.title} ({article.source}{published})")
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Set, Callable, TYPE_CHECKING
+
+from config import Config
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+class Backplane(ABC):
+    """Relay WebSocket fan-out between worker processes.
+
+    Envelopes are routed to every connection (``broadcast``), one user's
+    connections (``user``) or a topic's subscribers (``topic``). Each worker
+    delivers to its own sockets directly and publishes an envelope (route,
+    target, message, coalescing key) for the others. Envelopes are batched: one
+    publish carries up to ``max_batch_size`` of them, sent once the batch is
+    full or ``max_wait_ms`` after its first envelope. Envelopes a worker
+    published itself are ignored when they come back. Subclasses implement
+    ``_send`` for their transport.
+    """
+
+    def __init__(self, channel: Optional[str] = None, max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None):
+        self.channel = channel or Config.WS_BACKPLANE_CHANNEL
+        self.max_batch_size = max_batch_size or Config.WS_BACKPLANE_BATCH_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else Config.WS_BACKPLANE_BATCH_WAIT_MS) / 1000
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.batches = 0
+        self.received = 0
+        self.errors = 0
+        self._handler: Optional[Handler] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, handler: Handler):
+        """Start receiving envelopes from other workers"""
+        self._handler = handler
+
+    async def close(self):
+        """Flush pending envelopes and stop"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def publish(self, route: str, message: Any, target: Optional[str] = None, key: Optional[str] = None):
+        """Queue an envelope for the other workers without waiting"""
+        self._pending.append({"route": route, "target": target, "message": message, "key": key})
+        self.published += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        self.batches += 1
+        payload = json.dumps({"origin": self.origin, "envelopes": batch}, default=str)
+        task = asyncio.get_running_loop().create_task(self._send_batch(payload, len(batch)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, payload: str, size: int):
+        try:
+            await self._send(payload)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to publish {size} WebSocket envelopes: {e}")
+
+    @abstractmethod
+    async def _send(self, payload: str):
+        """Publish one encoded batch to the channel"""
+
+    def _receive(self, payload: Any):
+        """Hand envelopes published by other workers to the handler"""
+        try:
+            batch = json.loads(payload)
+        except ValueError as e:
+            self.errors += 1
+            logger.error(f"Dropping malformed backplane payload: {e}")
+            return
+        if batch.get("origin") == self.origin or self._handler is None:
+            return
+
+        for envelope in batch.get("envelopes", []):
+            self.received += 1
+            try:
+                self._handler(envelope)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Failed to deliver backplane envelope: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get publish batching and delivery counters"""
+        return {
+            "backend": type(self).__name__,
+            "channel": self.channel,
+            "published": self.published,
+            "batches": self.batches,
+            "avg_batch_size": self.published / self.batches if self.batches else 0.0,
+            "received": self.received,
+            "errors": self.errors
+        }
+
+class InMemoryBroker:
+    """Stand-in for a Redis server that connects backplanes in one process"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[InMemoryBackplane]] = {}
+
+    def publish(self, channel: str, payload: str):
+        loop = asyncio.get_running_loop()
+        for backplane in list(self.subscribers.get(channel, ())):
+            loop.call_soon(backplane._receive, payload)
+
+class InMemoryBackplane(Backplane):
+    """Backplane over an ``InMemoryBroker``, for tests and single-process runs.
+
+    Several instances sharing a broker behave like workers sharing a Redis server.
+    """
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.broker = broker or InMemoryBroker()
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.broker.subscribers.setdefault(self.channel, set()).add(self)
+
+    async def close(self):
+        await super().close()
+        self.broker.subscribers.get(self.channel, set()).discard(self)
+
+    async def _send(self, payload: str):
+        self.broker.publish(self.channel, payload)
+
+class RedisBackplane(Backplane):
+    """Backplane over Redis pub/sub"""
+
+    def __init__(self, url: Optional[str] = None, reconnect_delay: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url or Config.REDIS_URL
+        self.reconnect_delay = reconnect_delay
+        self.client: Optional[Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        import redis.asyncio as redis
+
+        await super().start(handler)
+        self.client = redis.from_url(self.url)
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"WebSocket backplane subscribed to {self.channel} on {self.url}")
+
+    async def close(self):
+        await super().close()
+        if self._listener is not None:
+            self._listener.cancel()
+        if self.client is not None:
+            await self.client.close()
+
+    async def _send(self, payload: str):
+        await self.client.publish(self.channel, payload)
+
+    async def _listen(self):
+        """Receive envelopes, resubscribing after connection errors"""
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._receive(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"WebSocket backplane connection lost, resubscribing: {e}")
+            finally:
+                await pubsub.reset()
+            await asyncio.sleep(self.reconnect_delay)
+
+def create_backplane() -> Optional[Backplane]:
+    """Create the backplane selected by ``WS_BACKPLANE``, or None to fan out within this process only"""
+    backend = Config.WS_BACKPLANE
+    if backend == "redis":
+        return RedisBackplane()
+    if backend == "memory":
+        return InMemoryBackplane()
+    if backend not in ("", "none"):
+        logger.warning(f"Unknown WS_BACKPLANE {backend!r}, fanning out within this process only")
+    return None
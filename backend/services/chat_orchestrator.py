@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable
+
+from config import Config
+from services.answer_templates import format_quote, format_recommendation, format_news
+from services.news_scraper import NewsScraper
+from services.rag_service import RAGService
+from services.stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+MAX_ENRICHED_SYMBOLS = 3
+
+LIVE_DATA_HEADER = "Live market data:"
+
+@dataclass
+class SourceResult:
+    """Outcome of one source call: ``ok``, ``empty``, ``timeout`` or ``error``"""
+    source: str
+    symbol: Optional[str]
+    status: str
+    value: Any = None
+    elapsed: float = 0.0
+
+class ChatOrchestrator:
+    """Answer ticker questions from RAG plus live quote, recommendation and news data.
+
+    Every source is called concurrently under its own deadline, and the answer is
+    composed from whatever returned in time, so a slow source costs at most its
+    deadline rather than adding to the others.
+    """
+
+    def __init__(self, stock_service: StockService, news_scraper: NewsScraper, rag_service: RAGService):
+        self.stock_service = stock_service
+        self.news_scraper = news_scraper
+        self.rag_service = rag_service
+        self.deadlines = {
+            "quote": Config.ENRICH_QUOTE_TIMEOUT,
+            "recommendation": Config.ENRICH_RECOMMENDATION_TIMEOUT,
+            "news": Config.ENRICH_NEWS_TIMEOUT,
+            "rag": Config.ENRICH_RAG_TIMEOUT
+        }
+        self.outcomes: Dict[str, Dict[str, int]] = {
+            source: {"ok": 0, "empty": 0, "timeout": 0, "error": 0} for source in self.deadlines
+        }
+        self.latencies: Dict[str, deque] = {source: deque(maxlen=1000) for source in self.deadlines}
+
+    async def process_query(self, message: str, tickers: List[str],
+                            conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Answer a question about ``tickers``, returning a ``RAGService.process_query``-shaped dict"""
+        start_time = time.perf_counter()
+        live_tasks = self._start_live_tasks(tickers)
+        rag, *live = await asyncio.gather(
+            self._call("rag", None, self._collect_rag(message, conversation_id)), *live_tasks
+        )
+
+        rag_response = rag.value or {}
+        answer = self._compose(rag_response.get("answer", ""), live)
+        if rag.status != "ok":
+            await self._record_fallback(message, answer, conversation_id)
+        processing_time = time.perf_counter() - start_time
+        return {
+            "answer": answer or "I couldn't get an answer in time. Please try again.",
+            "sources": rag_response.get("sources", []),
+            "processing_time": processing_time,
+            "time_to_first_token": rag_response.get("time_to_first_token", processing_time),
+            "confidence": rag_response.get("confidence", 0.0),
+            "live_data": self._summarize(rag, live)
+        }
+
+    async def stream_query(self, message: str, tickers: List[str],
+                           conversation_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the RAG answer while live data is fetched, then append the live data"""
+        start_time = time.perf_counter()
+        live_tasks = self._start_live_tasks(tickers)
+        try:
+            async for event in self._stream(message, tickers, conversation_id, start_time, live_tasks):
+                yield event
+        finally:
+            # The client may stop reading before the live data is needed
+            for task in live_tasks:
+                task.cancel()
+
+    async def _stream(self, message: str, tickers: List[str], conversation_id: Optional[str],
+                      start_time: float, live_tasks: List[asyncio.Task]) -> AsyncIterator[Dict[str, Any]]:
+        done: Dict[str, Any] = {}
+        error: Optional[Dict[str, Any]] = None
+        answer_parts: List[str] = []
+        status = "ok"
+        events = self.rag_service.stream_query(message, conversation_id)
+        deadline = start_time + self.deadlines["rag"]
+        try:
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                event = await asyncio.wait_for(events.__anext__(), remaining)
+                if event["type"] == "done":
+                    done = event
+                elif event["type"] == "error":
+                    error = event
+                else:
+                    if event["type"] == "token":
+                        answer_parts.append(event["content"])
+                    yield event
+        except StopAsyncIteration:
+            status = "error" if error else "ok"
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(f"RAG answer for {tickers} passed its {self.deadlines['rag']}s deadline")
+        finally:
+            await events.aclose()
+        rag = SourceResult("rag", None, status, done, time.perf_counter() - start_time)
+        self._record(rag)
+
+        live = await asyncio.gather(*live_tasks)
+        rag_answer = done.get("answer", "".join(answer_parts))
+        live_text = self._compose("", live)
+        if error and not live_text:
+            yield error
+            return
+        if live_text:
+            yield {"type": "token", "content": f"\n\n{live_text}" if rag_answer else live_text}
+
+        answer = self._compose(rag_answer, live)
+        if not done:
+            await self._record_fallback(message, answer, conversation_id)
+
+        processing_time = time.perf_counter() - start_time
+        yield {
+            **done,
+            "type": "done",
+            "answer": answer,
+            "sources": done.get("sources", []),
+            "processing_time": processing_time,
+            "time_to_first_token": done.get("time_to_first_token", processing_time),
+            "confidence": done.get("confidence", 0.0),
+            "live_data": self._summarize(rag, live)
+        }
+
+    def _start_live_tasks(self, tickers: List[str]) -> List[asyncio.Task]:
+        """Start quote, recommendation and news calls for each symbol"""
+        tasks = []
+        for symbol in tickers[:MAX_ENRICHED_SYMBOLS]:
+            tasks.append(asyncio.create_task(
+                self._call("quote", symbol, self.stock_service.get_stock_info(symbol))
+            ))
+            tasks.append(asyncio.create_task(
+                self._call("recommendation", symbol, self.stock_service.get_stock_recommendation(symbol))
+            ))
+            tasks.append(asyncio.create_task(
+                self._call("news", symbol, self.news_scraper.get_stock_news(symbol, limit=3))
+            ))
+        return tasks
+
+    async def _call(self, source: str, symbol: Optional[str], call: Awaitable[Any]) -> SourceResult:
+        """Await one source call under its deadline, never raising"""
+        started = time.perf_counter()
+        label = f"{source} lookup for {symbol}" if symbol else f"{source} lookup"
+        try:
+            value = await asyncio.wait_for(call, self.deadlines[source])
+            status = "ok" if value else "empty"
+        except asyncio.TimeoutError:
+            value, status = None, "timeout"
+            logger.warning(f"{label} passed its {self.deadlines[source]}s deadline")
+        except Exception as e:
+            value, status = None, "error"
+            logger.error(f"{label} failed: {e}")
+
+        result = SourceResult(source, symbol, status, value, time.perf_counter() - started)
+        self._record(result)
+        return result
+
+    async def _collect_rag(self, message: str, conversation_id: Optional[str]) -> Dict[str, Any]:
+        """Run the RAG chain to completion and return its final event"""
+        async with aclosing(self.rag_service.stream_query(message, conversation_id)) as events:
+            async for event in events:
+                if event["type"] == "done":
+                    return event
+                if event["type"] == "error":
+                    raise RuntimeError(event["message"])
+        return {}
+
+    async def _record_fallback(self, message: str, answer: str, conversation_id: Optional[str]):
+        """Remember an answer the RAG chain didn't finish, so follow-ups still have context"""
+        if not answer:
+            return
+        try:
+            await self.rag_service.record_turn(conversation_id, message, answer)
+        except Exception as e:
+            logger.error(f"Failed to record fallback answer: {e}")
+
+    def _compose(self, rag_answer: str, live: List[SourceResult]) -> str:
+        """Append templated live data that arrived in time to the RAG answer"""
+        sections = []
+        for result in live:
+            if result.status != "ok":
+                continue
+            if result.source == "quote" and result.value.price is not None:
+                sections.append(format_quote(result.value))
+            elif result.source == "recommendation":
+                sections.append(format_recommendation(result.value))
+            elif result.source == "news":
+                sections.append(format_news(result.symbol, result.value, limit=3))
+
+        parts = [rag_answer.strip()] if rag_answer.strip() else []
+        if sections:
+            parts.append(LIVE_DATA_HEADER + "\n" + "\n\n".join(sections))
+        return "\n\n".join(parts)
+
+    def _summarize(self, rag: SourceResult, live: List[SourceResult]) -> List[Dict[str, Any]]:
+        """Per-source status and latency for the response"""
+        return [
+            {"source": result.source, "symbol": result.symbol, "status": result.status,
+             "elapsed": round(result.elapsed, 3)}
+            for result in [rag] + list(live)
+        ]
+
+    def _record(self, result: SourceResult):
+        self.outcomes[result.source][result.status] += 1
+        self.latencies[result.source].append(result.elapsed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-source outcomes and latency percentiles"""
+        stats: Dict[str, Any] = {}
+        for source, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            stats[source] = {
+                "deadline": self.deadlines[source],
+                **self.outcomes[source],
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[int(len(ordered) * 0.95)] if ordered else None
+            }
+        return stats
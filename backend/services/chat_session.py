@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import uuid
+from typing import Dict, Any, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+
+from config import Config
+from services.intent_router import IntentRouter
+from services.websocket_manager import ConnectionManager
+from services.wire_format import decode_frame
+
+logger = logging.getLogger(__name__)
+
+class ChatSession:
+    """Handle one ``/ws/chat`` connection with requests running concurrently.
+
+    The endpoint's own task only reads frames, so pings and cancels are handled
+    while answers are being generated. Each chat request runs as its own task,
+    at most ``max_concurrent`` at a time, and every frame sent for it carries its
+    ``request_id``. Cancelling a request (explicitly, by a newer message in the
+    same conversation, or by disconnecting) cancels its task, which releases its
+    LLM slot straight away.
+    """
+
+    def __init__(self, websocket: WebSocket, manager: ConnectionManager, intent_router: IntentRouter,
+                 max_concurrent: Optional[int] = None, cancel_on_new_message: Optional[bool] = None):
+        self.websocket = websocket
+        self.manager = manager
+        self.intent_router = intent_router
+        self.cancel_on_new_message = (
+            Config.WS_CANCEL_ON_NEW_MESSAGE if cancel_on_new_message is None else cancel_on_new_message
+        )
+        self._slots = asyncio.Semaphore(max_concurrent or Config.WS_MAX_CONCURRENT_REQUESTS)
+        self._requests: Dict[str, asyncio.Task] = {}
+        self._conversations: Dict[str, str] = {}
+
+    async def run(self):
+        """Read frames until the client disconnects, then cancel whatever is still running"""
+        try:
+            while True:
+                frame = await self.websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                try:
+                    message = decode_frame(frame["bytes"] if frame.get("bytes") is not None else frame["text"])
+                    if not isinstance(message, dict):
+                        raise ValueError("frame is not an object")
+                except Exception as e:
+                    await self.send({"type": "error", "message": f"Invalid frame: {e}"})
+                    continue
+                await self.handle(message)
+        finally:
+            for task in list(self._requests.values()):
+                task.cancel()
+
+    async def handle(self, message: Dict[str, Any]):
+        """Dispatch one client frame"""
+        frame_type = message.get("type", "message")
+        if frame_type == "ping":
+            await self.send({"type": "pong"})
+        elif frame_type == "cancel":
+            self.cancel(message.get("request_id"))
+        elif frame_type == "message":
+            self.start(message)
+        # Other frames (e.g. typing indicators) need no reply
+
+    def start(self, message: Dict[str, Any]) -> str:
+        """Start answering a chat message in the background"""
+        request_id = str(message.get("request_id") or uuid.uuid4().hex)
+        # Give new conversations their own memory rather than a shared one
+        conversation_id = str(message.get("conversation_id") or uuid.uuid4().hex)
+        message = {**message, "conversation_id": conversation_id}
+        if self.cancel_on_new_message and conversation_id in self._conversations:
+            # A new question supersedes the one still being answered
+            self.cancel(self._conversations[conversation_id])
+        if request_id in self._requests:
+            self.cancel(request_id)
+
+        task = asyncio.create_task(self._answer(request_id, message))
+        self._requests[request_id] = task
+        self._conversations[conversation_id] = request_id
+        task.add_done_callback(lambda _: self._finished(request_id, conversation_id, task))
+        return request_id
+
+    def cancel(self, request_id: Optional[str] = None):
+        """Cancel one in-flight request, or all of them when no id is given"""
+        targets = [request_id] if request_id is not None else list(self._requests)
+        for target in targets:
+            task = self._requests.get(target)
+            if task is not None and not task.done():
+                task.cancel()
+
+    def _finished(self, request_id: str, conversation_id: str, task: asyncio.Task):
+        if self._requests.get(request_id) is task:
+            del self._requests[request_id]
+        if self._conversations.get(conversation_id) == request_id:
+            del self._conversations[conversation_id]
+
+    async def _answer(self, request_id: str, message: Dict[str, Any]):
+        query = message.get("message", "")
+        conversation_id = message["conversation_id"]
+        try:
+            async with self._slots:
+                if message.get("stream"):
+                    # Push sources, then answer tokens as they arrive, then a final frame
+                    async for event in self.intent_router.stream_query(query, conversation_id):
+                        await self.send(event, request_id, conversation_id)
+                    return
+
+                # Answer lookups directly, everything else through the RAG service
+                response = await self.intent_router.answer(query, conversation_id)
+                await self.send({**response, "type": "response"}, request_id, conversation_id)
+        except asyncio.CancelledError:
+            await self.send({"type": "cancelled"}, request_id, conversation_id)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to answer WebSocket request {request_id}: {e}")
+            await self.send({"type": "error", "message": "An error occurred"}, request_id, conversation_id)
+
+    async def send(self, event: Dict[str, Any], request_id: Optional[str] = None,
+                   conversation_id: Optional[str] = None):
+        """Queue a frame for this connection in its wire format"""
+        # Events can be shared with other readers (e.g. cached answers), so annotate a copy
+        event = {**event, "timestamp": asyncio.get_running_loop().time()}
+        if request_id is not None:
+            event["request_id"] = request_id
+        if conversation_id is not None:
+            event["conversation_id"] = conversation_id
+        await self.manager.send_personal_json(event, self.websocket)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._requests)
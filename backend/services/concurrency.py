@@ -0,0 +1,48 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+class ConcurrencyLimiter:
+    """Bound the number of in-flight operations and record how long callers queue"""
+
+    def __init__(self, name: str, max_in_flight: int):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = 0
+        self.total = 0
+        self.queue_times = deque(maxlen=1000)
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the duration of the block"""
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.queue_times.append(time.perf_counter() - queued_at)
+
+        self.in_flight += 1
+        self.total += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get in-flight and queue-time statistics"""
+        queue_times = sorted(self.queue_times)
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "total": self.total,
+            "queue_time_p50": queue_times[len(queue_times) // 2] if queue_times else None,
+            "queue_time_p95": queue_times[int(len(queue_times) * 0.95)] if queue_times else None
+        }
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional
+
+from services.intent_router import IntentRouter
+from services.mcp_server import MCPServer
+from services.news_scraper import NewsScraper
+from services.rag_service import RAGService
+from services.stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """Process-wide owner of shared service instances.
+
+    Services are created and initialized lazily on first use, so every router
+    shares one Chroma client, one HTTP session and one set of caches.
+    """
+
+    def __init__(self):
+        self._news_scraper: Optional[NewsScraper] = None
+        self._stock_service: Optional[StockService] = None
+        self._rag_service: Optional[RAGService] = None
+        self._mcp_server: Optional[MCPServer] = None
+        self._intent_router: Optional[IntentRouter] = None
+        # One lock per service so a slow RAG initialization doesn't block the others
+        self._locks = {name: asyncio.Lock() for name in ("news", "stocks", "rag", "mcp", "intent")}
+        self.warmup_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+
+    async def get_news_scraper(self) -> NewsScraper:
+        """Get the shared news scraper, opening its HTTP session on first use"""
+        if self._news_scraper is None:
+            async with self._locks["news"]:
+                if self._news_scraper is None:
+                    news_scraper = NewsScraper()
+                    await news_scraper.initialize()
+                    self._news_scraper = news_scraper
+        return self._news_scraper
+
+    async def get_stock_service(self) -> StockService:
+        """Get the shared stock service"""
+        if self._stock_service is None:
+            news_scraper = await self.get_news_scraper()
+            async with self._locks["stocks"]:
+                if self._stock_service is None:
+                    self._stock_service = StockService(news_scraper=news_scraper)
+        return self._stock_service
+
+    async def get_rag_service(self) -> RAGService:
+        """Get the shared RAG service, initializing it on first use"""
+        if self._rag_service is None:
+            async with self._locks["rag"]:
+                if self._rag_service is None:
+                    rag_service = RAGService()
+                    await rag_service.initialize()
+                    self._rag_service = rag_service
+        return self._rag_service
+
+    async def get_mcp_server(self) -> MCPServer:
+        """Get the shared MCP client, connecting on first use"""
+        if self._mcp_server is None:
+            async with self._locks["mcp"]:
+                if self._mcp_server is None:
+                    mcp_server = MCPServer()
+                    await mcp_server.initialize()
+                    self._mcp_server = mcp_server
+        return self._mcp_server
+
+    async def get_intent_router(self) -> IntentRouter:
+        """Get the shared chat router that answers lookups directly and the rest with RAG"""
+        if self._intent_router is None:
+            stock_service = await self.get_stock_service()
+            news_scraper = await self.get_news_scraper()
+            rag_service = await self.get_rag_service()
+            async with self._locks["intent"]:
+                if self._intent_router is None:
+                    self._intent_router = IntentRouter(stock_service, news_scraper, rag_service)
+        return self._intent_router
+
+    @property
+    def ready(self) -> bool:
+        """Ready once RAG is initialized and warmup has finished or given up on the rest"""
+        return self._rag_service is not None and (
+            self.warmup_seconds is not None or self.warmup_error is not None
+        )
+
+    async def warmup(self, popular_symbols: List[str], max_retry_delay: float = 60.0):
+        """Initialize services and pay first-request costs.
+
+        RAG warmup (index load, first embed) and quote priming run concurrently.
+        Quote priming is best effort. RAG initialization is retried with
+        exponential backoff until it succeeds; if only the warmup query fails,
+        the initialized service is used as is.
+        """
+        started = time.perf_counter()
+
+        async def warm_rag():
+            delay = 1.0
+            while True:
+                try:
+                    rag_service = await self.get_rag_service()
+                    await rag_service.warmup()
+                    self.warmup_error = None
+                    return
+                except Exception as e:
+                    self.warmup_error = str(e)
+                    if self._rag_service is not None:
+                        logger.warning(f"RAG warmup failed, serving without it: {e}")
+                        return
+                    logger.error(f"RAG initialization failed, retrying in {delay:.0f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, max_retry_delay)
+
+        async def warm_stocks():
+            try:
+                stock_service = await self.get_stock_service()
+                await stock_service.prime(popular_symbols)
+            except Exception as e:
+                logger.warning(f"Stock cache priming failed: {e}")
+
+        await asyncio.gather(warm_rag(), warm_stocks())
+        self.warmup_seconds = time.perf_counter() - started
+        logger.info(f"Warmup finished in {self.warmup_seconds:.2f}s")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Report which services have been initialized"""
+        return {
+            "ready": self.ready,
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_error": self.warmup_error,
+            "rag": self._rag_service is not None,
+            "news": self._news_scraper is not None,
+            "stocks": self._stock_service is not None,
+            "mcp": self._mcp_server is not None,
+            "intent": self._intent_router is not None
+        }
+
+    async def close(self):
+        """Release resources held by initialized services"""
+        if self._rag_service is not None:
+            await self._rag_service.close()
+        if self._news_scraper is not None:
+            await self._news_scraper.close()
+        if self._mcp_server is not None:
+            await self._mcp_server.close()
+        logger.info("Services closed")
+
+container = ServiceContainer()
+
+# FastAPI dependencies
+async def get_rag_service() -> RAGService:
+    return await container.get_rag_service()
+
+async def get_news_scraper() -> NewsScraper:
+    return await container.get_news_scraper()
+
+async def get_stock_service() -> StockService:
+    return await container.get_stock_service()
+
+async def get_mcp_server() -> MCPServer:
+    return await container.get_mcp_server()
+
+async def get_intent_router() -> IntentRouter:
+    return await container.get_intent_router()
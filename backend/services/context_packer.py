@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+from config import Config
+from services.tokenizer import count_tokens
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Context token budgets, matched by longest model-name prefix. They leave room in
+# the model's window for the prompt template, the question and the answer.
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-3.5-turbo": 2500,
+    "gpt-3.5-turbo-16k": 8000,
+    "gpt-4": 4000,
+    "gpt-4-32k": 16000,
+    "gpt-4-turbo": 8000,
+    "gpt-4o": 8000,
+}
+DEFAULT_CONTEXT_BUDGET = 2500
+
+# Shortest shared prefix/suffix treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+# Largest whitespace gap between consecutive chunks that still counts as adjacent
+ADJACENT_GAP_CHARS = 2
+
+BLOCK_SEPARATOR = "\n\n"
+
+@dataclass
+class ContextBlock:
+    """One or more retrieved chunks from the same source merged into a passage"""
+    text: str
+    source: Optional[str]
+    rank: int
+    start: Optional[int] = None
+    end: Optional[int] = None
+    ranks: List[int] = field(default_factory=list)
+    tokens: int = 0
+
+def context_budget_for(model: str) -> int:
+    """Context token budget for an LLM model, overridable with CONTEXT_TOKEN_BUDGET"""
+    if Config.CONTEXT_TOKEN_BUDGET > 0:
+        return Config.CONTEXT_TOKEN_BUDGET
+    matches = [name for name in MODEL_CONTEXT_BUDGETS if model.startswith(name)]
+    if not matches:
+        return DEFAULT_CONTEXT_BUDGET
+    return MODEL_CONTEXT_BUDGETS[max(matches, key=len)]
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``"""
+    if len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = right[:MIN_OVERLAP_CHARS]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position >= 0:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+def _merge(block: ContextBlock, text: str, start: Optional[int]) -> bool:
+    """Fold a chunk into a block if it is contained in, overlaps or directly follows it"""
+    if text in block.text:
+        return True
+
+    overlap = _overlap(block.text, text)
+    if overlap:
+        block.text += text[overlap:]
+        if block.end is not None and start is not None:
+            block.end = max(block.end, start + len(text))
+        return True
+
+    overlap = _overlap(text, block.text)
+    if overlap:
+        block.text = text + block.text[overlap:]
+        if block.start is not None and start is not None:
+            block.start = min(block.start, start)
+        return True
+
+    if block.end is not None and start is not None and 0 <= start - block.end <= ADJACENT_GAP_CHARS:
+        block.text += "\n" + text
+        block.end = start + len(text)
+        return True
+
+    return False
+
+def merge_chunks(documents: List[Document]) -> List[ContextBlock]:
+    """Merge overlapping and adjacent chunks per source and drop duplicated text.
+
+    ``documents`` are in relevance order; each block keeps the best rank of the
+    chunks folded into it. Chunks with a ``start_index`` are merged in document
+    order so consecutive splitter windows join up.
+    """
+    groups: Dict[Optional[str], List[Tuple[int, Document]]] = {}
+    for rank, doc in enumerate(documents):
+        groups.setdefault(doc.metadata.get("source"), []).append((rank, doc))
+
+    blocks: List[ContextBlock] = []
+    for source, members in groups.items():
+        members.sort(key=lambda item: (item[1].metadata.get("start_index", float("inf")), item[0]))
+        source_blocks: List[ContextBlock] = []
+        for rank, doc in members:
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            start = doc.metadata.get("start_index")
+            merged_into = next((block for block in source_blocks if _merge(block, text, start)), None)
+            if merged_into is not None:
+                merged_into.rank = min(merged_into.rank, rank)
+                merged_into.ranks.append(rank)
+                continue
+            source_blocks.append(ContextBlock(
+                text=text,
+                source=source,
+                rank=rank,
+                start=start,
+                end=start + len(text) if start is not None else None,
+                ranks=[rank]
+            ))
+        blocks.extend(source_blocks)
+
+    # The same passage can be ingested under several sources; keep the best-ranked copy
+    blocks.sort(key=lambda block: block.rank)
+    unique: List[ContextBlock] = []
+    for block in blocks:
+        if any(block.text in kept.text for kept in unique):
+            continue
+        unique.append(block)
+    return unique
+
+def _truncate(text: str, budget: int, model: str) -> str:
+    """Cut text down to roughly ``budget`` tokens"""
+    tokens = count_tokens(text, model)
+    while tokens > budget and len(text) > 1:
+        text = text[:max(1, int(len(text) * budget / tokens) - 1)]
+        tokens = count_tokens(text, model)
+    return text
+
+def pack_context(documents: List[Document], model: Optional[str] = None,
+                 token_budget: Optional[int] = None) -> List[ContextBlock]:
+    """Merge retrieved chunks and keep the best-ranked blocks that fit the token budget"""
+    model = model or Config.LLM_MODEL
+    budget = token_budget or context_budget_for(model)
+    separator_tokens = count_tokens(BLOCK_SEPARATOR, model)
+
+    packed: List[ContextBlock] = []
+    used = 0
+    for block in merge_chunks(documents):
+        block.tokens = count_tokens(block.text, model)
+        if not packed and block.tokens > budget:
+            # The most relevant passage always goes in, cut down if it alone is over budget
+            block.text = _truncate(block.text, budget, model)
+            block.tokens = count_tokens(block.text, model)
+        cost = block.tokens + (separator_tokens if packed else 0)
+        if used + cost > budget:
+            continue
+        packed.append(block)
+        used += cost
+
+    logger.debug(f"Packed {len(documents)} chunks into {len(packed)} blocks ({used} of {budget} tokens)")
+    return packed
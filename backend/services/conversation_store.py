@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable, Awaitable
+
+from services.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# (question, answer) pair
+Turn = Tuple[str, str]
+
+@dataclass
+class Conversation:
+    turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
+    last_access: float = field(default_factory=time.time)
+    # Turns that left the window and are waiting to be summarized
+    unsummarized: List[Turn] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": list(self.turns),
+            "summary": self.summary,
+            "unsummarized": list(self.unsummarized),
+            "last_access": self.last_access
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Conversation":
+        return cls(
+            turns=[tuple(turn) for turn in data.get("turns", [])],
+            summary=data.get("summary", ""),
+            unsummarized=[tuple(turn) for turn in data.get("unsummarized", [])],
+            last_access=data.get("last_access", time.time())
+        )
+
+class ConversationStore:
+    """Conversation memory keyed by conversation_id with a token-budgeted window.
+
+    Turns that fall out of the window are folded into a rolling summary when a
+    summarizer is configured, and dropped otherwise. Summaries are written in
+    the background, one at a time per conversation, so answering never waits on
+    them. Idle conversations are written to disk and reloaded on next access,
+    with file I/O run in the default executor. Requests without a
+    conversation_id have no memory.
+    """
+
+    def __init__(self, data_dir: str, token_budget: int = 1500, idle_seconds: int = 900,
+                 max_in_memory: int = 1000,
+                 summarizer: Optional[Callable[[str, List[Turn]], Awaitable[str]]] = None):
+        self.data_dir = data_dir
+        self.token_budget = token_budget
+        self.idle_seconds = idle_seconds
+        self.max_in_memory = max_in_memory
+        self.summarizer = summarizer
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._summary_locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._evicting = False
+        self._last_sweep = time.time()
+        self.evicted_to_disk = 0
+        self.loaded_from_disk = 0
+        self.summarized_turns = 0
+
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _path(self, conversation_id: str) -> str:
+        """Map a conversation id to a safe file name"""
+        digest = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.data_dir, f"{digest}.json")
+
+    def _read(self, conversation_id: str) -> Optional[Conversation]:
+        """Read an evicted conversation back from disk and remove its file"""
+        path = self._path(conversation_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                conversation = Conversation.from_dict(json.load(f))
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        self.loaded_from_disk += 1
+        return conversation
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    async def _get(self, conversation_id: Optional[str], create: bool = True) -> Optional[Conversation]:
+        """Get a conversation from memory, loading it from disk if it was evicted"""
+        if not conversation_id:
+            return None
+        conversation = self._conversations.get(conversation_id)
+
+        if conversation is None:
+            try:
+                loaded = await asyncio.get_running_loop().run_in_executor(None, self._read, conversation_id)
+            except Exception as e:
+                loaded = None
+                logger.error(f"Failed to load conversation {conversation_id} from disk: {e}")
+
+            # Another request may have loaded or created it while we were reading
+            conversation = self._conversations.get(conversation_id) or loaded
+            if conversation is None:
+                if not create:
+                    return None
+                conversation = Conversation()
+
+            self._conversations[conversation_id] = conversation
+            if conversation.unsummarized and self.summarizer:
+                self._spawn(self._summarize(conversation_id, conversation))
+
+        self._conversations.move_to_end(conversation_id)
+        conversation.last_access = time.time()
+        return conversation
+
+    def _turn_tokens(self, turn: Turn) -> int:
+        return count_tokens(turn[0]) + count_tokens(turn[1])
+
+    async def get_history(self, conversation_id: Optional[str]) -> str:
+        """Format the conversation window for a prompt, newest turns first to fit the budget"""
+        conversation = await self._get(conversation_id, create=False)
+        if conversation is None:
+            return ""
+
+        budget = self.token_budget - count_tokens(conversation.summary)
+        lines: List[str] = []
+        for question, answer in reversed(conversation.turns):
+            turn_text = f"Human: {question}\nAssistant: {answer}"
+            budget -= count_tokens(turn_text)
+            if budget < 0:
+                break
+            lines.append(turn_text)
+        lines.reverse()
+
+        if conversation.summary:
+            lines.insert(0, f"Summary of earlier conversation: {conversation.summary}")
+        return "\n".join(lines)
+
+    async def get_turns(self, conversation_id: Optional[str]) -> List[Turn]:
+        """Get the turns currently held for a conversation"""
+        conversation = await self._get(conversation_id, create=False)
+        return list(conversation.turns) if conversation else []
+
+    async def add_turn(self, conversation_id: Optional[str], question: str, answer: str):
+        """Append a turn and trim the conversation to its token budget"""
+        conversation = await self._get(conversation_id)
+        if conversation is None:
+            return
+        conversation.turns.append((question, answer))
+
+        # Trim the oldest turns once the window exceeds the budget
+        total = sum(self._turn_tokens(turn) for turn in conversation.turns)
+        overflow: List[Turn] = []
+        while len(conversation.turns) > 1 and total > self.token_budget:
+            turn = conversation.turns.pop(0)
+            total -= self._turn_tokens(turn)
+            overflow.append(turn)
+
+        if overflow and self.summarizer:
+            conversation.unsummarized.extend(overflow)
+            self._spawn(self._summarize(conversation_id, conversation))
+
+        self._maybe_sweep()
+
+    def _spawn(self, coro: Awaitable[Any]):
+        """Run background work, keeping a reference until it finishes"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, conversation_id: str, conversation: Conversation):
+        """Fold turns that left the window into the summary, one summary at a time per conversation"""
+        lock = self._summary_locks.setdefault(conversation_id, asyncio.Lock())
+        async with lock:
+            # An earlier run may already have taken our turns along with its own
+            overflow, conversation.unsummarized = conversation.unsummarized, []
+            if not overflow:
+                return
+            try:
+                conversation.summary = await self.summarizer(conversation.summary, overflow)
+                self.summarized_turns += len(overflow)
+            except Exception as e:
+                logger.error(f"Failed to summarize conversation {conversation_id}: {e}")
+
+    async def drain(self):
+        """Wait for background summaries and evictions to finish"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def _remove_files(self, conversation_id: Optional[str]):
+        if conversation_id is not None:
+            names = [os.path.basename(self._path(conversation_id))]
+        else:
+            names = [name for name in os.listdir(self.data_dir) if name.endswith(".json")]
+        for name in names:
+            try:
+                os.remove(os.path.join(self.data_dir, name))
+            except FileNotFoundError:
+                pass
+
+    async def clear(self, conversation_id: Optional[str] = None):
+        """Clear one conversation, or every conversation when no id is given"""
+        if conversation_id is None:
+            self._conversations.clear()
+            self._summary_locks.clear()
+        else:
+            self._conversations.pop(conversation_id, None)
+            self._summary_locks.pop(conversation_id, None)
+        await asyncio.get_running_loop().run_in_executor(None, self._remove_files, conversation_id)
+
+    def _maybe_sweep(self):
+        """Evict idle conversations at most once a minute, or when over capacity"""
+        now = time.time()
+        if self._evicting:
+            return
+        if now - self._last_sweep >= 60 or len(self._conversations) > self.max_in_memory:
+            self._last_sweep = now
+            self._evicting = True
+            self._spawn(self.evict_idle())
+
+    async def evict_idle(self) -> int:
+        """Write idle (or least recently used, when over capacity) conversations to disk"""
+        try:
+            return await self._evict_idle()
+        finally:
+            self._evicting = False
+
+    async def _evict_idle(self) -> int:
+        now = time.time()
+        loop = asyncio.get_running_loop()
+        evicted = 0
+        for conversation_id in list(self._conversations.keys()):
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                continue
+            over_capacity = len(self._conversations) > self.max_in_memory
+            if not over_capacity and now - conversation.last_access < self.idle_seconds:
+                # Conversations are ordered by last access, so the rest are newer
+                break
+            lock = self._summary_locks.get(conversation_id)
+            if conversation.unsummarized or (lock is not None and lock.locked()):
+                # Its summary is queued or being written; evict it on a later sweep
+                continue
+
+            last_access = conversation.last_access
+            try:
+                await loop.run_in_executor(None, self._write, self._path(conversation_id), conversation.to_dict())
+            except Exception as e:
+                logger.error(f"Failed to evict conversation {conversation_id} to disk: {e}")
+                break
+
+            if self._conversations.get(conversation_id) is not conversation:
+                # Cleared while it was being written
+                await loop.run_in_executor(None, self._remove_files, conversation_id)
+            elif conversation.last_access == last_access:
+                del self._conversations[conversation_id]
+                self._summary_locks.pop(conversation_id, None)
+                evicted += 1
+            # Otherwise it was used while being written: keep it, the file is replaced on its next eviction
+
+        if evicted:
+            self.evicted_to_disk += evicted
+            logger.info(f"Evicted {evicted} idle conversations to disk")
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics about held conversations"""
+        return {
+            "in_memory": len(self._conversations),
+            "token_budget": self.token_budget,
+            "evicted_to_disk": self.evicted_to_disk,
+            "loaded_from_disk": self.loaded_from_disk,
+            "summarized_turns": self.summarized_turns
+        }
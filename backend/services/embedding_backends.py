@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+from config import Config
+
+if TYPE_CHECKING:
+    from langchain.schema.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PREFIX = "local:"
+
+# Collections built with this model keep the configured name unchanged
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Collection metadata key recording which model produced its vectors
+EMBEDDING_MODEL_KEY = "embedding_model"
+
+def is_openai_model(model_name: str) -> bool:
+    """Check whether an embedding model name refers to an OpenAI model"""
+    return model_name.startswith("text-embedding")
+
+def collection_name_for(model_name: str, base_name: Optional[str] = None) -> str:
+    """Name of the Chroma collection holding vectors from ``model_name``.
+
+    Models produce vectors of different sizes, so each gets its own collection;
+    the default model keeps ``COLLECTION_NAME`` so existing data stays in use.
+    """
+    base_name = base_name or Config.COLLECTION_NAME
+    if model_name == DEFAULT_EMBEDDING_MODEL:
+        return base_name
+    if model_name.startswith(LOCAL_MODEL_PREFIX):
+        model_name = model_name[len(LOCAL_MODEL_PREFIX):]
+    slug = re.sub(r"[^a-z0-9]+", "-", model_name.lower()).strip("-")
+    # Chroma names are at most 63 characters and must end alphanumeric
+    return f"{base_name}_{slug}"[:63].rstrip("-_")
+
+def check_collection_model(collection_name: str, metadata: Optional[Dict[str, Any]], model_name: str):
+    """Fail fast when a collection holds vectors from a different embedding model"""
+    stored = (metadata or {}).get(EMBEDDING_MODEL_KEY)
+    if stored is not None and stored != model_name:
+        raise ValueError(
+            f"Collection {collection_name!r} was built with embedding model {stored!r}, "
+            f"not {model_name!r}; use a different COLLECTION_NAME or re-ingest"
+        )
+
+def create_embeddings(model_name: Optional[str] = None) -> Embeddings:
+    """Create the embedding backend selected by ``Config.EMBEDDING_MODEL``.
+
+    OpenAI model names (``text-embedding-*``) use the OpenAI API. Anything else
+    is treated as a sentence-transformers model run locally, optionally written
+    with a ``local:`` prefix, e.g. ``local:sentence-transformers/all-MiniLM-L6-v2``.
+    """
+    model_name = model_name or Config.EMBEDDING_MODEL
+
+    if is_openai_model(model_name):
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            model=model_name
+        )
+
+    if model_name.startswith(LOCAL_MODEL_PREFIX):
+        model_name = model_name[len(LOCAL_MODEL_PREFIX):]
+
+    return LocalEmbeddings(
+        model_name=model_name,
+        device=Config.EMBEDDING_DEVICE,
+        runtime=Config.EMBEDDING_RUNTIME,
+        quantize=Config.EMBEDDING_QUANTIZE,
+        max_batch_size=Config.EMBEDDING_BATCH_SIZE,
+        max_wait_ms=Config.EMBEDDING_BATCH_WAIT_MS
+    )
+
+class _DynamicBatcher:
+    """Single worker thread that merges concurrent encode requests into batches"""
+
+    def __init__(self, encode_fn, max_batch_size: int, max_wait_ms: float):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for encoding and return a future for its vector"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            # Keep collecting until the batch is full or the window closes
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Async callers that were cancelled while queued cancel their future
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                vectors = self.encode_fn([text for text, _ in batch])
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                logger.error(f"Local embedding batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.batches += 1
+            self.items += len(batch)
+
+class LocalEmbeddings:
+    """CPU sentence-transformers embeddings with dynamic batching across callers"""
+
+    def __init__(self, model_name: str, device: str = "cpu", runtime: str = "torch",
+                 quantize: bool = False, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model_name = model_name
+        self.device = device
+        self.runtime = runtime
+        self.quantize = quantize
+        self._model = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+        self._batcher = _DynamicBatcher(self._encode, max_batch_size, max_wait_ms)
+
+    def _load(self):
+        """Load the model on first use"""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            if self.runtime == "onnx":
+                try:
+                    from optimum.onnxruntime import ORTModelForFeatureExtraction
+                    from transformers import AutoTokenizer
+
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    self._model = ORTModelForFeatureExtraction.from_pretrained(
+                        self.model_name, export=True
+                    )
+                    logger.info(f"Loaded ONNX embedding model {self.model_name}")
+                    return
+                except ImportError:
+                    logger.warning("optimum[onnxruntime] is not installed, falling back to torch runtime")
+                    self.runtime = "torch"
+
+            from sentence_transformers import SentenceTransformer
+
+            model = SentenceTransformer(self.model_name, device=self.device)
+            if self.quantize and self.device == "cpu":
+                import torch
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            self._model = model
+            logger.info(f"Loaded local embedding model {self.model_name} on {self.device}")
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode a batch of texts into normalized vectors"""
+        self._load()
+
+        if self.runtime == "onnx":
+            import numpy as np
+
+            inputs = self._tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+            outputs = self._model(**inputs)
+            # Mean pooling over non-padding tokens
+            token_embeddings = outputs.last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            return pooled.tolist()
+
+        vectors = self._model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents through the shared batching worker"""
+        futures = [self._batcher.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query through the shared batching worker"""
+        return self._batcher.submit(text).result()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents without blocking the event loop"""
+        futures = [asyncio.wrap_future(self._batcher.submit(text)) for text in texts]
+        return list(await asyncio.gather(*futures))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query without blocking the event loop"""
+        return await asyncio.wrap_future(self._batcher.submit(text))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        batches = self._batcher.batches
+        return {
+            "model": self.model_name,
+            "runtime": self.runtime,
+            "quantized": self.quantize,
+            "batches": batches,
+            "avg_batch_size": self._batcher.items / batches if batches else 0.0
+        }
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Optional, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain.schema.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+class QueryEmbeddingBatcher:
+    """Collect concurrent query embeds on the event loop and issue them as one batched call.
+
+    A batch is flushed when it holds ``max_batch_size`` distinct texts or when
+    ``max_wait_ms`` has passed since its first request, whichever comes first.
+    Identical texts in a batch are embedded once and fanned out to every caller.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 3.0,
+                 executor: Optional[Executor] = None):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.full_batches = 0
+        self.deduplicated = 0
+        self.batch_sizes = deque(maxlen=1000)
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one query text as part of the current batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if text in self._pending:
+            self.deduplicated += 1
+        self._pending.setdefault(text, []).append(future)
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Hand the pending batch to a background embed call"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, List[asyncio.Future]]):
+        texts = list(batch)
+        self.batches += 1
+        self.texts += len(texts)
+        self.batch_sizes.append(len(texts))
+        if len(texts) >= self.max_batch_size:
+            self.full_batches += 1
+
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.embeddings.embed_documents, texts
+            )
+        except Exception as e:
+            logger.error(f"Batched query embedding failed: {e}")
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            for future in batch[text]:
+                # Callers that were cancelled while waiting are skipped
+                if not future.done():
+                    future.set_result(vector)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch-fill statistics"""
+        sizes = sorted(self.batch_sizes)
+        avg_batch_size = self.texts / self.batches if self.batches else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": avg_batch_size,
+            "avg_fill": avg_batch_size / self.max_batch_size,
+            "full_batches": self.full_batches,
+            "deduplicated": self.deduplicated,
+            "batch_size_p50": sizes[len(sizes) // 2] if sizes else None,
+            "batch_size_p95": sizes[int(len(sizes) * 0.95)] if sizes else None
+        }
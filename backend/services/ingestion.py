@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import codecs
+import hashlib
+import logging
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, BinaryIO, TYPE_CHECKING
+
+from services.text_splitter import StreamingTextSplitter, create_text_splitter
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 64 * 1024
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2")
+
+@dataclass
+class IngestionProgress:
+    job_id: str
+    status: str = "running"
+    files_total: int = 0
+    files_done: int = 0
+    current_file: Optional[str] = None
+    bytes_read: int = 0
+    chunks_added: int = 0
+    chunks_unchanged: int = 0
+    chunks_removed: int = 0
+    errors: List[str] = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        data["elapsed_seconds"] = end - self.started_at
+        data["chunks_per_second"] = self.chunks_added / data["elapsed_seconds"] if data["elapsed_seconds"] else 0.0
+        return data
+
+def chunk_id(source: Optional[str], text: str) -> str:
+    """Deterministic chunk id from its source and content, so re-ingesting is idempotent"""
+    return hashlib.sha1(f"{source or ''}\x00{text}".encode("utf-8")).hexdigest()
+
+def iter_text(stream: BinaryIO, progress: Optional[IngestionProgress] = None,
+              encoding: str = "utf-8") -> Iterator[str]:
+    """Read a binary stream incrementally and yield decoded text blocks"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        if progress is not None:
+            progress.bytes_read += len(block)
+        text = decoder.decode(block)
+        if text:
+            yield text
+
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def iter_upload_sources(filename: str, fileobj: BinaryIO,
+                        progress: Optional[IngestionProgress] = None) -> Iterator[Tuple[str, Iterator[str]]]:
+    """Yield (source name, text stream) pairs for a plain file or each member of an archive"""
+    lower_name = filename.lower()
+
+    if lower_name.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield f"{filename}/{info.filename}", iter_text(member, progress)
+        return
+
+    if lower_name.endswith(ARCHIVE_SUFFIXES):
+        # Stream mode reads members sequentially without seeking
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                extracted = archive.extractfile(member)
+                if extracted is not None:
+                    yield f"{filename}/{member.name}", iter_text(extracted, progress)
+        return
+
+    yield filename, iter_text(fileobj, progress)
+
+def iter_chunks(text_stream: Iterable[str], metadata: Dict[str, Any], chunk_size: Optional[int] = None,
+                chunk_overlap: Optional[int] = None,
+                splitter: Optional[StreamingTextSplitter] = None) -> Iterator[Document]:
+    """Lazily split a text stream into chunk documents carrying their position in the source"""
+    from langchain.schema import Document
+
+    splitter = splitter or create_text_splitter(chunk_size, chunk_overlap)
+    for chunk_index, (text, start_index) in enumerate(splitter.iter_chunks(text_stream)):
+        yield Document(
+            page_content=text,
+            metadata={**metadata, "chunk_index": chunk_index, "start_index": start_index}
+        )
+
+def take(iterator: Iterator[Document], count: int) -> List[Document]:
+    """Pull up to ``count`` items from an iterator"""
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= count:
+            break
+    return batch
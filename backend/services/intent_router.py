@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Dict, Any, Optional, AsyncIterator, Collection
+
+from config import Config
+from services.answer_templates import format_quote, format_recommendation, format_news
+from services.chat_orchestrator import ChatOrchestrator
+from services.news_scraper import NewsScraper
+from services.rag_service import RAGService
+from services.stock_service import StockService
+from services.tickers import KNOWN_SYMBOLS, extract_tickers
+
+logger = logging.getLogger(__name__)
+
+MAX_LOOKUP_SYMBOLS = 3
+
+class Intent(str, Enum):
+    QUOTE = "quote"
+    RECOMMENDATION = "recommendation"
+    NEWS = "news"
+    OPEN = "open"
+
+# Checked in order; the first intent whose pattern matches wins
+INTENT_PATTERNS = [
+    (Intent.RECOMMENDATION, re.compile(
+        r"\b(should i (buy|sell|hold|invest)|buy or sell|recommend\w*|good (buy|investment)|"
+        r"worth (buying|investing)|rating|outlook|price target)\b", re.IGNORECASE)),
+    (Intent.NEWS, re.compile(
+        r"\b(news|headlines?|latest on|what happened|announce\w*|press release)\b", re.IGNORECASE)),
+    (Intent.QUOTE, re.compile(
+        r"\b(price|quote|trading at|trade at|how much is|share price|stock price|market cap|"
+        r"how is .+ doing|up or down|p/?e ratio)\b", re.IGNORECASE)),
+]
+
+# Questions that need reasoning over documents rather than a lookup
+OPEN_QUESTION_PATTERN = re.compile(
+    r"\b(why|explain|compare|comparison|difference|versus|vs\.?|analy[sz]e|strategy|history of|"
+    r"what is an?|what are|how do(es)?)\b", re.IGNORECASE
+)
+
+@dataclass
+class IntentMatch:
+    intent: Intent
+    tickers: List[str] = field(default_factory=list)
+
+def classify(text: str, known_symbols: Collection[str] = KNOWN_SYMBOLS) -> IntentMatch:
+    """Classify a chat message as a quote, recommendation or news lookup, or an open question"""
+    tickers = extract_tickers(text, known_symbols)
+    if not tickers or OPEN_QUESTION_PATTERN.search(text):
+        return IntentMatch(Intent.OPEN, tickers)
+
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(text):
+            return IntentMatch(intent, tickers)
+    return IntentMatch(Intent.OPEN, tickers)
+
+class IntentRouter:
+    """Answer simple quote, recommendation and news questions directly, and the rest with RAG.
+
+    Open questions that mention symbols go through the ``ChatOrchestrator`` so
+    the RAG answer is enriched with live market data.
+    """
+
+    def __init__(self, stock_service: StockService, news_scraper: NewsScraper, rag_service: RAGService):
+        self.stock_service = stock_service
+        self.news_scraper = news_scraper
+        self.rag_service = rag_service
+        self.orchestrator = ChatOrchestrator(stock_service, news_scraper, rag_service)
+        self.latencies: Dict[str, deque] = {intent.value: deque(maxlen=1000) for intent in Intent}
+        self.counts: Dict[str, int] = {intent.value: 0 for intent in Intent}
+        self.fallbacks = 0
+
+    def classify(self, message: str) -> IntentMatch:
+        """Classify a message, accepting bare symbols the stock service has found quotes for"""
+        if not Config.INTENT_ROUTING_ENABLED:
+            return IntentMatch(Intent.OPEN)
+        return classify(message, KNOWN_SYMBOLS | self.stock_service.known_symbols)
+
+    async def process_query(self, message: str, conversation_id: Optional[str] = None) -> str:
+        """Answer a chat message, returning the same JSON shape as ``RAGService.process_query``"""
+        return json.dumps(await self.answer(message, conversation_id), default=str)
+
+    async def answer(self, message: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Answer a chat message as a dict, for callers that encode it themselves"""
+        start_time = time.perf_counter()
+        match = self.classify(message)
+
+        response = await self._answer_directly(match, message, conversation_id, start_time)
+        if response is not None:
+            return response
+
+        if self._should_enrich(match):
+            response = await self.orchestrator.process_query(message, match.tickers, conversation_id)
+        else:
+            response = json.loads(await self.rag_service.process_query(message, conversation_id))
+        response.update({"intent": Intent.OPEN.value, "tickers": match.tickers})
+        self._record(Intent.OPEN, start_time)
+        return response
+
+    async def stream_query(self, message: str,
+                           conversation_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an answer as ``RAGService.stream_query`` events"""
+        start_time = time.perf_counter()
+        match = self.classify(message)
+
+        response = await self._answer_directly(match, message, conversation_id, start_time)
+        if response is not None:
+            yield {"type": "sources", "sources": response["sources"]}
+            yield {"type": "token", "content": response["answer"]}
+            yield {"type": "done", **response}
+            return
+
+        if self._should_enrich(match):
+            events = self.orchestrator.stream_query(message, match.tickers, conversation_id)
+        else:
+            events = self.rag_service.stream_query(message, conversation_id)
+        async for event in events:
+            if event["type"] == "done":
+                event.update({"intent": Intent.OPEN.value, "tickers": match.tickers})
+                self._record(Intent.OPEN, start_time)
+            yield event
+
+    def _should_enrich(self, match: IntentMatch) -> bool:
+        """Open questions about specific symbols also get live market data"""
+        return bool(match.tickers) and Config.CHAT_ENRICHMENT_ENABLED
+
+    async def _answer_directly(self, match: IntentMatch, message: str, conversation_id: Optional[str],
+                               start_time: float) -> Optional[Dict[str, Any]]:
+        """Answer a lookup intent from the live services, or None to fall back to RAG"""
+        if match.intent == Intent.OPEN:
+            return None
+
+        try:
+            answer = await self._lookup(match)
+        except Exception as e:
+            logger.error(f"Direct {match.intent.value} lookup failed: {e}")
+            answer = None
+
+        if not answer:
+            self.fallbacks += 1
+            return None
+
+        await self.rag_service.record_turn(conversation_id, message, answer)
+        processing_time = self._record(match.intent, start_time)
+        return {
+            "answer": answer,
+            "sources": [],
+            "processing_time": processing_time,
+            "time_to_first_token": processing_time,
+            "confidence": 0.9,
+            "intent": match.intent.value,
+            "tickers": match.tickers
+        }
+
+    async def _lookup(self, match: IntentMatch) -> Optional[str]:
+        """Fetch and template the answer for a lookup intent, querying symbols concurrently"""
+        sections = await asyncio.gather(*(
+            self._lookup_symbol(match.intent, symbol) for symbol in match.tickers[:MAX_LOOKUP_SYMBOLS]
+        ))
+        return "\n\n".join(section for section in sections if section) or None
+
+    async def _lookup_symbol(self, intent: Intent, symbol: str) -> Optional[str]:
+        if intent == Intent.QUOTE:
+            info = await self.stock_service.get_stock_info(symbol)
+            return format_quote(info) if info and info.price is not None else None
+        if intent == Intent.RECOMMENDATION:
+            recommendation = await self.stock_service.get_stock_recommendation(symbol)
+            return format_recommendation(recommendation) if recommendation else None
+        if intent == Intent.NEWS:
+            articles = await self.news_scraper.get_stock_news(symbol, limit=5)
+            return format_news(symbol, articles) if articles else None
+        return None
+
+    def _record(self, intent: Intent, start_time: float) -> float:
+        elapsed = time.perf_counter() - start_time
+        self.counts[intent.value] += 1
+        self.latencies[intent.value].append(elapsed)
+        return elapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-intent counts and latency percentiles"""
+        stats: Dict[str, Any] = {"fallbacks": self.fallbacks, "enrichment": self.orchestrator.get_stats()}
+        for intent, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            stats[intent] = {
+                "count": self.counts[intent],
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[int(len(ordered) * 0.95)] if ordered else None
+            }
+        return stats
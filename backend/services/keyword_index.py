@@ -0,0 +1,282 @@
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+# Keep tickers, filing types and identifiers intact: "10-k", "brk.b", "s&p", "037833100"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[\-\.&][a-z0-9]+)*")
+
+STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "to", "was", "were", "will", "with"
+])
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase keyword tokens"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], weights: Optional[List[float]] = None,
+                           k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists with weighted reciprocal-rank fusion"""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class KeywordIndex:
+    """Incrementally maintained BM25 inverted index over chunk ids.
+
+    Only postings and document lengths are held; chunk text stays in Chroma.
+    Document ids are mapped to dense integers to keep posting lists compact.
+    Removed documents are tombstoned and their postings reclaimed by ``compact``.
+
+    Snapshots share posting lists with the live index instead of copying them;
+    a list is copied the first time it changes after a snapshot, so ``save``
+    only holds the lock long enough to copy the term table.
+
+    Scoring work is bounded by ``max_postings``: terms matching more chunks than
+    that only add to the scores of chunks already matched by rarer query terms,
+    and a query made only of such terms scans the first ``max_postings`` chunks
+    of its rarest term.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75,
+                 max_postings: int = 20000):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._ids: List[str] = []
+        self._id_to_num: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._total_length = 0
+        self._deleted: Set[int] = set()
+        # Terms whose posting lists are not shared with a snapshot being written
+        self._owned: Set[str] = set()
+        self._dirty = False
+        self._last_save = time.time()
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._id_to_num)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_num
+
+    def doc_ids(self) -> Set[str]:
+        """Ids of every live indexed chunk"""
+        with self._lock:
+            return set(self._id_to_num)
+
+    def add(self, doc_id: str, text: str):
+        """Index a single chunk"""
+        self.add_many([(doc_id, text)])
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        """Index chunks without rebuilding the existing index"""
+        with self._lock:
+            for doc_id, text in items:
+                if doc_id in self._id_to_num:
+                    continue
+
+                tokens = tokenize(text)
+                num = len(self._ids)
+                self._ids.append(doc_id)
+                self._id_to_num[doc_id] = num
+                self._lengths.append(len(tokens))
+                self._total_length += len(tokens)
+
+                for term, tf in Counter(tokens).items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = {}
+                        self._owned.add(term)
+                    elif term not in self._owned:
+                        postings = self._postings[term] = dict(postings)
+                        self._owned.add(term)
+                    postings[num] = tf
+
+            self._dirty = True
+
+    def remove(self, doc_ids: Iterable[str]) -> int:
+        """Tombstone chunks so they no longer match, returning how many were indexed"""
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                num = self._id_to_num.pop(doc_id, None)
+                if num is None:
+                    continue
+                self._deleted.add(num)
+                self._total_length -= self._lengths[num]
+                removed += 1
+            if removed:
+                self._dirty = True
+        return removed
+
+    @property
+    def tombstone_ratio(self) -> float:
+        """Fraction of indexed slots held by removed chunks"""
+        return len(self._deleted) / len(self._ids) if self._ids else 0.0
+
+    def compact(self) -> int:
+        """Drop tombstoned postings and renumber live chunks, returning slots reclaimed"""
+        with self._lock:
+            reclaimed = len(self._deleted)
+            if not reclaimed:
+                return 0
+
+            renumber: Dict[int, int] = {}
+            ids: List[str] = []
+            lengths = array("I")
+            for num, doc_id in enumerate(self._ids):
+                if num in self._deleted:
+                    continue
+                renumber[num] = len(ids)
+                ids.append(doc_id)
+                lengths.append(self._lengths[num])
+
+            postings: Dict[str, Dict[int, int]] = {}
+            for term, term_postings in self._postings.items():
+                live = {renumber[num]: tf for num, tf in term_postings.items() if num in renumber}
+                if live:
+                    postings[term] = live
+
+            self._postings = postings
+            self._owned = set(postings)
+            self._ids = ids
+            self._id_to_num = {doc_id: num for num, doc_id in enumerate(ids)}
+            self._lengths = lengths
+            self._deleted = set()
+            self._dirty = True
+
+        logger.info(f"Compacted keyword index, reclaimed {reclaimed} removed chunks")
+        return reclaimed
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return the top ``k`` (doc_id, bm25_score) pairs for a query"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self._id_to_num)
+            if doc_count == 0:
+                return []
+
+            avg_length = self._total_length / doc_count
+            lengths = self._lengths
+            deleted = self._deleted
+            k1, b = self.k1, self.b
+            scores: Dict[int, float] = {}
+
+            # Rarest terms first, so common terms can be limited to their matches
+            matched = sorted(
+                (postings for postings in map(self._postings.get, terms) if postings), key=len
+            )
+            for postings in matched:
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if len(postings) <= self.max_postings:
+                    candidates = postings.items()
+                elif scores:
+                    candidates = [(num, postings[num]) for num in list(scores) if num in postings]
+                else:
+                    candidates = islice(postings.items(), self.max_postings)
+
+                for num, tf in candidates:
+                    if num in deleted:
+                        continue
+                    norm = k1 * (1 - b + b * lengths[num] / avg_length)
+                    scores[num] = scores.get(num, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self._ids[num], score) for num, score in top]
+
+    def save(self):
+        """Write a snapshot of the index to disk"""
+        if not self.path:
+            return
+
+        with self._save_lock:
+            # Only the term table is copied under the lock; posting lists are shared
+            # until they next change, and ids and lengths are append-only until
+            # ``compact`` replaces them, so a prefix of each stays valid
+            with self._lock:
+                postings = dict(self._postings)
+                self._owned = set()
+                ids, lengths, count = self._ids, self._lengths, len(self._ids)
+                total_length = self._total_length
+                deleted = set(self._deleted)
+                self._dirty = False
+
+            state = {
+                "postings": postings,
+                "ids": ids[:count],
+                "lengths": lengths[:count],
+                "total_length": total_length,
+                "deleted": deleted
+            }
+
+            try:
+                tmp_path = f"{self.path}.tmp"
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                self._dirty = True
+                raise
+            self._last_save = time.time()
+
+    def save_if_dirty(self, min_interval: float = 60.0):
+        """Snapshot the index if it changed and the last snapshot is old enough"""
+        if self._dirty and time.time() - self._last_save >= min_interval:
+            self.save()
+
+    def load(self) -> bool:
+        """Load the index snapshot from disk, returning whether one was found"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+            with self._lock:
+                self._postings = state["postings"]
+                self._ids = state["ids"]
+                self._deleted = set(state.get("deleted", ()))
+                self._id_to_num = {
+                    doc_id: num for num, doc_id in enumerate(self._ids) if num not in self._deleted
+                }
+                self._lengths = state["lengths"]
+                self._total_length = state["total_length"]
+                self._owned = set(self._postings)
+                self._dirty = False
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load keyword index snapshot: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index size statistics"""
+        return {
+            "documents": len(self._id_to_num),
+            "terms": len(self._postings),
+            "tombstones": len(self._deleted),
+            "avg_length": self._total_length / len(self._id_to_num) if self._id_to_num else 0.0
+        }
@@ -1,39 +1,157 @@
 import asyncio
 import json
 import logging
+import random
+import time
 from typing import Dict, Any, List, Optional
-import aiohttp
 from datetime import datetime
 
+from config import Config
+
 logger = logging.getLogger(__name__)
 
+# Per-tool deadlines in seconds, retries included
+TOOL_TIMEOUTS = {
+    "market_data": 3.0,
+    "sentiment_analysis": 5.0,
+    "news_analysis": 10.0,
+    "technical_analysis": 8.0,
+    "risk_assessment": 8.0,
+}
+
+# Read-only tools that are safe to retry. Discovered tools can also opt in with
+# an ``idempotentHint`` or ``readOnlyHint`` annotation.
+IDEMPOTENT_TOOLS = frozenset(TOOL_TIMEOUTS)
+
+# Don't start another attempt with less time than this left before the deadline
+MIN_ATTEMPT_SECONDS = 0.05
+
+class MCPCallError(Exception):
+    """A failed MCP request; ``retryable`` is False for client errors such as a bad tool name"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class CircuitBreaker:
+    """Fail fast after repeated MCP failures.
+
+    Opens after ``failure_threshold`` consecutive failures. After
+    ``reset_seconds`` one trial call is let through (half-open): success closes
+    the breaker, failure opens it again. A trial that is cancelled, or that has
+    not reported back within another ``reset_seconds``, is abandoned and the
+    next call becomes the trial.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if ((self.state == "open" and now - self.opened_at >= self.reset_seconds)
+                or (self.state == "half_open" and now - self.trial_started >= self.reset_seconds)):
+            self.state = "half_open"
+            self.trial_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def abandon_trial(self):
+        """A half-open trial ended without an outcome; let the next call try instead"""
+        if self.state == "half_open":
+            self.state = "open"
+            self.opened_at = time.monotonic() - self.reset_seconds
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(f"MCP circuit breaker opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
 class MCPServer:
     def __init__(self):
-        self.base_url = "http://localhost:3001"  # Default MCP server URL
+        self.base_url = Config.MCP_SERVER_URL.rstrip("/")
         self.session = None
         self.available_tools = []
+        self.connected = False
+        self.breaker = CircuitBreaker(Config.MCP_BREAKER_FAILURES, Config.MCP_BREAKER_RESET_SECONDS)
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self._reconnect_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
-        """Initialize MCP server connection"""
-        try:
-            self.session = aiohttp.ClientSession()
-            
-            # Test connection
-            async with self.session.get(f"{self.base_url}/health") as response:
-                if response.status == 200:
-                    logger.info("MCP server connection established")
-                    await self._discover_tools()
-                else:
-                    logger.warning("MCP server not available")
-                    
-        except Exception as e:
-            logger.warning(f"Failed to connect to MCP server: {e}")
+        """Open a pooled keep-alive session, connect, and keep reconnecting in the background"""
+        import aiohttp
+        
+        connector = aiohttp.TCPConnector(
+            limit=Config.MCP_POOL_SIZE,
+            limit_per_host=Config.MCP_POOL_SIZE,
+            keepalive_timeout=Config.MCP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.MCP_TOOL_TIMEOUT, connect=Config.MCP_CONNECT_TIMEOUT)
+        )
+        
+        await self._connect()
+        if not self.connected:
+            logger.warning("MCP server not available, retrying in the background")
+        self._reconnect_task = asyncio.create_task(self._maintain_connection())
     
     async def close(self):
         """Close MCP server connection"""
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
         if self.session:
             await self.session.close()
     
+    async def _connect(self) -> bool:
+        """Check health and rediscover tools, returning whether the server is reachable"""
+        health = await self.health_check()
+        was_connected, self.connected = self.connected, health["status"] == "healthy"
+        if self.connected:
+            if not was_connected:
+                logger.info("MCP server connection established")
+            await self._discover_tools()
+        elif was_connected:
+            logger.warning(f"Lost MCP server connection: {health.get('error')}")
+        return self.connected
+    
+    async def _maintain_connection(self):
+        """Reconnect with jittered backoff while the server is down, and refresh tools while it's up"""
+        delay = 1.0
+        while True:
+            if self.connected:
+                delay = 1.0
+                await asyncio.sleep(Config.MCP_RECONNECT_INTERVAL_SECONDS)
+            else:
+                await asyncio.sleep(random.uniform(0.5, 1.0) * delay)
+                delay = min(delay * 2, Config.MCP_RECONNECT_INTERVAL_SECONDS)
+            try:
+                await self._connect()
+            except Exception as e:
+                logger.error(f"MCP reconnect failed: {e}")
+    
     async def _discover_tools(self):
         """Discover available tools from MCP server"""
         try:
@@ -46,28 +164,89 @@ class MCPServer:
         except Exception as e:
             logger.error(f"Failed to discover MCP tools: {e}")
     
+    def _is_idempotent(self, tool_name: str) -> bool:
+        if tool_name in IDEMPOTENT_TOOLS:
+            return True
+        for tool in self.available_tools:
+            if tool.get("name") == tool_name:
+                annotations = tool.get("annotations") or {}
+                return bool(annotations.get("idempotentHint") or annotations.get("readOnlyHint"))
+        return False
+    
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a tool through MCP server"""
+        """Execute a tool through MCP server.
+        
+        The call, retries included, is bounded by the tool's deadline. Idempotent
+        tools are retried with jittered exponential backoff on timeouts, connection
+        errors and 5xx responses. While the circuit breaker is open, calls fail at
+        once so callers go straight to their fallbacks.
+        """
+        if not self.session:
+            return {"error": "MCP server not connected"}
+        if not self.breaker.allow():
+            return {"error": "MCP server unavailable (circuit open)"}
+        
+        trial = self.breaker.state == "half_open"
         try:
-            if not self.session:
-                return {"error": "MCP server not connected"}
-            
-            payload = {
-                "tool": tool_name,
-                "parameters": parameters,
-                "timestamp": datetime.now().isoformat()
-            }
+            return await self._execute_with_retries(tool_name, parameters)
+        except BaseException:
+            # Cancelled mid-call: don't leave the breaker waiting on a trial that will never report
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+    
+    async def _execute_with_retries(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + TOOL_TIMEOUTS.get(tool_name, Config.MCP_TOOL_TIMEOUT)
+        attempts = 1 + (Config.MCP_MAX_RETRIES if self._is_idempotent(tool_name) else 0)
+        
+        for attempt in range(attempts):
+            try:
+                # Split what's left of the deadline so a timed-out attempt still leaves room to retry
+                timeout = (deadline - loop.time()) / (attempts - attempt)
+                result = await self._post_execute(tool_name, parameters, timeout)
+                self.breaker.record_success()
+                return result
+            except MCPCallError as e:
+                error = str(e)
+                if not e.retryable:
+                    # The server answered; it's the request that was wrong
+                    self.breaker.record_success()
+                    return {"error": error}
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                error = f"Tool {tool_name} timed out"
+            except Exception as e:
+                error = str(e)
             
-            async with self.session.post(f"{self.base_url}/execute", json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result
-                else:
-                    return {"error": f"Tool execution failed: {response.status}"}
-                    
-        except Exception as e:
-            logger.error(f"Failed to execute MCP tool {tool_name}: {e}")
-            return {"error": str(e)}
+            self.breaker.record_failure()
+            backoff = random.uniform(0, Config.MCP_RETRY_BASE_DELAY * 2 ** attempt)
+            if (attempt + 1 >= attempts or not self.breaker.allow()
+                    or deadline - loop.time() - backoff < MIN_ATTEMPT_SECONDS):
+                break
+            self.retries += 1
+            await asyncio.sleep(backoff)
+        
+        self.failures += 1
+        logger.error(f"Failed to execute MCP tool {tool_name}: {error}")
+        return {"error": error}
+    
+    async def _post_execute(self, tool_name: str, parameters: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        import aiohttp
+        
+        payload = {
+            "tool": tool_name,
+            "parameters": parameters,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        async with self.session.post(
+            f"{self.base_url}/execute", json=payload, timeout=aiohttp.ClientTimeout(total=max(timeout, 0))
+        ) as response:
+            if response.status == 200:
+                return await response.json()
+            raise MCPCallError(f"Tool execution failed: {response.status}", retryable=response.status >= 500)
     
     async def get_market_data(self, symbol: str) -> Dict[str, Any]:
         """Get enhanced market data through MCP tools"""
@@ -151,15 +330,33 @@ class MCPServer:
     
     async def health_check(self) -> Dict[str, Any]:
         """Check MCP server health"""
+        import aiohttp
+        
         try:
             if not self.session:
                 return {"status": "disconnected", "error": "No session"}
             
-            async with self.session.get(f"{self.base_url}/health") as response:
+            async with self.session.get(
+                f"{self.base_url}/health", timeout=aiohttp.ClientTimeout(total=Config.MCP_CONNECT_TIMEOUT)
+            ) as response:
                 if response.status == 200:
                     return {"status": "healthy", "tools": len(self.available_tools)}
                 else:
                     return {"status": "unhealthy", "error": f"HTTP {response.status}"}
                     
         except Exception as e:
-            return {"status": "error", "error": str(e)} 
\ No newline at end of file
+            return {"status": "error", "error": str(e) or type(e).__name__}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get call, retry and circuit breaker statistics"""
+        return {
+            "connected": self.connected,
+            "tools": len(self.available_tools),
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "breaker_rejected": self.breaker.rejected
+        }
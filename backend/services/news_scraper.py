@@ -1,22 +1,19 @@
 import asyncio
-import aiohttp
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import json
-import feedparser
-from bs4 import BeautifulSoup
-import yfinance as yf
-from newsapi import NewsApiClient
 import re
 
+# aiohttp, feedparser, bs4 and newsapi are imported on first use to keep startup fast
+
 from models.schemas import NewsArticle
 
 logger = logging.getLogger(__name__)
 
 class NewsScraper:
     def __init__(self):
-        self.news_api = NewsApiClient(api_key=self._get_news_api_key())
+        self._news_api = None
         self.session = None
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -43,6 +40,14 @@ class NewsScraper:
             'https://feeds.finance.yahoo.com/rss/2.0/headline'
         ]
     
+    @property
+    def news_api(self):
+        """News API client, created on first use"""
+        if self._news_api is None:
+            from newsapi import NewsApiClient
+            self._news_api = NewsApiClient(api_key=self._get_news_api_key())
+        return self._news_api
+    
     def _get_news_api_key(self) -> str:
         """Get News API key from environment"""
         import os
@@ -50,6 +55,7 @@ class NewsScraper:
     
     async def initialize(self):
         """Initialize aiohttp session"""
+        import aiohttp
         self.session = aiohttp.ClientSession(headers=self.headers)
     
     async def close(self):
@@ -127,6 +133,8 @@ class NewsScraper:
     
     async def _get_rss_articles(self, limit: int) -> List[NewsArticle]:
         """Get articles from RSS feeds"""
+        import feedparser
+        
         try:
             articles = []
             
@@ -182,6 +190,8 @@ class NewsScraper:
     
     async def _scrape_reuters(self, limit: int) -> List[NewsArticle]:
         """Scrape articles from Reuters"""
+        from bs4 import BeautifulSoup
+        
         try:
             if not self.session:
                 return []
@@ -229,6 +239,8 @@ class NewsScraper:
     
     async def _scrape_marketwatch(self, limit: int) -> List[NewsArticle]:
         """Scrape articles from MarketWatch"""
+        from bs4 import BeautifulSoup
+        
         try:
             if not self.session:
                 return []
@@ -355,11 +367,15 @@ class NewsScraper:
         try:
             # Get news from News API
             if self._get_news_api_key():
-                response = self.news_api.get_everything(
-                    q=f"{symbol} stock",
-                    language='en',
-                    sort_by='publishedAt',
-                    page_size=limit
+                # The News API client is synchronous, so keep it off the event loop
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: self.news_api.get_everything(
+                        q=f"{symbol} stock",
+                        language='en',
+                        sort_by='publishedAt',
+                        page_size=limit
+                    )
                 )
                 
                 articles = []
@@ -1,108 +1,260 @@
+from __future__ import annotations
+
 import os
 import asyncio
+import copy
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Iterator, Set, TYPE_CHECKING
+from datetime import datetime, timedelta
 import json
 
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain.vectorstores import Chroma
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationalRetrievalChain
+from config import Config
+from models.schemas import RAGQuery, RAGResponse, RAGFilter
+from services.concurrency import ConcurrencyLimiter
+from services.context_packer import pack_context
+from services.conversation_store import ConversationStore, Turn
+from services.embedding_backends import (
+    EMBEDDING_MODEL_KEY, check_collection_model, collection_name_for, create_embeddings
+)
+from services.embedding_batcher import QueryEmbeddingBatcher
+from services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from services.ingestion import IngestionProgress, chunk_id, iter_chunks, take
+from services.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from services.reranker import CrossEncoderReranker
+from services.semantic_cache import SemanticAnswerCache
+from services.text_splitter import create_text_splitter
+from services.tickers import extract_tickers
+from services.tokenizer import count_tokens
 
-from models.schemas import RAGQuery, RAGResponse
+# chromadb, langchain and numpy are imported where they are first used so that
+# importing this module (and starting the API) stays fast
+if TYPE_CHECKING:
+    from langchain.schema import Document
 
 logger = logging.getLogger(__name__)
 
+CONDENSE_QUESTION_PROMPT = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question, in its original language.
+
+Chat History:
+{chat_history}
+Follow Up Input: {question}
+Standalone question:"""
+
+QA_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+
+SUMMARY_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new concise summary.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
 class RAGService:
     def __init__(self):
         self.embeddings = None
         self.vectorstore = None
         self.llm = None
-        self.qa_chain = None
+        self.keyword_index = None
+        self.reranker = None
         self.memory = None
         self.collection = None
+        self.collection_name = Config.COLLECTION_NAME
         self.chroma_client = None
+        self.embedding_cache = None
+        self.query_embedder = None
+        self.answer_cache = None
+        self.collection_version = 0
+        self.ingestion_jobs: "OrderedDict[str, IngestionProgress]" = OrderedDict()
+        self.time_to_first_token = deque(maxlen=1000)
+        self.context_tokens = deque(maxlen=1000)
+        self.index_counts = {"embedded": 0, "unchanged": 0, "removed": 0, "compactions": 0}
+        # Ingest batches and deletes update the counts from executor threads
+        self._counts_lock = threading.Lock()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._keyword_save: Optional[asyncio.Future] = None
+        
+        # Retrieval (embedding + Chroma) is blocking, so it runs on a bounded pool;
+        # LLM calls are async but capped so bursts queue instead of hitting rate limits
+        self.retrieval_executor = ThreadPoolExecutor(
+            max_workers=Config.RETRIEVAL_WORKERS, thread_name_prefix="rag-retrieval"
+        )
+        self.llm_limiter = ConcurrencyLimiter("llm", Config.MAX_INFLIGHT_LLM_CALLS)
         
     async def initialize(self):
         """Initialize the RAG service with embeddings and vector store"""
         try:
-            # Initialize OpenAI embeddings
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model="text-embedding-ada-002"
-            )
-            
-            # Initialize ChromaDB client
-            self.chroma_client = chromadb.PersistentClient(
-                path="./data/chroma_db",
-                settings=Settings(anonymized_telemetry=False)
-            )
+            # Loading models, Chroma and the keyword index blocks, so keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._initialize_components)
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+            logger.info("RAG service initialized successfully")
             
-            # Get or create collection
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="finance_knowledge",
-                metadata={"hnsw:space": "cosine"}
+        except Exception as e:
+            logger.error(f"Failed to initialize RAG service: {e}")
+            raise
+    
+    def _initialize_components(self):
+        """Create embeddings, vector store, LLM, caches and memory"""
+        import chromadb
+        from chromadb.config import Settings
+        from langchain.vectorstores import Chroma
+        from langchain_openai import ChatOpenAI
+        
+        # Initialize embeddings (OpenAI or local, selected by EMBEDDING_MODEL)
+        self.embeddings = create_embeddings(Config.EMBEDDING_MODEL)
+        
+        # Serve repeated document and query texts from the on-disk cache
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                path=Config.EMBEDDING_CACHE_PATH,
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES
             )
-            
-            # Initialize LangChain vector store
-            self.vectorstore = Chroma(
-                client=self.chroma_client,
-                collection_name="finance_knowledge",
-                embedding_function=self.embeddings
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                model_name=Config.EMBEDDING_MODEL,
+                cache=self.embedding_cache
             )
-            
-            # Initialize LLM
-            self.llm = ChatOpenAI(
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model="gpt-3.5-turbo",
-                temperature=0.7
+        
+        # Concurrent queries share batched embedding calls
+        if Config.QUERY_EMBED_BATCHING:
+            self.query_embedder = QueryEmbeddingBatcher(
+                self.embeddings,
+                max_batch_size=Config.QUERY_EMBED_BATCH_SIZE,
+                max_wait_ms=Config.QUERY_EMBED_BATCH_WAIT_MS,
+                executor=self.retrieval_executor
             )
-            
-            # Initialize memory
-            self.memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True
+        
+        # Initialize ChromaDB client
+        self.chroma_client = chromadb.PersistentClient(
+            path="./data/chroma_db",
+            settings=Settings(anonymized_telemetry=False)
+        )
+        
+        # Each embedding model gets its own collection; refuse to mix vector sizes.
+        # Check before get_or_create, which replaces the stored metadata.
+        self.collection_name = collection_name_for(Config.EMBEDDING_MODEL)
+        for existing in self.chroma_client.list_collections():
+            if existing.name == self.collection_name:
+                check_collection_model(self.collection_name, existing.metadata, Config.EMBEDDING_MODEL)
+        
+        # Get or create collection. HNSW build parameters (M, construction_ef) only
+        # take effect when the collection is created; search_ef applies on load.
+        self.collection = self.chroma_client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={
+                EMBEDDING_MODEL_KEY: Config.EMBEDDING_MODEL,
+                "hnsw:space": "cosine",
+                "hnsw:M": Config.HNSW_M,
+                "hnsw:construction_ef": Config.HNSW_CONSTRUCTION_EF,
+                "hnsw:search_ef": Config.HNSW_SEARCH_EF
+            }
+        )
+        
+        # Initialize LangChain vector store
+        self.vectorstore = Chroma(
+            client=self.chroma_client,
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings
+        )
+        
+        # Initialize LLM
+        self.llm = ChatOpenAI(
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            model=Config.LLM_MODEL,
+            temperature=0.7
+        )
+        
+        # Answer cache for repeated standalone questions
+        if Config.SEMANTIC_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                ttl_seconds=Config.SEMANTIC_CACHE_TTL_SECONDS,
+                max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES
             )
-            
-            # Create QA chain
-            self.qa_chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
-                retriever=self.vectorstore.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 5}
-                ),
-                memory=self.memory,
-                return_source_documents=True,
-                verbose=True
+        
+        # Initialize per-conversation memory
+        self.memory = ConversationStore(
+            data_dir=Config.CONVERSATION_DATA_DIR,
+            token_budget=Config.CONVERSATION_TOKEN_BUDGET,
+            idle_seconds=Config.CONVERSATION_IDLE_SECONDS,
+            max_in_memory=Config.CONVERSATION_MAX_IN_MEMORY,
+            summarizer=self._summarize_turns if Config.CONVERSATION_SUMMARIZE else None
+        )
+        
+        # Keyword index fused with vector search for exact terms and tickers
+        if Config.HYBRID_SEARCH_ENABLED:
+            self.keyword_index = KeywordIndex(path=self._keyword_index_path(),
+                                              max_postings=Config.KEYWORD_MAX_POSTINGS)
+            self._sync_keyword_index()
+        
+        # Optional cross-encoder pass over an over-fetched candidate set
+        if Config.RERANK_ENABLED:
+            self.reranker = CrossEncoderReranker(
+                model_name=Config.RERANK_MODEL,
+                batch_size=Config.RERANK_BATCH_SIZE,
+                budget_ms=Config.RERANK_BUDGET_MS,
+                device=Config.EMBEDDING_DEVICE
             )
-            
-            logger.info("RAG service initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize RAG service: {e}")
-            raise
     
-    async def add_documents(self, documents: List[Document]):
-        """Add documents to the vector store"""
+    async def warmup(self):
+        """Pay one-off first-query costs before serving traffic"""
+        await asyncio.get_running_loop().run_in_executor(None, self._warmup_components)
+    
+    def _warmup_components(self):
+        """Load the HNSW index, open the embedding client and import query-path modules"""
+        import numpy  # noqa: F401
+        from langchain.schema import Document  # noqa: F401
+        
+        started = time.perf_counter()
+        
+        # Bypass the embedding cache so the model or API client itself is exercised
+        embeddings = getattr(self.embeddings, "embeddings", self.embeddings)
+        vector = embeddings.embed_query("warmup")
+        
+        # Chroma loads a collection's HNSW index from disk on its first query
+        if self.collection.count() > 0:
+            self.collection.query(query_embeddings=[vector], n_results=1, include=["distances"])
+        
+        if self.reranker is not None:
+            self.reranker.warmup()
+        
+        count_tokens("warmup")
+        logger.info(f"RAG service warmed up in {time.perf_counter() - started:.2f}s")
+    
+    async def add_documents(self, documents: List[Document], replace_sources: bool = False):
+        """Add documents to the vector store.
+        
+        Chunks already stored under the same source and content are not re-embedded.
+        With ``replace_sources``, stored chunks of the documents' sources that are no
+        longer produced are removed, so the call replaces each source's contents.
+        """
         try:
             # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            
-            chunks = text_splitter.split_documents(documents)
+            text_splitter = create_text_splitter()
+            chunks = [
+                chunk for document in documents
+                for chunk in iter_chunks([document.page_content], document.metadata, splitter=text_splitter)
+            ]
             
             # Add to vector store
-            self.vectorstore.add_documents(chunks)
+            self._index_chunks(chunks)
+            if replace_sources:
+                seen: Dict[str, Set[str]] = {}
+                for chunk in chunks:
+                    self._record_chunk(seen, chunk)
+                self._prune_sources(seen)
+            self._on_collection_changed()
             
             logger.info(f"Added {len(chunks)} document chunks to vector store")
             return len(chunks)
@@ -111,37 +263,206 @@ class RAGService:
             logger.error(f"Failed to add documents: {e}")
             raise
     
-    async def process_query(self, query: str, conversation_id: Optional[str] = None) -> str:
-        """Process a query using RAG"""
+    async def add_document_stream(self, chunks: Iterator[Document],
+                                  progress: Optional[IngestionProgress] = None,
+                                  replace_sources: bool = True) -> int:
+        """Embed and store lazily produced chunks in fixed-size batches with bounded concurrency.
+        
+        With ``replace_sources``, once every batch has been stored, chunks left over
+        from earlier versions of the ingested sources are removed.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(Config.INGEST_CONCURRENCY)
+        tasks = []
+        total = 0
+        seen: Dict[str, Set[str]] = {}
+        
+        async def add_batch(batch: List[Document]):
+            try:
+                embedded = await loop.run_in_executor(None, self._index_chunks, batch)
+                if progress is not None:
+                    progress.chunks_added += len(batch)
+                    progress.chunks_unchanged += len(batch) - embedded
+            finally:
+                semaphore.release()
+        
         try:
-            start_time = datetime.now()
-            
-            # Process query through QA chain
-            result = self.qa_chain({"question": query})
+            while True:
+                # Wait for a free slot before reading further, so at most
+                # INGEST_CONCURRENCY batches are held in memory at once
+                await semaphore.acquire()
+                batch = await loop.run_in_executor(None, take, chunks, Config.INGEST_BATCH_SIZE)
+                if not batch:
+                    semaphore.release()
+                    break
+                total += len(batch)
+                if replace_sources:
+                    for chunk in batch:
+                        self._record_chunk(seen, chunk)
+                tasks.append(asyncio.create_task(add_batch(batch)))
+                
+                # Surface failed batches before reading any further
+                for task in [task for task in tasks if task.done()]:
+                    tasks.remove(task)
+                    task.result()
             
-            # Extract answer and sources
-            answer = result.get("answer", "I couldn't find a relevant answer.")
-            source_documents = result.get("source_documents", [])
-            
-            # Format sources
-            sources = []
-            for doc in source_documents:
-                sources.append({
-                    "content": doc.page_content[:200] + "...",
-                    "metadata": doc.metadata
-                })
+            await asyncio.gather(*tasks)
             
-            processing_time = (datetime.now() - start_time).total_seconds()
-            
-            # Create response with sources
-            response = {
-                "answer": answer,
-                "sources": sources,
-                "processing_time": processing_time,
-                "confidence": self._calculate_confidence(answer, sources)
-            }
+            # A source that failed part-way was not fully re-read, so leave its old chunks
+            if seen and not (progress is not None and progress.errors):
+                removed = await loop.run_in_executor(None, self._prune_sources, seen)
+                if progress is not None:
+                    progress.chunks_removed += removed
+        finally:
+            if total:
+                self._on_collection_changed()
+        
+        logger.info(f"Streamed {total} document chunks into vector store")
+        return total
+    
+    def start_ingestion_job(self, job_id: str) -> IngestionProgress:
+        """Register progress tracking for an ingestion job"""
+        progress = IngestionProgress(job_id=job_id)
+        self.ingestion_jobs[job_id] = progress
+        while len(self.ingestion_jobs) > 100:
+            self.ingestion_jobs.popitem(last=False)
+        return progress
+    
+    def get_ingestion_job(self, job_id: str) -> Optional[IngestionProgress]:
+        """Get progress for an ingestion job"""
+        return self.ingestion_jobs.get(job_id)
+    
+    def _index_chunks(self, chunks: List[Document]) -> int:
+        """Upsert chunks into the vector store and keyword index, returning how many were embedded.
+        
+        Chunk ids are derived from source and content, so chunks that are already
+        stored only get their metadata refreshed and are not embedded again.
+        """
+        # Normalize the metadata used by search filters
+        ingested_at = time.time()
+        by_id: Dict[str, Document] = {}
+        for chunk in chunks:
+            chunk.metadata.setdefault("timestamp", ingested_at)
+            if chunk.metadata.get("ticker"):
+                chunk.metadata["ticker"] = str(chunk.metadata["ticker"]).upper()
+            by_id[chunk_id(chunk.metadata.get("source"), chunk.page_content)] = chunk
+        
+        existing = set(self.collection.get(ids=list(by_id), include=[])["ids"])
+        if existing:
+            unchanged = [doc_id for doc_id in by_id if doc_id in existing]
+            self.collection.update(ids=unchanged, metadatas=[by_id[doc_id].metadata for doc_id in unchanged])
+        
+        new_ids = [doc_id for doc_id in by_id if doc_id not in existing]
+        if new_ids:
+            self.vectorstore.add_documents([by_id[doc_id] for doc_id in new_ids], ids=new_ids)
+            if self.keyword_index is not None:
+                self.keyword_index.add_many((doc_id, by_id[doc_id].page_content) for doc_id in new_ids)
+        
+        self._count(embedded=len(new_ids), unchanged=len(existing))
+        return len(new_ids)
+    
+    def _get_index_counts(self) -> Dict[str, int]:
+        """Snapshot the indexing counters"""
+        with self._counts_lock:
+            return dict(self.index_counts)
+    
+    def _count(self, **deltas: int):
+        """Add to the indexing counters"""
+        with self._counts_lock:
+            for name, delta in deltas.items():
+                self.index_counts[name] += delta
+    
+    @staticmethod
+    def _record_chunk(seen: Dict[str, Set[str]], chunk: Document):
+        """Track the chunk ids produced for each source during an ingestion"""
+        source = chunk.metadata.get("source")
+        if source:
+            seen.setdefault(source, set()).add(chunk_id(source, chunk.page_content))
+    
+    def _prune_sources(self, seen: Dict[str, Set[str]]) -> int:
+        """Remove stored chunks of each source that the latest ingestion no longer produced"""
+        stale = []
+        for source, ids in seen.items():
+            stored = self.collection.get(where={"source": source}, include=[])["ids"]
+            stale.extend(doc_id for doc_id in stored if doc_id not in ids)
+        return self._delete_ids(stale)
+    
+    def _delete_ids(self, ids: List[str], batch_size: int = 1000) -> int:
+        """Delete chunks from the vector store and tombstone them in the keyword index"""
+        for offset in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[offset:offset + batch_size])
+        if ids and self.keyword_index is not None:
+            self.keyword_index.remove(ids)
+        self._count(removed=len(ids))
+        return len(ids)
+    
+    def _delete_where(self, where: Dict[str, Any]) -> int:
+        """Delete every chunk matching a metadata filter"""
+        return self._delete_ids(self.collection.get(where=where, include=[])["ids"])
+    
+    async def delete_by_source(self, source: str) -> int:
+        """Remove every chunk ingested from a source"""
+        deleted = await asyncio.get_running_loop().run_in_executor(
+            None, self._delete_where, {"source": source}
+        )
+        if deleted:
+            self._on_collection_changed()
+        logger.info(f"Deleted {deleted} chunks from source {source}")
+        return deleted
+    
+    async def delete_older_than(self, cutoff: datetime) -> int:
+        """Remove every chunk ingested before ``cutoff``"""
+        deleted = await asyncio.get_running_loop().run_in_executor(
+            None, self._delete_where, {"timestamp": {"$lt": cutoff.timestamp()}}
+        )
+        if deleted:
+            self._on_collection_changed()
+        logger.info(f"Deleted {deleted} chunks ingested before {cutoff.isoformat()}")
+        return deleted
+    
+    async def _maintenance_loop(self):
+        """Periodically apply document retention and compact the keyword index"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(Config.INDEX_MAINTENANCE_INTERVAL_SECONDS)
+            try:
+                if Config.DOCUMENT_RETENTION_DAYS > 0:
+                    await self.delete_older_than(
+                        datetime.now() - timedelta(days=Config.DOCUMENT_RETENTION_DAYS)
+                    )
+                
+                if (self.keyword_index is not None
+                        and self.keyword_index.tombstone_ratio >= Config.KEYWORD_INDEX_COMPACT_RATIO):
+                    await loop.run_in_executor(None, self._compact_keyword_index)
+                
+                # Long ingestions only change the collection version at the end
+                self._schedule_keyword_save()
+            except Exception as e:
+                logger.error(f"Index maintenance failed: {e}")
+    
+    def _compact_keyword_index(self):
+        """Reclaim removed chunks from the keyword index and snapshot it"""
+        if self.keyword_index.compact():
+            self._count(compactions=1)
+            self.keyword_index.save()
+    
+    async def process_query(self, query: str, conversation_id: Optional[str] = None, top_k: int = 5,
+                            filters: Optional[RAGFilter] = None) -> str:
+        """Process a query using RAG"""
+        try:
+            response = {}
+            async for event in self.stream_query(query, conversation_id, top_k, filters):
+                if event["type"] == "done":
+                    response = {
+                        "answer": event["answer"],
+                        "sources": event["sources"],
+                        "processing_time": event["processing_time"],
+                        "time_to_first_token": event["time_to_first_token"],
+                        "confidence": event["confidence"]
+                    }
+                elif event["type"] == "error":
+                    raise RuntimeError(event["message"])
             
-            logger.info(f"Processed query in {processing_time:.2f}s")
             return json.dumps(response)
             
         except Exception as e:
@@ -153,17 +474,332 @@ class RAGService:
                 "confidence": 0.0
             })
     
-    async def search_similar(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    async def stream_query(self, query: str, conversation_id: Optional[str] = None, top_k: int = 5,
+                           filters: Optional[RAGFilter] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query using RAG, yielding sources first and then answer tokens.
+        
+        Events are dicts with a ``type`` of ``sources``, ``token``, ``done`` or ``error``.
+        """
         try:
-            docs = self.vectorstore.similarity_search(query, k=top_k)
+            start_time = time.perf_counter()
+            chat_history = await self.memory.get_history(conversation_id)
+            
+            where = self._build_where(filters)
+            
+            # Follow-up questions depend on their conversation, so only standalone,
+            # unfiltered questions with the default context size are cached
+            if self.answer_cache is None or chat_history or where or top_k != 5:
+                async for event in self._generate_answer(query, conversation_id, chat_history, start_time,
+                                                         top_k, where):
+                    yield event
+                return
+            
+            query_vector = await self._embed_query(query)
+            # Near-identical questions about different companies must not share answers
+            tickers = extract_tickers(query, known_symbols=None)
+            cached = self.answer_cache.lookup(query_vector, self.collection_version, tickers)
+            if cached is None:
+                pending = self.answer_cache.get_pending(query)
+                if pending is not None:
+                    # An identical question is already being answered; share its result,
+                    # copied because every waiter gets the same object
+                    cached = copy.deepcopy(await asyncio.shield(pending))
+            
+            if cached is not None:
+                await self.memory.add_turn(conversation_id, query, cached["answer"])
+                async for event in self._replay_cached(cached, start_time):
+                    yield event
+                return
+            
+            self.answer_cache.begin(query)
+            collection_version = self.collection_version
+            result = None
+            try:
+                async for event in self._generate_answer(query, conversation_id, chat_history, start_time,
+                                                         top_k, where, query_vector):
+                    if event["type"] == "done":
+                        result = event
+                        self.answer_cache.store(query, query_vector, event, collection_version,
+                                                tickers=tickers)
+                    yield event
+            finally:
+                # Waiters fall back to generating themselves if we failed or were cancelled
+                self.answer_cache.complete(query, result)
             
+        except Exception as e:
+            logger.error(f"Failed to stream query: {e}")
+            yield {"type": "error", "message": str(e)}
+    
+    async def _generate_answer(self, query: str, conversation_id: Optional[str], chat_history: str,
+                               start_time: float, top_k: int = 5, where: Optional[Dict[str, Any]] = None,
+                               query_vector: Optional[List[float]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run retrieval and stream the LLM answer"""
+        # Rephrase follow-up questions into standalone ones
+        question = await self._condense_question(query, chat_history)
+        
+        # Retrieve context and send sources before generation starts
+        # Reuse the query embedding when condensing left the question unchanged
+        results = await self._run_retrieval(question, top_k, where,
+                                            query_vector if question == query else None)
+        sources = self._format_sources(results)
+        yield {"type": "sources", "sources": sources}
+        
+        # Merge overlapping chunks and fit them into the model's context budget
+        blocks = pack_context([doc for doc, _ in results], model=Config.LLM_MODEL)
+        context_tokens = sum(block.tokens for block in blocks)
+        self.context_tokens.append(context_tokens)
+        
+        prompt = QA_PROMPT.format(
+            context="\n\n".join(block.text for block in blocks),
+            question=question
+        )
+        
+        answer_parts = []
+        time_to_first_token = None
+        async with self.llm_limiter.slot():
+            async for chunk in self.llm.astream(prompt):
+                token = chunk.content
+                if not token:
+                    continue
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - start_time
+                    self.time_to_first_token.append(time_to_first_token)
+                answer_parts.append(token)
+                yield {"type": "token", "content": token}
+        
+        answer = "".join(answer_parts) or "I couldn't find a relevant answer."
+        await self.memory.add_turn(conversation_id, query, answer)
+        
+        processing_time = time.perf_counter() - start_time
+        logger.info(f"Processed query in {processing_time:.2f}s (first token after {time_to_first_token or 0:.2f}s)")
+        
+        yield {
+            "type": "done",
+            "answer": answer,
+            "sources": sources,
+            "processing_time": processing_time,
+            "time_to_first_token": time_to_first_token,
+            "context_tokens": context_tokens,
+            "confidence": self._calculate_confidence(answer, sources)
+        }
+    
+    async def _replay_cached(self, cached: Dict[str, Any], start_time: float) -> AsyncIterator[Dict[str, Any]]:
+        """Replay a cached answer as stream events"""
+        yield {"type": "sources", "sources": cached["sources"]}
+        yield {"type": "token", "content": cached["answer"]}
+        
+        elapsed = time.perf_counter() - start_time
+        yield {
+            **cached,
+            "processing_time": elapsed,
+            "time_to_first_token": elapsed,
+            "cached": True
+        }
+    
+    async def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, sharing a batched embedding call with concurrent queries"""
+        if self.query_embedder is not None:
+            return await self.query_embedder.embed(query)
+        return await self.embeddings.aembed_query(query)
+    
+    async def _run_retrieval(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None,
+                             query_vector: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+        """Run retrieval on the retrieval pool so it doesn't block the event loop"""
+        if query_vector is None:
+            query_vector = await self._embed_query(query)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.retrieval_executor, self._search, query, top_k, where, query_vector)
+    
+    def _search(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None,
+                query_vector: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+        """Retrieve chunks, over-fetching and reranking them when a reranker is configured"""
+        if self.reranker is None:
+            return self._retrieve(query, top_k, where, query_vector)
+        
+        candidates = self._retrieve(query, max(top_k, Config.RERANK_CANDIDATES), where, query_vector)
+        return self.reranker.rerank(query, candidates, top_k)
+    
+    def _retrieve(self, query: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None,
+                  query_vector: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+        """Retrieve (chunk, cosine distance) pairs, fusing vector and keyword rankings when enabled"""
+        import numpy as np
+        from langchain.schema import Document
+        
+        if self.collection.count() == 0:
+            return []
+        
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        candidates = max(top_k, Config.HYBRID_CANDIDATES) if self.keyword_index is not None else top_k
+        results = self.collection.query(
+            query_embeddings=[query_vector],
+            n_results=candidates,
+            where=where or None,
+            include=["documents", "metadatas", "distances"]
+        )
+        vector_ids = results["ids"][0]
+        documents = {
+            doc_id: (Document(page_content=text, metadata=metadata or {}), distance)
+            for doc_id, text, metadata, distance in zip(
+                vector_ids, results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        }
+        
+        if self.keyword_index is None:
+            return [documents[doc_id] for doc_id in vector_ids[:top_k]]
+        
+        keyword_ids = [doc_id for doc_id, _ in self.keyword_index.search(query, candidates)]
+        fused = reciprocal_rank_fusion(
+            [vector_ids, keyword_ids],
+            weights=[Config.HYBRID_VECTOR_WEIGHT, Config.HYBRID_KEYWORD_WEIGHT],
+            k=Config.RRF_K
+        )
+        
+        # Keyword-only hits were not returned by the vector query: fetch them through
+        # the same metadata filter and score them against the query embedding
+        missing = [doc_id for doc_id, _ in fused if doc_id not in documents]
+        if missing:
+            fetched = self.collection.get(
+                ids=missing,
+                where=where or None,
+                include=["documents", "metadatas", "embeddings"]
+            )
+            query_array = np.asarray(query_vector, dtype=np.float32)
+            query_norm = np.linalg.norm(query_array) or 1.0
+            for doc_id, text, metadata, embedding in zip(
+                fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+            ):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                similarity = float(embedding @ query_array / ((np.linalg.norm(embedding) or 1.0) * query_norm))
+                documents[doc_id] = (Document(page_content=text, metadata=metadata or {}), 1.0 - similarity)
+        
+        return [documents[doc_id] for doc_id, _ in fused if doc_id in documents][:top_k]
+    
+    def _build_where(self, filters: Optional[RAGFilter]) -> Optional[Dict[str, Any]]:
+        """Translate search filters into a Chroma metadata ``where`` clause"""
+        if filters is None:
+            return None
+        
+        conditions = []
+        if filters.source:
+            conditions.append({"source": filters.source})
+        if filters.type:
+            conditions.append({"type": filters.type})
+        if filters.ticker:
+            conditions.append({"ticker": filters.ticker.upper()})
+        if filters.date_from:
+            conditions.append({"timestamp": {"$gte": filters.date_from.timestamp()}})
+        if filters.date_to:
+            conditions.append({"timestamp": {"$lte": filters.date_to.timestamp()}})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def _keyword_index_path(self) -> str:
+        """Keep a separate keyword index per collection, since they hold different chunk ids"""
+        if self.collection_name == Config.COLLECTION_NAME:
+            return Config.KEYWORD_INDEX_PATH
+        root, ext = os.path.splitext(Config.KEYWORD_INDEX_PATH)
+        return f"{root}_{self.collection_name[len(Config.COLLECTION_NAME) + 1:]}{ext}"
+    
+    def _sync_keyword_index(self, page_size: int = 1000):
+        """Load the keyword index snapshot and reconcile it with Chroma if it is out of date.
+        
+        Chunks missing from the index are added and chunks no longer in Chroma are
+        removed, then the result is saved so the next start only loads it.
+        """
+        self.keyword_index.load()
+        count = self.collection.count()
+        if len(self.keyword_index) == count:
+            return
+        
+        logger.info(f"Keyword index has {len(self.keyword_index)} of {count} chunks, reconciling")
+        stored: Set[str] = set()
+        for offset in range(0, count, page_size):
+            ids = self.collection.get(limit=page_size, offset=offset, include=[])["ids"]
+            stored.update(ids)
+            missing = [doc_id for doc_id in ids if doc_id not in self.keyword_index]
+            if missing:
+                page = self.collection.get(ids=missing, include=["documents"])
+                self.keyword_index.add_many(zip(page["ids"], page["documents"]))
+        
+        stale = self.keyword_index.doc_ids() - stored
+        if stale:
+            self.keyword_index.remove(stale)
+            logger.info(f"Removed {len(stale)} chunks from the keyword index that are no longer stored")
+        self.keyword_index.save()
+    
+    async def close(self):
+        """Persist in-memory state on shutdown"""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+        if self.keyword_index is not None:
+            self.keyword_index.save_if_dirty(min_interval=0)
+        self.retrieval_executor.shutdown(wait=False)
+    
+    def _on_collection_changed(self):
+        """Invalidate answers computed against the previous collection contents"""
+        self.collection_version += 1
+        if self.answer_cache:
+            self.answer_cache.invalidate()
+        self._schedule_keyword_save()
+    
+    def _schedule_keyword_save(self):
+        """Snapshot the keyword index in the background so ingestion and deletes don't wait on it"""
+        if self.keyword_index is None or (self._keyword_save is not None and not self._keyword_save.done()):
+            return
+        self._keyword_save = asyncio.get_running_loop().run_in_executor(None, self._save_keyword_index)
+    
+    def _save_keyword_index(self):
+        """Snapshot the keyword index if it changed, logging failures"""
+        try:
+            self.keyword_index.save_if_dirty()
+        except Exception as e:
+            logger.error(f"Failed to save keyword index snapshot: {e}")
+    
+    async def _condense_question(self, query: str, chat_history: str) -> str:
+        """Turn a follow-up question into a standalone question"""
+        if not chat_history:
+            return query
+        
+        async with self.llm_limiter.slot():
+            result = await self.llm.ainvoke(
+                CONDENSE_QUESTION_PROMPT.format(chat_history=chat_history, question=query)
+            )
+        return result.content.strip() or query
+    
+    async def _summarize_turns(self, summary: str, turns: List[Turn]) -> str:
+        """Fold turns that fell out of the memory window into the rolling summary"""
+        new_lines = "\n".join(f"Human: {question}\nAssistant: {answer}" for question, answer in turns)
+        async with self.llm_limiter.slot():
+            result = await self.llm.ainvoke(SUMMARY_PROMPT.format(summary=summary, new_lines=new_lines))
+        return result.content.strip()
+    
+    def _format_sources(self, results: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """Format retrieved documents as response sources"""
+        sources = []
+        for doc, distance in results:
+            sources.append({
+                "content": doc.page_content[:200] + "...",
+                "metadata": doc.metadata,
+                "score": 1.0 - distance
+            })
+        return sources
+    
+    async def search_similar(self, query: str, top_k: int = 5,
+                             filters: Optional[RAGFilter] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents"""
+        try:
             results = []
-            for doc in docs:
+            for doc, distance in await self._run_retrieval(query, top_k, self._build_where(filters)):
                 results.append({
                     "content": doc.page_content,
                     "metadata": doc.metadata,
-                    "score": 0.8  # Placeholder score
+                    "score": 1.0 - distance,
+                    "distance": distance
                 })
             
             return results
@@ -188,17 +824,52 @@ class RAGService:
         """Get statistics about the vector store collection"""
         try:
             count = self.collection.count()
+            ttft = sorted(self.time_to_first_token)
+            context_tokens = sorted(self.context_tokens)
             return {
                 "total_documents": count,
-                "embedding_model": "text-embedding-ada-002",
-                "collection_name": "finance_knowledge"
+                "embedding_model": Config.EMBEDDING_MODEL,
+                "collection_name": self.collection_name,
+                "hnsw": {
+                    key: value for key, value in (self.collection.metadata or {}).items()
+                    if key.startswith("hnsw:")
+                },
+                "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None,
+                "query_embedding_batches": self.query_embedder.get_stats() if self.query_embedder else None,
+                "conversations": self.memory.get_stats() if self.memory else None,
+                "answer_cache": self.answer_cache.get_stats() if self.answer_cache else None,
+                "keyword_index": self.keyword_index.get_stats() if self.keyword_index is not None else None,
+                "reranker": self.reranker.get_stats() if self.reranker else None,
+                "indexing": self._get_index_counts(),
+                "llm_calls": self.llm_limiter.get_stats(),
+                "time_to_first_token": {
+                    "samples": len(ttft),
+                    "p50": ttft[len(ttft) // 2] if ttft else None,
+                    "p95": ttft[int(len(ttft) * 0.95)] if ttft else None
+                },
+                "context_tokens": {
+                    "samples": len(context_tokens),
+                    "p50": context_tokens[len(context_tokens) // 2] if context_tokens else None,
+                    "p95": context_tokens[int(len(context_tokens) * 0.95)] if context_tokens else None
+                }
             }
         except Exception as e:
             logger.error(f"Failed to get collection stats: {e}")
             return {"error": str(e)}
     
-    async def clear_memory(self):
-        """Clear conversation memory"""
+    async def record_turn(self, conversation_id: Optional[str], question: str, answer: str):
+        """Add a turn answered outside the RAG pipeline to the conversation memory"""
         if self.memory:
-            self.memory.clear()
-            logger.info("Conversation memory cleared") 
\ No newline at end of file
+            await self.memory.add_turn(conversation_id, question, answer)
+    
+    async def clear_memory(self, conversation_id: Optional[str] = None):
+        """Clear memory for one conversation, or for all conversations"""
+        if self.memory:
+            await self.memory.clear(conversation_id)
+            logger.info(f"Conversation memory cleared ({conversation_id or 'all conversations'})")
+    
+    async def get_conversation_turns(self, conversation_id: str) -> List[Turn]:
+        """Get the question/answer turns held for a conversation"""
+        if not self.memory:
+            return []
+        return await self.memory.get_turns(conversation_id) 
\ No newline at end of file
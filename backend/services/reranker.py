@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """Rescore retrieved chunks with a small CPU cross-encoder under a latency budget.
+
+    Scoring cost is tracked as an exponentially weighted average of seconds per
+    (query, chunk) pair. When the estimate for a candidate set exceeds the
+    budget, or scoring overruns it part-way, the retrieval order is kept.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 16, budget_ms: float = 150.0,
+                 device: str = "cpu", smoothing: float = 0.2):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self.device = device
+        self.smoothing = smoothing
+        self.reranked = 0
+        self.skipped = 0
+        self.overruns = 0
+        self._seconds_per_pair: Optional[float] = None
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        """Load the model on first use"""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device=self.device)
+                logger.info(f"Loaded rerank model {self.model_name} on {self.device}")
+
+    def estimate(self, pairs: int) -> float:
+        """Estimated seconds to score ``pairs`` pairs; 0 until the first measurement"""
+        return (self._seconds_per_pair or 0.0) * pairs
+
+    def rerank(self, query: str, results: List[Tuple[Document, float]],
+               top_k: int) -> List[Tuple[Document, float]]:
+        """Return the ``top_k`` (chunk, distance) pairs ordered by cross-encoder score"""
+        if len(results) <= 1:
+            return results[:top_k]
+        if self.estimate(len(results)) > self.budget:
+            self.skipped += 1
+            # Relax the estimate so a transient slowdown doesn't disable reranking for good
+            self._seconds_per_pair *= 1 - self.smoothing
+            return results[:top_k]
+
+        self._load()
+        started = time.perf_counter()
+        scores: List[float] = []
+        for offset in range(0, len(results), self.batch_size):
+            batch = results[offset:offset + self.batch_size]
+            scores.extend(
+                float(score) for score in self._model.predict(
+                    [(query, doc.page_content) for doc, _ in batch],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+            )
+            if time.perf_counter() - started > self.budget and len(scores) < len(results):
+                break
+
+        elapsed = time.perf_counter() - started
+        self._observe(elapsed / len(scores))
+
+        if len(scores) < len(results):
+            self.overruns += 1
+            return results[:top_k]
+
+        self.reranked += 1
+        ranked = sorted(zip(results, scores), key=lambda item: item[1], reverse=True)
+        for (doc, _), score in ranked:
+            doc.metadata["rerank_score"] = score
+        return [result for result, _ in ranked[:top_k]]
+
+    def _observe(self, seconds_per_pair: float):
+        if self._seconds_per_pair is None:
+            self._seconds_per_pair = seconds_per_pair
+        else:
+            self._seconds_per_pair += self.smoothing * (seconds_per_pair - self._seconds_per_pair)
+
+    def warmup(self):
+        """Load the model and run one scoring pass so the first query skips setup costs"""
+        from langchain.schema import Document
+
+        self._load()
+        sample = [(Document(page_content="warmup"), 0.0), (Document(page_content="warmup"), 0.0)]
+        self.rerank("warmup", sample, 1)
+        # The first call includes one-off setup, so don't let it skew the estimate
+        self._seconds_per_pair = None
+        self.reranked = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get rerank counts and the current latency estimate"""
+        return {
+            "model": self.model_name,
+            "budget_ms": self.budget * 1000,
+            "reranked": self.reranked,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "ms_per_pair": self._seconds_per_pair * 1000 if self._seconds_per_pair is not None else None
+        }
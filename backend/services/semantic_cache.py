@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, FrozenSet, Collection, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CachedAnswer:
+    query: str
+    vector: np.ndarray
+    response: Dict[str, Any]
+    expires_at: float
+    collection_version: int
+    tickers: FrozenSet[str] = field(default_factory=frozenset)
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for exact-match coalescing"""
+    return " ".join(query.lower().split())
+
+class SemanticAnswerCache:
+    """Answer cache looked up by query-embedding cosine similarity.
+
+    Entries expire after their TTL and are ignored once the collection version
+    they were computed against changes. An entry only answers a query naming the
+    same tickers, since "should I buy NVDA" and "should I buy AMD" embed almost
+    identically. Responses are copied on the way in and out so callers can
+    annotate what they get. Concurrent identical questions share a single
+    in-flight computation.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: int = 3600, max_entries: int = 5000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: List[CachedAnswer] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        import numpy as np
+
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, vector: List[float], collection_version: int,
+               tickers: Collection[str] = ()) -> Optional[Dict[str, Any]]:
+        """Return a copy of the most similar live response above the threshold for the same tickers"""
+        self._expire(collection_version)
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        import numpy as np
+
+        if self._matrix is None:
+            self._matrix = np.stack([entry.vector for entry in self._entries])
+
+        tickers = frozenset(tickers)
+        similarities = self._matrix @ self._normalize(vector)
+        for index in np.argsort(-similarities):
+            if similarities[index] < self.threshold:
+                break
+            entry = self._entries[int(index)]
+            if entry.tickers == tickers:
+                self.hits += 1
+                return copy.deepcopy(entry.response)
+
+        self.misses += 1
+        return None
+
+    def store(self, query: str, vector: List[float], response: Dict[str, Any],
+              collection_version: int, ttl_seconds: Optional[int] = None,
+              tickers: Collection[str] = ()):
+        """Cache a copy of a response for a query embedding and the tickers it names"""
+        entry = CachedAnswer(
+            query=query,
+            vector=self._normalize(vector),
+            response=copy.deepcopy(response),
+            expires_at=time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds),
+            collection_version=collection_version,
+            tickers=frozenset(tickers)
+        )
+        self._entries.append(entry)
+        if len(self._entries) > self.max_entries:
+            # Entries are appended in insertion order, so the oldest go first
+            self._entries = self._entries[-self.max_entries:]
+        self._matrix = None
+
+    def _expire(self, collection_version: int):
+        """Drop expired entries and entries from an older collection version"""
+        now = time.time()
+        live = [
+            entry for entry in self._entries
+            if entry.expires_at > now and entry.collection_version == collection_version
+        ]
+        if len(live) != len(self._entries):
+            self._entries = live
+            self._matrix = None
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        self._entries = []
+        self._matrix = None
+        logger.info("Semantic answer cache invalidated")
+
+    def get_pending(self, query: str) -> Optional[asyncio.Future]:
+        """Get the in-flight computation for an identical question, if any"""
+        future = self._pending.get(normalize_query(query))
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def begin(self, query: str):
+        """Register an in-flight computation that identical questions can wait on"""
+        key = normalize_query(query)
+        if key not in self._pending:
+            self._pending[key] = asyncio.get_running_loop().create_future()
+
+    def complete(self, query: str, response: Optional[Dict[str, Any]]):
+        """Resolve waiters for a question; ``None`` tells them to compute it themselves"""
+        future = self._pending.pop(normalize_query(query), None)
+        if future is not None and not future.done():
+            future.set_result(copy.deepcopy(response))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit-rate statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._pending),
+            "threshold": self.threshold
+        }
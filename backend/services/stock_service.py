@@ -1,15 +1,18 @@
+from __future__ import annotations
+
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple, TYPE_CHECKING
 from datetime import datetime, timedelta
-import yfinance as yf
-import pandas as pd
-import numpy as np
 from dataclasses import dataclass
 
 from models.schemas import StockInfo, StockRecommendation
 from services.news_scraper import NewsScraper
 
+# yfinance, pandas and numpy are imported on first use to keep startup fast
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -23,49 +26,40 @@ class TechnicalIndicators:
     volume_avg: float
 
 class StockService:
-    def __init__(self):
-        self.news_scraper = NewsScraper()
+    def __init__(self, news_scraper: Optional[NewsScraper] = None):
+        self.news_scraper = news_scraper or NewsScraper()
         self.cache = {}
         self.cache_duration = timedelta(minutes=5)
+        # Symbols a quote was found for, so chat can tell real tickers from other capitals
+        self.known_symbols: Set[str] = set()
+    
+    def _get_cached(self, cache_key: str) -> Optional[Any]:
+        """Get a cached value if it is still fresh"""
+        if cache_key in self.cache:
+            cached_data, timestamp = self.cache[cache_key]
+            if datetime.now() - timestamp < self.cache_duration:
+                return cached_data
+        return None
     
     async def get_stock_info(self, symbol: str) -> Optional[StockInfo]:
         """Get comprehensive stock information"""
         try:
             # Check cache first
             cache_key = f"stock_info_{symbol}"
-            if cache_key in self.cache:
-                cached_data, timestamp = self.cache[cache_key]
-                if datetime.now() - timestamp < self.cache_duration:
-                    return cached_data
-            
-            # Get stock data from yfinance
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            
-            # Get current price data
-            hist = ticker.history(period="1d")
-            if hist.empty:
-                return None
-            
-            current_price = hist['Close'].iloc[-1]
-            previous_close = info.get('previousClose', current_price)
-            change = current_price - previous_close
-            change_percent = (change / previous_close) * 100 if previous_close else 0
+            cached_data = self._get_cached(cache_key)
+            if cached_data is not None:
+                return cached_data
             
-            stock_info = StockInfo(
-                symbol=symbol.upper(),
-                name=info.get('longName', symbol.upper()),
-                price=current_price,
-                change=change,
-                change_percent=change_percent,
-                market_cap=info.get('marketCap'),
-                volume=info.get('volume'),
-                pe_ratio=info.get('trailingPE'),
-                dividend_yield=info.get('dividendYield', 0) * 100 if info.get('dividendYield') else None
+            # yfinance makes blocking HTTP calls, so keep them off the event loop
+            stock_info = await asyncio.get_running_loop().run_in_executor(
+                None, self._fetch_stock_info, symbol
             )
+            if stock_info is None:
+                return None
             
             # Cache the result
             self.cache[cache_key] = (stock_info, datetime.now())
+            self.known_symbols.add(stock_info.symbol)
             
             return stock_info
             
@@ -73,27 +67,64 @@ class StockService:
             logger.error(f"Failed to get stock info for {symbol}: {e}")
             return None
     
+    def _fetch_stock_info(self, symbol: str) -> Optional[StockInfo]:
+        """Fetch quote and company info from yfinance"""
+        import yfinance as yf
+        
+        # Get stock data from yfinance
+        ticker = yf.Ticker(symbol)
+        info = ticker.info
+        
+        # Get current price data
+        hist = ticker.history(period="1d")
+        if hist.empty:
+            return None
+        
+        current_price = hist['Close'].iloc[-1]
+        previous_close = info.get('previousClose', current_price)
+        change = current_price - previous_close
+        change_percent = (change / previous_close) * 100 if previous_close else 0
+        
+        return StockInfo(
+            symbol=symbol.upper(),
+            name=info.get('longName', symbol.upper()),
+            price=current_price,
+            change=change,
+            change_percent=change_percent,
+            market_cap=info.get('marketCap'),
+            volume=info.get('volume'),
+            pe_ratio=info.get('trailingPE'),
+            dividend_yield=info.get('dividendYield', 0) * 100 if info.get('dividendYield') else None
+        )
+    
     async def get_stock_recommendation(self, symbol: str) -> Optional[StockRecommendation]:
         """Generate AI-powered stock recommendation"""
         try:
-            # Get stock data
-            ticker = yf.Ticker(symbol)
+            # Get historical data for analysis; yfinance blocks, so fetch it in the
+            # executor while the news request is in flight
+            history = asyncio.get_running_loop().run_in_executor(None, self._fetch_history, symbol)
+            news = self.news_scraper.get_stock_news(symbol, limit=10)
+            
+            # Wait for both, so a failed news request doesn't leave the history
+            # fetch running unobserved
+            results = await asyncio.gather(history, news, return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            (hist, info), news_articles = results
+            
+            # Get news sentiment
+            news_sentiment = self._analyze_news_sentiment(news_articles)
             
-            # Get historical data for analysis
-            hist = ticker.history(period="6mo")
             if hist.empty:
                 return None
             
             # Calculate technical indicators
             indicators = self._calculate_technical_indicators(hist)
             
-            # Get news sentiment
-            news_articles = await self.news_scraper.get_stock_news(symbol, limit=10)
-            news_sentiment = self._analyze_news_sentiment(news_articles)
-            
             # Generate recommendation based on technical and fundamental analysis
             recommendation, confidence, reasoning = self._generate_recommendation(
-                hist, indicators, news_sentiment, ticker.info
+                hist, indicators, news_sentiment, info
             )
             
             # Calculate price target
@@ -116,6 +147,14 @@ class StockService:
             logger.error(f"Failed to generate recommendation for {symbol}: {e}")
             return None
     
+    def _fetch_history(self, symbol: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """Fetch six months of price history and company info from yfinance"""
+        import yfinance as yf
+        
+        ticker = yf.Ticker(symbol)
+        hist = ticker.history(period="6mo")
+        return hist, (ticker.info if not hist.empty else {})
+    
     def _calculate_technical_indicators(self, hist: pd.DataFrame) -> TechnicalIndicators:
         """Calculate technical indicators for stock analysis"""
         try:
@@ -277,6 +316,8 @@ class StockService:
     
     def _determine_risk_level(self, hist: pd.DataFrame, indicators: TechnicalIndicators) -> str:
         """Determine risk level based on volatility and technical indicators"""
+        import numpy as np
+        
         try:
             # Calculate volatility
             returns = hist['Close'].pct_change()
@@ -296,24 +337,16 @@ class StockService:
     async def get_market_overview(self) -> Dict[str, Any]:
         """Get market overview with major indices"""
         try:
-            indices = ['^GSPC', '^DJI', '^IXIC', '^VIX']  # S&P 500, Dow Jones, NASDAQ, VIX
-            overview = {}
+            cache_key = "market_overview"
+            cached_data = self._get_cached(cache_key)
+            if cached_data is not None:
+                return cached_data
             
-            for index in indices:
-                ticker = yf.Ticker(index)
-                hist = ticker.history(period="1d")
-                
-                if not hist.empty:
-                    current_price = hist['Close'].iloc[-1]
-                    previous_close = hist['Open'].iloc[-1]
-                    change = current_price - previous_close
-                    change_percent = (change / previous_close) * 100
-                    
-                    overview[index] = {
-                        "price": current_price,
-                        "change": change,
-                        "change_percent": change_percent
-                    }
+            overview = await asyncio.get_running_loop().run_in_executor(
+                None, self._fetch_market_overview
+            )
+            if overview:
+                self.cache[cache_key] = (overview, datetime.now())
             
             return overview
             
@@ -321,6 +354,40 @@ class StockService:
             logger.error(f"Failed to get market overview: {e}")
             return {}
     
+    def _fetch_market_overview(self) -> Dict[str, Any]:
+        """Fetch the latest session for the major indices from yfinance"""
+        import yfinance as yf
+        
+        indices = ['^GSPC', '^DJI', '^IXIC', '^VIX']  # S&P 500, Dow Jones, NASDAQ, VIX
+        overview = {}
+        
+        for index in indices:
+            ticker = yf.Ticker(index)
+            hist = ticker.history(period="1d")
+            
+            if not hist.empty:
+                current_price = hist['Close'].iloc[-1]
+                previous_close = hist['Open'].iloc[-1]
+                change = current_price - previous_close
+                change_percent = (change / previous_close) * 100
+                
+                overview[index] = {
+                    "price": current_price,
+                    "change": change,
+                    "change_percent": change_percent
+                }
+        
+        return overview
+    
+    async def prime(self, symbols: List[str]):
+        """Fill the quote and market overview caches ahead of the first requests"""
+        results = await asyncio.gather(
+            self.get_market_overview(),
+            *(self.get_stock_info(symbol) for symbol in symbols)
+        )
+        primed = sum(1 for result in results[1:] if result is not None)
+        logger.info(f"Primed {primed}/{len(symbols)} stock quotes and market overview")
+    
     async def search_stocks(self, query: str) -> List[Dict[str, Any]]:
         """Search for stocks based on company name or symbol"""
         try:
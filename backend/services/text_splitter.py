@@ -0,0 +1,223 @@
+import logging
+from collections import deque
+from typing import List, Optional, Iterator, Iterable, Tuple, Callable
+
+from config import Config
+from services.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# How much text to read while waiting for the top-priority separator before
+# committing to the best one seen so far
+DEFAULT_LOOKAHEAD_CHARS = 1 << 20
+
+Chunk = Tuple[str, int]
+
+def _pieces(text: str, offset: int, separator: str) -> Iterator[Chunk]:
+    """Cut text before each separator occurrence, keeping the separator with the piece after it"""
+    if not separator:
+        for index, char in enumerate(text):
+            yield char, offset + index
+        return
+
+    start = 0
+    position = text.find(separator)
+    while position != -1:
+        if position > start:
+            yield text[start:position], offset + start
+        start = position
+        position = text.find(separator, position + len(separator))
+    if start < len(text):
+        yield text[start:], offset + start
+
+class _SplitMerger:
+    """Greedily pack splits into chunks of at most ``chunk_size``, carrying ``chunk_overlap`` forward"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, length_function: Callable[[str], int]):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self._current: "deque[Tuple[str, int, int]]" = deque()
+        self._total = 0
+
+    def push(self, split: str, offset: int) -> Iterator[Chunk]:
+        length = self.length_function(split)
+        if self._total + length > self.chunk_size and self._current:
+            chunk = self._join()
+            if chunk is not None:
+                yield chunk
+            # Drop splits from the front until what remains fits as overlap
+            while self._total > self.chunk_overlap or (
+                self._total + length > self.chunk_size and self._total > 0
+            ):
+                _, _, dropped = self._current.popleft()
+                self._total -= dropped
+        self._current.append((split, offset, length))
+        self._total += length
+
+    def finish(self) -> Iterator[Chunk]:
+        chunk = self._join()
+        if chunk is not None:
+            yield chunk
+        self._current.clear()
+        self._total = 0
+
+    def _join(self) -> Optional[Chunk]:
+        if not self._current:
+            return None
+        text = "".join(split for split, _, _ in self._current)
+        stripped = text.strip()
+        if not stripped:
+            return None
+        return stripped, self._current[0][1] + len(text) - len(text.lstrip())
+
+class StreamingTextSplitter:
+    """Recursive separator splitter that consumes a text stream and yields chunks lazily.
+
+    Produces the same chunks as langchain's ``RecursiveCharacterTextSplitter``
+    with default settings, plus each chunk's character offset. Only the text
+    since the last top-level separator is buffered. The top-level separator is
+    chosen once the highest-priority one is seen, or after ``lookahead_chars``
+    of text, so documents longer than that whose first paragraph break comes
+    later may split slightly differently.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 separators: Optional[List[str]] = None,
+                 length_function: Callable[[str], int] = len,
+                 lookahead_chars: int = DEFAULT_LOOKAHEAD_CHARS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or DEFAULT_SEPARATORS
+        self.length_function = length_function
+        self.lookahead_chars = lookahead_chars
+
+    @classmethod
+    def from_tokens(cls, chunk_size: int, chunk_overlap: int, model: Optional[str] = None,
+                    **kwargs) -> "StreamingTextSplitter":
+        """Splitter whose sizes are measured in LLM tokens instead of characters"""
+        model = model or Config.LLM_MODEL
+        return cls(chunk_size, chunk_overlap, length_function=lambda text: count_tokens(text, model), **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split a complete text into chunks"""
+        return [chunk for chunk, _ in self._split(text, 0, self.separators)]
+
+    def split_text_with_offsets(self, text: str) -> List[Chunk]:
+        """Split a complete text into (chunk, start offset) pairs"""
+        return list(self._split(text, 0, self.separators))
+
+    def _split(self, text: str, offset: int, separators: List[str]) -> Iterator[Chunk]:
+        """Split text on the first separator present, recursing into oversized pieces"""
+        separator = separators[-1]
+        remaining: List[str] = []
+        for index, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                remaining = separators[index + 1:]
+                break
+
+        merger = _SplitMerger(self.chunk_size, self.chunk_overlap, self.length_function)
+        for piece, piece_offset in _pieces(text, offset, separator):
+            yield from self._add_piece(merger, piece, piece_offset, remaining)
+        yield from merger.finish()
+
+    def _add_piece(self, merger: _SplitMerger, piece: str, offset: int,
+                   remaining: List[str]) -> Iterator[Chunk]:
+        if self.length_function(piece) < self.chunk_size:
+            yield from merger.push(piece, offset)
+            return
+
+        yield from merger.finish()
+        if remaining:
+            yield from self._split(piece, offset, remaining)
+        else:
+            yield piece, offset
+
+    def iter_chunks(self, stream: Iterable[str]) -> Iterator[Chunk]:
+        """Lazily split a stream of text blocks into (chunk, start offset) pairs"""
+        buffer = ""
+        buffer_offset = 0
+        separator: Optional[str] = None
+        remaining: List[str] = []
+        scanned = 0
+        search_from = 0
+        merger = _SplitMerger(self.chunk_size, self.chunk_overlap, self.length_function)
+
+        for block in stream:
+            if not block:
+                continue
+            buffer += block
+
+            if separator is None:
+                separator, remaining = self._choose_separator(buffer, scanned)
+                if separator is None:
+                    scanned = len(buffer)
+                    continue
+
+            if not separator:
+                # Splitting into characters: every buffered character is a complete piece
+                for piece, piece_offset in _pieces(buffer, buffer_offset, separator):
+                    yield from self._add_piece(merger, piece, piece_offset, remaining)
+                buffer_offset += len(buffer)
+                buffer = ""
+                continue
+
+            # A piece is complete once the next separator occurrence is buffered;
+            # the piece still being read stays in the buffer
+            start = 0
+            position = buffer.find(separator, search_from)
+            while position != -1:
+                if position > start:
+                    yield from self._add_piece(merger, buffer[start:position], buffer_offset + start, remaining)
+                start = position
+                search_from = position + len(separator)
+                position = buffer.find(separator, search_from)
+
+            if start:
+                buffer = buffer[start:]
+                buffer_offset += start
+                search_from -= start
+            # Skip text already searched, allowing for an occurrence split across blocks
+            search_from = max(search_from, len(buffer) - len(separator) + 1)
+
+        if separator is None:
+            # The stream ended before a separator was committed to: split it whole
+            yield from self._split(buffer, buffer_offset, self.separators)
+            return
+
+        if buffer:
+            yield from self._add_piece(merger, buffer, buffer_offset, remaining)
+        yield from merger.finish()
+
+    def _choose_separator(self, buffer: str, searched: int) -> Tuple[Optional[str], List[str]]:
+        """Pick the top-level separator once it can no longer change"""
+        first = self.separators[0]
+        if first == "" or buffer.find(first, max(0, searched - len(first) + 1)) != -1:
+            return first, self.separators[1:]
+        if len(buffer) < self.lookahead_chars:
+            return None, []
+
+        logger.debug(f"No {first!r} in the first {len(buffer)} characters, choosing a separator from them")
+        for index, candidate in enumerate(self.separators):
+            if candidate == "":
+                return candidate, []
+            if candidate in buffer:
+                return candidate, self.separators[index + 1:]
+        return self.separators[-1], []
+
+def create_text_splitter(chunk_size: Optional[int] = None,
+                         chunk_overlap: Optional[int] = None) -> StreamingTextSplitter:
+    """Create the splitter configured by ``CHUNK_SIZE``, ``CHUNK_OVERLAP`` and ``CHUNK_LENGTH_UNIT``"""
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else Config.CHUNK_OVERLAP
+    if Config.CHUNK_LENGTH_UNIT == "tokens":
+        return StreamingTextSplitter.from_tokens(chunk_size, chunk_overlap)
+    return StreamingTextSplitter(chunk_size, chunk_overlap)
@@ -0,0 +1,68 @@
+import re
+from typing import List, Optional, Collection
+
+# Company names people use instead of symbols
+COMPANY_TICKERS = {
+    "apple": "AAPL",
+    "microsoft": "MSFT",
+    "google": "GOOGL",
+    "alphabet": "GOOGL",
+    "amazon": "AMZN",
+    "tesla": "TSLA",
+    "meta": "META",
+    "facebook": "META",
+    "nvidia": "NVDA",
+    "jpmorgan": "JPM",
+    "jp morgan": "JPM",
+    "johnson & johnson": "JNJ",
+    "visa": "V",
+    "netflix": "NFLX",
+    "amd": "AMD",
+    "intel": "INTC",
+    "berkshire": "BRK-B",
+    "walmart": "WMT",
+    "disney": "DIS",
+    "coca-cola": "KO",
+    "coca cola": "KO",
+}
+
+# Bare capitalised words are only read as symbols when they are known ones
+KNOWN_SYMBOLS = frozenset(COMPANY_TICKERS.values())
+
+# All-caps words that are not tickers, even where a listed symbol shares the spelling
+NON_TICKERS = frozenset([
+    "A", "I", "AI", "AM", "AN", "AND", "ARE", "AT", "BE", "BUY", "CEO", "CFO", "DO", "EPS", "ETF",
+    "EU", "FED", "FOR", "GDP", "HOLD", "HOW", "IN", "IPO", "IS", "IT", "ME", "MY", "NEWS", "NYSE",
+    "OF", "OK", "ON", "OR", "PE", "Q1", "Q2", "Q3", "Q4", "SEC", "SELL", "SO", "THE", "TO", "UK",
+    "US", "USA", "USD", "WHAT", "WHO", "WHY", "YOY"
+])
+
+CASHTAG_PATTERN = re.compile(r"\$([A-Za-z]{1,5}(?:[.\-][A-Za-z])?)\b")
+UPPERCASE_PATTERN = re.compile(r"\b([A-Z]{1,5}(?:[.\-][A-Z])?)\b")
+COMPANY_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(COMPANY_TICKERS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+def extract_tickers(text: str, known_symbols: Optional[Collection[str]] = KNOWN_SYMBOLS) -> List[str]:
+    """Find ticker symbols mentioned as cashtags, known bare symbols or company names.
+
+    Cashtags are taken as written. Bare capitalised words (IRA, ROI, FOMC, ...)
+    only count when they are in ``known_symbols``; with ``None`` every one that
+    isn't a common word counts, for callers that would rather over-match.
+    """
+    tickers: List[str] = []
+
+    def add(symbol: str):
+        symbol = symbol.upper()
+        if symbol not in tickers:
+            tickers.append(symbol)
+
+    for symbol in CASHTAG_PATTERN.findall(text):
+        add(symbol)
+    for symbol in UPPERCASE_PATTERN.findall(text):
+        if symbol not in NON_TICKERS and (known_symbols is None or symbol in known_symbols):
+            add(symbol)
+    for name in COMPANY_PATTERN.findall(text):
+        add(COMPANY_TICKERS[name.lower()])
+    return tickers
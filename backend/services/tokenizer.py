@@ -0,0 +1,32 @@
+import logging
+from functools import lru_cache
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Load the tiktoken encoding for a model, or None if tiktoken is unavailable"""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, falling back to approximate token counts")
+        return None
+    
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count tokens in text for the given LLM model"""
+    if not text:
+        return 0
+    
+    encoding = _get_encoding(model or Config.LLM_MODEL)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    
+    return len(encoding.encode(text, disallowed_special=()))
@@ -1,88 +1,406 @@
-import json
+import asyncio
 import logging
-from typing import List, Dict, Any
+from collections import deque
+import uuid
+from typing import Dict, Any, Optional, Set, Iterable, Union
 from fastapi import WebSocket
 from datetime import datetime
 
+from config import Config
+from services.backplane import Backplane
+from services.wire_format import WireFormat, Payload, JSON
+
 logger = logging.getLogger(__name__)
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.connection_data: Dict[WebSocket, Dict[str, Any]] = {}
-    
-    async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection"""
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_data[websocket] = {
-            "connected_at": datetime.now(),
-            "message_count": 0,
-            "user_id": None
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Close code for clients dropped because they can't keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Pre-encoded text, or a dict encoded per connection wire format
+Message = Union[str, Dict[str, Any]]
+
+class SlowConsumerError(Exception):
+    """Raised when a full send queue means the connection should be closed"""
+
+class Outbox:
+    """Bounded per-connection send queue.
+
+    Broadcast messages are droppable; personal messages (chat replies) are only
+    lost if the connection is dropped. When the queue is full, ``drop_oldest``
+    discards the oldest droppable message, ``coalesce`` first replaces a queued
+    message with the same key (e.g. a newer quote for the same symbol) and
+    otherwise drops the oldest, and ``disconnect`` gives up on the client.
+    """
+
+    def __init__(self, maxsize: int, policy: str):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        # Entries are [message, key, droppable] so coalescing can replace in place
+        self._entries: deque = deque()
+        self._keyed: Dict[str, list] = {}
+        # Queued plus taken but not yet sent
+        self._unfinished = 0
+        self._ready = asyncio.Event()
+        self._drained = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, message: Payload, key: Optional[str] = None, droppable: bool = True):
+        """Queue a message without waiting, applying the slow-consumer policy when full"""
+        if key is not None and self.policy == "coalesce" and key in self._keyed:
+            self._keyed[key][0] = message
+            self.coalesced += 1
+            return
+
+        if len(self._entries) >= self.maxsize:
+            if self.policy == "disconnect":
+                raise SlowConsumerError(f"send queue full ({self.maxsize} messages)")
+            if not self._drop_oldest():
+                if not droppable:
+                    raise SlowConsumerError(f"send queue full of replies ({self.maxsize} messages)")
+                # Everything queued is a reply; drop the incoming broadcast instead
+                self.dropped += 1
+                return
+
+        entry = [message, key, droppable]
+        self._entries.append(entry)
+        if key is not None:
+            self._keyed[key] = entry
+        self._unfinished += 1
+        self.max_depth = max(self.max_depth, len(self._entries))
+        self._ready.set()
+
+    def _drop_oldest(self) -> bool:
+        """Make room by dropping the oldest droppable message"""
+        for index, entry in enumerate(self._entries):
+            if entry[2]:
+                del self._entries[index]
+                self._forget(entry)
+                self._unfinished -= 1
+                self.dropped += 1
+                return True
+        return False
+
+    def _forget(self, entry: list):
+        key = entry[1]
+        if key is not None and self._keyed.get(key) is entry:
+            del self._keyed[key]
+
+    async def get(self) -> Payload:
+        """Wait for and remove the next message"""
+        while not self._entries:
+            self._ready.clear()
+            await self._ready.wait()
+        entry = self._entries.popleft()
+        self._forget(entry)
+        return entry[0]
+
+    def task_done(self):
+        """Called by the writer once a message has been sent"""
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._drained.set()
+
+    async def join(self):
+        """Wait until everything queued has been sent"""
+        while self._unfinished > 0:
+            self._drained.clear()
+            await self._drained.wait()
+
+class Connection:
+    """Per-connection state, kept small since there may be tens of thousands"""
+    __slots__ = ("id", "websocket", "wire_format", "user_id", "topics", "connected_at", "message_count",
+                 "outbox", "writer")
+
+    def __init__(self, connection_id: str, websocket: WebSocket, outbox: Outbox,
+                 wire_format: WireFormat = JSON):
+        self.id = connection_id
+        self.websocket = websocket
+        self.wire_format = wire_format
+        self.user_id: Optional[str] = None
+        self.topics: Set[str] = set()
+        self.connected_at = datetime.now()
+        self.message_count = 0
+        self.outbox = outbox
+        self.writer: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "connection_id": self.id,
+            "connected_at": self.connected_at.isoformat(),
+            "message_count": self.message_count,
+            "user_id": self.user_id,
+            "wire_format": self.wire_format.name,
+            "topics": sorted(self.topics),
+            "queue_depth": len(self.outbox),
+            "peak_queue_depth": self.outbox.max_depth,
+            "dropped": self.outbox.dropped
         }
-        logger.info(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
-    
+
+class ConnectionManager:
+    """Registry of live WebSocket connections indexed by id, socket, user and topic.
+
+    Registering, unregistering and looking up a user's or topic's connections
+    are constant time, and stats are kept as running counters so reading them
+    doesn't walk every connection. With a ``Backplane`` attached, broadcasts,
+    per-user messages and topic messages also reach sockets held by other
+    worker processes.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None, policy: Optional[str] = None):
+        self.connections: Dict[str, Connection] = {}
+        self._by_socket: Dict[WebSocket, Connection] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_topic: Dict[str, Set[str]] = {}
+        self.queue_size = queue_size or Config.WS_SEND_QUEUE_SIZE
+        self.policy = policy or Config.WS_SLOW_CONSUMER_POLICY
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy {self.policy!r}, expected one of {SLOW_CONSUMER_POLICIES}")
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.messages_coalesced = 0
+        self.slow_disconnects = 0
+        self.queued = 0
+        self.backplane: Optional[Backplane] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[str] = None,
+                      wire_format: WireFormat = JSON, subprotocol: Optional[str] = None) -> str:
+        """Accept a new WebSocket connection, start its writer and return its connection id"""
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(uuid.uuid4().hex, websocket, Outbox(self.queue_size, self.policy), wire_format)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self.connections[connection.id] = connection
+        self._by_socket[websocket] = connection
+        if user_id is not None:
+            self.set_user_id(websocket, user_id)
+        logger.info(f"New WebSocket connection. Total connections: {len(self.connections)}")
+        return connection.id
+
     def disconnect(self, websocket: WebSocket):
-        """Remove a WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.connection_data:
-            del self.connection_data[websocket]
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send a message to a specific WebSocket connection"""
+        """Remove a WebSocket connection and stop its writer"""
+        connection = self._by_socket.pop(websocket, None)
+        if connection is None:
+            return
+        del self.connections[connection.id]
+        self._unindex_user(connection)
+        for topic in connection.topics:
+            self._discard(self._by_topic, topic, connection.id)
+        self.queued -= len(connection.outbox)
+        if connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.connections)}")
+
+    def get_connection(self, websocket: WebSocket) -> Optional[Connection]:
+        """Get the state for a connected socket"""
+        return self._by_socket.get(websocket)
+
+    async def close(self, websocket: WebSocket, timeout: float = 1.0):
+        """Give queued messages (e.g. a final error) a moment to go out, then disconnect"""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            try:
+                await asyncio.wait_for(connection.outbox.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.disconnect(websocket)
+
+    async def _writer(self, connection: Connection):
+        """Drain one connection's queue so a slow client only delays itself"""
+        outbox = connection.outbox
         try:
-            await websocket.send_text(message)
-            if websocket in self.connection_data:
-                self.connection_data[websocket]["message_count"] += 1
+            while True:
+                message = await outbox.get()
+                self.queued -= 1
+                if isinstance(message, bytes):
+                    await connection.websocket.send_bytes(message)
+                else:
+                    await connection.websocket.send_text(message)
+                outbox.task_done()
+                self.messages_sent += 1
+                connection.message_count += 1
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Failed to send personal message: {e}")
-            await self.disconnect(websocket)
-    
-    async def broadcast(self, message: str):
-        """Send a message to all active WebSocket connections"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-                if connection in self.connection_data:
-                    self.connection_data[connection]["message_count"] += 1
-            except Exception as e:
-                logger.error(f"Failed to broadcast message: {e}")
-                disconnected.append(connection)
-        
-        # Remove disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
-    
-    async def broadcast_json(self, data: Dict[str, Any]):
-        """Send JSON data to all active WebSocket connections"""
-        message = json.dumps(data)
-        await self.broadcast(message)
-    
-    def get_connection_stats(self) -> Dict[str, Any]:
-        """Get statistics about active connections"""
+            logger.error(f"Failed to send WebSocket message: {e}")
+            self.disconnect(connection.websocket)
+
+    def _enqueue(self, connection: Connection, message: Payload, key: Optional[str] = None,
+                 droppable: bool = True) -> bool:
+        """Queue a message for one connection, disconnecting it if it can't keep up"""
+        outbox = connection.outbox
+        depth, dropped, coalesced = len(outbox), outbox.dropped, outbox.coalesced
+        try:
+            outbox.put(message, key=key, droppable=droppable)
+        except SlowConsumerError as e:
+            logger.warning(f"Disconnecting slow WebSocket consumer: {e}")
+            self.slow_disconnects += 1
+            self.disconnect(connection.websocket)
+            task = asyncio.create_task(self._close(connection.websocket))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return False
+        finally:
+            self.messages_dropped += outbox.dropped - dropped
+            self.messages_coalesced += outbox.coalesced - coalesced
+        self.queued += len(outbox) - depth
+        return True
+
+    def _fan_out(self, connection_ids: Iterable[str], message: Message, key: Optional[str] = None,
+                 droppable: bool = True) -> int:
+        # Dicts are encoded once per wire format in use, not once per connection
+        encoded: Dict[str, Payload] = {}
+        sent = 0
+        # Copy: a slow-consumer disconnect mutates the index being iterated
+        for connection_id in list(connection_ids):
+            connection = self.connections.get(connection_id)
+            if connection is None:
+                continue
+            payload = message
+            if isinstance(message, dict):
+                payload = encoded.get(connection.wire_format.name)
+                if payload is None:
+                    payload = encoded[connection.wire_format.name] = connection.wire_format.encode(message)
+            if self._enqueue(connection, payload, key, droppable):
+                sent += 1
+        return sent
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        """Queue a pre-encoded text message for a specific WebSocket connection"""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, message, droppable=False)
+
+    async def send_personal_json(self, data: Dict[str, Any], websocket: WebSocket):
+        """Queue data for a specific connection, encoded in its wire format"""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, connection.wire_format.encode(data), droppable=False)
+
+    async def attach_backplane(self, backplane: Backplane):
+        """Relay fan-out through a backplane so it reaches every worker's connections"""
+        await backplane.start(self.deliver)
+        self.backplane = backplane
+
+    async def detach_backplane(self):
+        """Flush and stop relaying through the backplane"""
+        backplane, self.backplane = self.backplane, None
+        if backplane is not None:
+            await backplane.close()
+
+    def deliver(self, envelope: Dict[str, Any]) -> int:
+        """Deliver a fan-out relayed from another worker to this worker's connections"""
+        route, target = envelope["route"], envelope.get("target")
+        message, key = envelope["message"], envelope.get("key")
+        if route == "broadcast":
+            return self._fan_out(self.connections, message, key)
+        if route == "user":
+            return self._fan_out(self._by_user.get(target, ()), message, droppable=False)
+        if route == "topic":
+            return self._fan_out(self._by_topic.get(target, ()), message, key)
+        raise ValueError(f"Unknown fan-out route {route!r}")
+
+    def _relay(self, route: str, message: Message, target: Optional[str] = None, key: Optional[str] = None):
+        if self.backplane is not None:
+            self.backplane.publish(route, message, target=target, key=key)
+
+    async def broadcast(self, message: Message, key: Optional[str] = None):
+        """Queue a message for all active WebSocket connections without waiting on any of them.
+
+        Messages sharing a ``key`` may be coalesced for slow clients under the
+        ``coalesce`` policy, so only the latest one is delivered. Dicts are sent in
+        each connection's wire format; strings are sent as-is.
+        """
+        self._fan_out(self.connections, message, key)
+        self._relay("broadcast", message, key=key)
+
+    async def broadcast_json(self, data: Dict[str, Any], key: Optional[str] = None):
+        """Send data to all active WebSocket connections, encoded in each one's wire format"""
+        await self.broadcast(data, key=key)
+
+    def set_user_id(self, websocket: WebSocket, user_id: Optional[str]):
+        """Set user ID for a specific connection"""
+        connection = self._by_socket.get(websocket)
+        if connection is None:
+            return
+        self._unindex_user(connection)
+        connection.user_id = user_id
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(connection.id)
+
+    async def send_to_user(self, user_id: str, message: Message) -> int:
+        """Send a message to every connection of a user, returning how many were queued in this worker"""
+        self._relay("user", message, target=user_id)
+        return self._fan_out(self._by_user.get(user_id, ()), message, droppable=False)
+
+    def subscribe(self, websocket: WebSocket, topic: str):
+        """Subscribe a connection to a topic such as a ticker symbol"""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            connection.topics.add(topic)
+            self._by_topic.setdefault(topic, set()).add(connection.id)
+
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        """Unsubscribe a connection from a topic"""
+        connection = self._by_socket.get(websocket)
+        if connection is not None:
+            connection.topics.discard(topic)
+            self._discard(self._by_topic, topic, connection.id)
+
+    async def publish(self, topic: str, message: Message, key: Optional[str] = None) -> int:
+        """Send a message to a topic's subscribers, returning how many were queued in this worker"""
+        self._relay("topic", message, target=topic, key=key)
+        return self._fan_out(self._by_topic.get(topic, ()), message, key)
+
+    def _unindex_user(self, connection: Connection):
+        if connection.user_id is not None:
+            self._discard(self._by_user, connection.user_id, connection.id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], name: str, connection_id: str):
+        members = index.get(name)
+        if members is not None:
+            members.discard(connection_id)
+            if not members:
+                del index[name]
+
+    def get_queue_stats(self) -> Dict[str, Any]:
+        """Get outbound queue depth and drop counters"""
         return {
-            "total_connections": len(self.active_connections),
-            "connection_details": [
-                {
-                    "connected_at": data["connected_at"].isoformat(),
-                    "message_count": data["message_count"],
-                    "user_id": data["user_id"]
-                }
-                for data in self.connection_data.values()
-            ]
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "queued": self.queued,
+            "avg_depth": self.queued / len(self.connections) if self.connections else 0.0,
+            "sent": self.messages_sent,
+            "dropped": self.messages_dropped,
+            "coalesced": self.messages_coalesced,
+            "slow_disconnects": self.slow_disconnects
         }
-    
-    def set_user_id(self, websocket: WebSocket, user_id: str):
-        """Set user ID for a specific connection"""
-        if websocket in self.connection_data:
-            self.connection_data[websocket]["user_id"] = user_id
-    
-    async def send_to_user(self, user_id: str, message: str):
-        """Send a message to a specific user"""
-        for connection, data in self.connection_data.items():
-            if data.get("user_id") == user_id:
-                await self.send_personal_message(message, connection)
-                break 
\ No newline at end of file
+
+    def get_connection_stats(self, details: int = 0) -> Dict[str, Any]:
+        """Get statistics about active connections, with up to ``details`` per-connection entries"""
+        stats = {
+            "total_connections": len(self.connections),
+            "users": len(self._by_user),
+            "topics": len(self._by_topic),
+            "outbound": self.get_queue_stats(),
+            "backplane": self.backplane.get_stats() if self.backplane else None
+        }
+        if details:
+            connections = list(self.connections.values())[:details]
+            stats["connection_details"] = [connection.to_dict() for connection in connections]
+        return stats
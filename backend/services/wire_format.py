@@ -0,0 +1,73 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple, Union
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[str, bytes]
+
+@lru_cache(maxsize=1)
+def _get_msgpack():
+    """Load msgpack, or None if it is unavailable"""
+    try:
+        import msgpack
+    except ImportError:
+        logger.warning("msgpack is not installed, WebSocket clients will get JSON frames")
+        return None
+    return msgpack
+
+class WireFormat:
+    """How frames on one WebSocket connection are encoded"""
+    name = "json"
+    binary = False
+
+    def encode(self, data: Dict[str, Any]) -> Payload:
+        return json.dumps(data, separators=(",", ":"), default=str)
+
+class MsgpackWireFormat(WireFormat):
+    """MessagePack in binary frames: smaller and cheaper to encode than JSON text"""
+    name = "msgpack"
+    binary = True
+
+    def encode(self, data: Dict[str, Any]) -> Payload:
+        return _get_msgpack().packb(data, default=str)
+
+JSON = WireFormat()
+MSGPACK = MsgpackWireFormat()
+
+def available_formats() -> Dict[str, WireFormat]:
+    """Wire formats this process can speak, in order of preference"""
+    formats = {}
+    if _get_msgpack() is not None:
+        formats[MSGPACK.name] = MSGPACK
+    formats[JSON.name] = JSON
+    return formats
+
+def negotiate(websocket: WebSocket) -> Tuple[WireFormat, Optional[str]]:
+    """Pick a connection's wire format from its offered subprotocols or ``?format=``.
+
+    Returns the format and the subprotocol to accept with, if the client offered one.
+    Clients that ask for nothing get JSON.
+    """
+    formats = available_formats()
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        if subprotocol in formats:
+            return formats[subprotocol], subprotocol
+
+    requested = websocket.query_params.get("format")
+    if requested in formats:
+        return formats[requested], None
+    if requested:
+        logger.info(f"Unsupported wire format {requested!r} requested, using JSON")
+    return JSON, None
+
+def decode_frame(payload: Payload) -> Any:
+    """Decode a client frame: binary frames are MessagePack, text frames JSON"""
+    if isinstance(payload, bytes):
+        msgpack = _get_msgpack()
+        if msgpack is None:
+            raise ValueError("Binary frames need msgpack, which is not installed")
+        return msgpack.unpackb(payload)
+    return json.loads(payload)
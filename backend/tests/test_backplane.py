@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+from services.backplane import Backplane, InMemoryBackplane, InMemoryBroker
+from services.websocket_manager import ConnectionManager
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+class FailingBackplane(Backplane):
+    async def _send(self, payload):
+        raise ConnectionError("broker unavailable")
+
+async def start_workers(count, **kwargs):
+    broker = InMemoryBroker()
+    workers = []
+    for _ in range(count):
+        received = []
+        backplane = InMemoryBackplane(broker, channel="test", **kwargs)
+        await backplane.start(received.append)
+        workers.append((backplane, received))
+    return workers
+
+async def settle():
+    # Batches are sent by a task and delivered with call_soon
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_backplane_needs_a_transport():
+    with pytest.raises(TypeError):
+        Backplane(channel="test")
+
+def test_envelopes_reach_other_workers_but_not_their_origin():
+    async def scenario():
+        (first, first_received), (second, second_received), (third, third_received) = await start_workers(
+            3, max_batch_size=10, max_wait_ms=1
+        )
+        first.publish("topic", {"price": 1}, target="AAPL", key="AAPL")
+        await first.close()
+        await settle()
+
+        envelope = {"route": "topic", "target": "AAPL", "message": {"price": 1}, "key": "AAPL"}
+        assert second_received == [envelope]
+        assert third_received == [envelope]
+        assert first_received == []
+        assert second.get_stats()["received"] == 1
+        assert first.get_stats()["published"] == 1
+
+    asyncio.run(scenario())
+
+def test_full_batches_are_sent_without_waiting():
+    async def scenario():
+        (sender, _), (_, received) = await start_workers(2, max_batch_size=3, max_wait_ms=60000)
+        for index in range(7):
+            sender.publish("broadcast", index)
+        await settle()
+
+        # Two full batches went out; the seventh envelope waits for its timer
+        assert [envelope["message"] for envelope in received] == list(range(6))
+        assert sender.batches == 2
+
+        await sender.close()
+        await settle()
+        assert [envelope["message"] for envelope in received] == list(range(7))
+        assert sender.get_stats()["avg_batch_size"] == 7 / 3
+
+    asyncio.run(scenario())
+
+def test_partial_batches_are_sent_after_max_wait():
+    async def scenario():
+        (sender, _), (_, received) = await start_workers(2, max_batch_size=100, max_wait_ms=20)
+        sender.publish("broadcast", "a")
+        sender.publish("broadcast", "b")
+        await settle()
+        assert received == []
+
+        await asyncio.sleep(0.05)
+        await settle()
+        assert [envelope["message"] for envelope in received] == ["a", "b"]
+        assert sender.batches == 1
+
+    asyncio.run(scenario())
+
+def test_publish_errors_are_counted_not_raised():
+    async def scenario():
+        backplane = FailingBackplane(channel="test", max_batch_size=2, max_wait_ms=1)
+        await backplane.start(lambda envelope: None)
+        backplane.publish("broadcast", "a")
+        backplane.publish("broadcast", "b")
+        backplane.publish("broadcast", "c")
+        await backplane.close()
+
+        assert backplane.batches == 2
+        assert backplane.errors == 2
+
+    asyncio.run(scenario())
+
+def test_bad_payloads_and_handler_errors_are_counted():
+    async def scenario():
+        (backplane, _), = await start_workers(1, max_batch_size=10, max_wait_ms=1)
+
+        def fail(envelope):
+            raise RuntimeError("socket gone")
+
+        backplane._handler = fail
+        backplane._receive("not json")
+        backplane._receive(json.dumps({"origin": "other", "envelopes": [{"route": "broadcast"}]}))
+        assert backplane.errors == 2
+        assert backplane.received == 1
+
+    asyncio.run(scenario())
+
+def test_managers_relay_fan_out_through_the_backplane():
+    async def scenario():
+        broker = InMemoryBroker()
+        managers, sockets = [], []
+        for _ in range(2):
+            manager = ConnectionManager(queue_size=8, policy="drop_oldest")
+            await manager.attach_backplane(InMemoryBackplane(broker, channel="test", max_wait_ms=1))
+            websocket = RecordingWebSocket()
+            await manager.connect(websocket, user_id="alice")
+            manager.subscribe(websocket, "AAPL")
+            managers.append(manager)
+            sockets.append(websocket)
+
+        await managers[0].broadcast({"type": "market"})
+        await managers[0].publish("AAPL", "aapl tick")
+        await managers[1].send_to_user("alice", "hello")
+        await asyncio.sleep(0.02)
+        for manager in managers:
+            await manager.detach_backplane()
+
+        for websocket in sockets:
+            assert sorted(websocket.sent) == sorted(['{"type":"market"}', "aapl tick", "hello"])
+
+    asyncio.run(scenario())
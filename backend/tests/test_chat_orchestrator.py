@@ -0,0 +1,95 @@
+import asyncio
+
+from services.chat_orchestrator import ChatOrchestrator
+
+class FakeRAGService:
+    """Streams tokens with a delay between them and records finished turns"""
+
+    def __init__(self, tokens, delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.turns = []
+        self.closed = 0
+
+    async def stream_query(self, message, conversation_id=None):
+        try:
+            yield {"type": "sources", "sources": []}
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield {"type": "token", "content": token}
+            answer = "".join(self.tokens)
+            self.turns.append((conversation_id, message, answer))
+            yield {"type": "done", "answer": answer, "sources": [], "confidence": 0.5}
+            yield {"type": "token", "content": "never read"}
+        finally:
+            self.closed += 1
+
+    async def record_turn(self, conversation_id, question, answer):
+        self.turns.append((conversation_id, question, answer))
+
+class NoLiveData:
+    async def get_stock_info(self, symbol):
+        return None
+
+    async def get_stock_recommendation(self, symbol):
+        return None
+
+    async def get_stock_news(self, symbol, limit=3):
+        return []
+
+def make_orchestrator(rag_service, rag_deadline=5.0):
+    orchestrator = ChatOrchestrator(NoLiveData(), NoLiveData(), rag_service)
+    orchestrator.deadlines["rag"] = rag_deadline
+    return orchestrator
+
+def test_collect_rag_closes_the_stream_on_done():
+    async def scenario():
+        rag_service = FakeRAGService(["Apple ", "is up."])
+        orchestrator = make_orchestrator(rag_service)
+
+        done = await orchestrator._collect_rag("How is AAPL?", "c1")
+
+        assert done["answer"] == "Apple is up."
+        assert rag_service.closed == 1
+
+    asyncio.run(scenario())
+
+def test_completed_rag_answer_is_not_recorded_twice():
+    async def scenario():
+        rag_service = FakeRAGService(["Apple ", "is up."])
+        orchestrator = make_orchestrator(rag_service)
+
+        events = [event async for event in orchestrator.stream_query("How is AAPL?", ["AAPL"], "c1")]
+
+        assert events[-1]["answer"] == "Apple is up."
+        assert rag_service.turns == [("c1", "How is AAPL?", "Apple is up.")]
+
+    asyncio.run(scenario())
+
+def test_streamed_answer_cut_off_by_the_deadline_is_recorded():
+    async def scenario():
+        rag_service = FakeRAGService(["Apple ", "is ", "up."], delay=0.05)
+        orchestrator = make_orchestrator(rag_service, rag_deadline=0.12)
+
+        events = [event async for event in orchestrator.stream_query("How is AAPL?", ["AAPL"], "c1")]
+
+        done = events[-1]
+        assert done["type"] == "done"
+        assert done["answer"] == "Apple is"
+        assert rag_service.turns == [("c1", "How is AAPL?", "Apple is")]
+        assert rag_service.closed == 1
+        assert orchestrator.outcomes["rag"]["timeout"] == 1
+
+    asyncio.run(scenario())
+
+def test_nothing_is_recorded_when_there_is_no_answer():
+    async def scenario():
+        rag_service = FakeRAGService(["Apple"], delay=1.0)
+        orchestrator = make_orchestrator(rag_service, rag_deadline=0.05)
+
+        response = await orchestrator.process_query("How is AAPL?", ["AAPL"], "c1")
+
+        assert response["answer"] == "I couldn't get an answer in time. Please try again."
+        assert rag_service.turns == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+from fastapi import WebSocketDisconnect
+
+from services.chat_session import ChatSession
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+
+    async def send_personal_json(self, message, websocket):
+        self.sent.append(message)
+
+class FakeWebSocket:
+    """Hands ``run`` the queued frames, then blocks until more arrive"""
+
+    def __init__(self):
+        self.frames = asyncio.Queue()
+
+    async def receive(self):
+        return await self.frames.get()
+
+class FakeRouter:
+    """Streams a shared done event per query; queries in ``gates`` wait for their gate first"""
+
+    def __init__(self):
+        self.gates = {}
+        self.done = {}
+
+    async def stream_query(self, query, conversation_id):
+        yield {"type": "token", "content": query}
+        if query in self.gates:
+            await self.gates[query].wait()
+        # The same object is handed to every reader, like a cached answer
+        yield self.done.setdefault(query, {"type": "done", "answer": query})
+
+    async def answer(self, query, conversation_id):
+        return {"answer": query}
+
+def make_session(**kwargs):
+    router = FakeRouter()
+    manager = FakeManager()
+    session = ChatSession(FakeWebSocket(), manager, router, max_concurrent=4,
+                          cancel_on_new_message=True, **kwargs)
+    return session, manager, router
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def frames_for(manager, request_id):
+    return [(frame["type"], frame.get("content") or frame.get("answer")) for frame in manager.sent
+            if frame.get("request_id") == request_id]
+
+def test_concurrent_requests_carry_their_own_request_id():
+    async def scenario():
+        session, manager, router = make_session()
+        router.gates["slow"] = asyncio.Event()
+
+        session.start({"message": "slow", "stream": True, "request_id": "r1", "conversation_id": "c1"})
+        session.start({"message": "fast", "stream": True, "request_id": "r2", "conversation_id": "c2"})
+        await settle()
+        assert session.in_flight == 1
+
+        router.gates["slow"].set()
+        await settle()
+
+        assert frames_for(manager, "r1") == [("token", "slow"), ("done", "slow")]
+        assert frames_for(manager, "r2") == [("token", "fast"), ("done", "fast")]
+        assert {frame["conversation_id"] for frame in manager.sent if frame["request_id"] == "r2"} == {"c2"}
+        assert session.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_new_message_supersedes_one_in_the_same_conversation():
+    async def scenario():
+        session, manager, router = make_session()
+        router.gates["first"] = asyncio.Event()
+
+        session.start({"message": "first", "stream": True, "request_id": "r1", "conversation_id": "c1"})
+        await settle()
+        session.start({"message": "second", "stream": True, "request_id": "r2", "conversation_id": "c1"})
+        await settle()
+
+        assert frames_for(manager, "r1") == [("token", "first"), ("cancelled", None)]
+        assert frames_for(manager, "r2") == [("token", "second"), ("done", "second")]
+        assert session.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_cancel_frame_and_disconnect_stop_requests():
+    async def scenario():
+        session, manager, router = make_session()
+        router.gates["a"] = asyncio.Event()
+        router.gates["b"] = asyncio.Event()
+        frames = session.websocket.frames
+        run = asyncio.create_task(session.run())
+        for message in [
+            {"message": "a", "stream": True, "request_id": "r1", "conversation_id": "c1"},
+            {"message": "b", "stream": True, "request_id": "r2", "conversation_id": "c2"},
+            {"type": "cancel", "request_id": "r1"},
+        ]:
+            frames.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+            await settle()
+        frames.put_nowait({"type": "websocket.receive", "text": "not json"})
+        await settle()
+
+        assert frames_for(manager, "r1")[-1] == ("cancelled", None)
+        assert session.in_flight == 1
+        assert manager.sent[-1]["type"] == "error"
+
+        frames.put_nowait({"type": "websocket.disconnect", "code": 1001})
+        await settle()
+        assert isinstance(run.exception(), WebSocketDisconnect)
+        await settle()
+        assert frames_for(manager, "r2")[-1] == ("cancelled", None)
+        assert session.in_flight == 0
+
+    asyncio.run(scenario())
+
+def test_send_does_not_mutate_shared_events():
+    async def scenario():
+        session, manager, router = make_session()
+
+        session.start({"message": "q", "stream": True, "request_id": "r1", "conversation_id": "c1"})
+        await settle()
+        shared = router.done["q"]
+        session.start({"message": "q", "stream": True, "request_id": "r2", "conversation_id": "c2"})
+        await settle()
+
+        assert shared == {"type": "done", "answer": "q"}
+        done = [frame for frame in manager.sent if frame["type"] == "done"]
+        assert [(frame["request_id"], frame["conversation_id"]) for frame in done] == [
+            ("r1", "c1"), ("r2", "c2")
+        ]
+        assert all("timestamp" in frame for frame in done)
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+import asyncio
+
+from services import container as container_module
+from services.container import ServiceContainer
+
+class FakeNewsScraper:
+    async def initialize(self):
+        pass
+
+class FakeStockService:
+    def __init__(self, news_scraper):
+        self.primed = []
+
+    async def prime(self, symbols):
+        self.primed.extend(symbols)
+
+class FlakyRAGService:
+    """Fails to initialize a set number of times, then works"""
+    failures = 0
+    warmup_error = None
+
+    async def initialize(self):
+        if FlakyRAGService.failures:
+            FlakyRAGService.failures -= 1
+            raise RuntimeError("chroma unavailable")
+
+    async def warmup(self):
+        if FlakyRAGService.warmup_error:
+            raise RuntimeError(FlakyRAGService.warmup_error)
+
+def make_container(monkeypatch, failures=0, warmup_error=None):
+    monkeypatch.setattr(container_module, "NewsScraper", FakeNewsScraper)
+    monkeypatch.setattr(container_module, "StockService", FakeStockService)
+    monkeypatch.setattr(container_module, "RAGService", FlakyRAGService)
+    monkeypatch.setattr(FlakyRAGService, "failures", failures)
+    monkeypatch.setattr(FlakyRAGService, "warmup_error", warmup_error)
+
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(container_module.asyncio, "sleep", no_sleep)
+    return ServiceContainer(), delays
+
+def test_ready_after_warmup(monkeypatch):
+    container, delays = make_container(monkeypatch)
+    assert not container.ready
+
+    asyncio.run(container.warmup(["AAPL"]))
+
+    assert container.ready
+    assert container.warmup_error is None
+    assert container._stock_service.primed == ["AAPL"]
+    assert delays == []
+
+def test_failed_initialization_is_retried_with_backoff(monkeypatch):
+    container, delays = make_container(monkeypatch, failures=3)
+
+    asyncio.run(container.warmup([], max_retry_delay=3))
+
+    assert delays == [1.0, 2.0, 3]
+    assert container.ready
+    assert container.warmup_error is None
+
+def test_failed_warmup_query_still_serves(monkeypatch):
+    container, delays = make_container(monkeypatch, warmup_error="embedding timeout")
+
+    asyncio.run(container.warmup([]))
+
+    assert container.ready
+    assert container.warmup_error == "embedding timeout"
+    assert delays == []
+
+def test_ready_once_a_request_initializes_rag(monkeypatch):
+    container, _ = make_container(monkeypatch)
+
+    async def scenario():
+        # Warmup's first attempt failed and it is backing off
+        container.warmup_error = "chroma unavailable"
+        assert not container.ready
+        await container.get_rag_service()
+        assert container.ready
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import pytest
+from langchain.schema import Document
+
+from services import context_packer
+from services.context_packer import merge_chunks, pack_context
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word keeps budgets easy to reason about
+    monkeypatch.setattr(context_packer, "count_tokens", lambda text, model=None: len(text.split()))
+
+def doc(text, source="a.txt", start=None):
+    metadata = {"source": source}
+    if start is not None:
+        metadata["start_index"] = start
+    return Document(page_content=text, metadata=metadata)
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def test_blocks_exactly_at_budget_fit_and_one_more_token_does_not():
+    documents = [doc(words("a", 6), "a"), doc(words("b", 4), "b"), doc(words("c", 1), "c")]
+
+    packed = pack_context(documents, model="gpt-4", token_budget=10)
+    assert [block.source for block in packed] == ["a", "b"]
+    assert sum(block.tokens for block in packed) == 10
+
+    # "b" no longer fits, but the smaller block after it still does
+    packed = pack_context(documents, model="gpt-4", token_budget=9)
+    assert [block.source for block in packed] == ["a", "c"]
+
+def test_best_block_is_truncated_when_over_budget():
+    packed = pack_context([doc(words("a", 20)), doc(words("b", 2), "b")], model="gpt-4", token_budget=8)
+
+    assert packed[0].source == "a.txt"
+    assert 0 < packed[0].tokens <= 8
+    assert packed[0].text.startswith("a0 a1")
+
+def test_overlapping_chunks_from_one_source_merge_in_document_order():
+    text = "Revenue grew twelve percent on strong iPhone sales. Services margin expanded again."
+    first, second = text[:55], text[31:]
+    # The later window is the more relevant one
+    blocks = merge_chunks([doc(second, start=31), doc(first, start=0)])
+
+    assert len(blocks) == 1
+    assert blocks[0].text == text
+    assert (blocks[0].start, blocks[0].end) == (0, len(text))
+    assert blocks[0].rank == 0
+    assert sorted(blocks[0].ranks) == [0, 1]
+
+def test_adjacent_and_contained_chunks_merge():
+    blocks = merge_chunks([
+        doc("First paragraph of the filing.", start=0),
+        doc("Second paragraph follows.", start=31),
+        doc("paragraph of the", start=6)
+    ])
+
+    assert len(blocks) == 1
+    assert blocks[0].text == "First paragraph of the filing.\nSecond paragraph follows."
+
+def test_overlap_across_sources_is_not_merged():
+    shared = "Operating income rose on lower component costs"
+    blocks = merge_chunks([
+        doc(shared + " in the quarter.", "10-q.txt"),
+        doc("Analysts noted that " + shared, "news.txt")
+    ])
+
+    assert [block.source for block in blocks] == ["10-q.txt", "news.txt"]
+
+def test_blocks_keep_relevance_order_and_drop_duplicates_across_sources():
+    blocks = merge_chunks([
+        doc("Tesla deliveries beat estimates.", "news.txt"),
+        doc("Apple raised its dividend.", "filing.txt"),
+        doc("Tesla deliveries beat estimates.", "mirror.txt"),
+        doc("Tesla margins narrowed.", "news.txt")
+    ])
+
+    assert [(block.source, block.rank) for block in blocks] == [
+        ("news.txt", 0), ("filing.txt", 1), ("news.txt", 3)
+    ]
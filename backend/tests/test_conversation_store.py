@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+import pytest
+
+from services import conversation_store
+from services.conversation_store import ConversationStore
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word, whichever tokenizer is installed
+    monkeypatch.setattr(conversation_store, "count_tokens", lambda text: len(text.split()))
+
+class SlowSummarizer:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, summary, turns):
+        self.calls.append((summary, list(turns)))
+        await asyncio.sleep(self.delay)
+        return " ".join(filter(None, [summary] + [question for question, _ in turns]))
+
+def turn(index):
+    return f"q{index} one two", f"a{index} one two"
+
+def test_window_is_trimmed_to_token_budget(tmp_path):
+    async def scenario():
+        store = ConversationStore(str(tmp_path), token_budget=13)
+        for index in range(4):
+            await store.add_turn("c", *turn(index))
+
+        # Each turn is six tokens, so two fit
+        assert await store.get_turns("c") == [turn(2), turn(3)]
+        # The prompt counts the "Human:"/"Assistant:" labels too, so only the newest turn fits
+        assert await store.get_history("c") == "Human: q3 one two\nAssistant: a3 one two"
+
+        # A single turn over budget is still kept
+        await store.add_turn("c", "long " * 20, "answer")
+        assert len(await store.get_turns("c")) == 1
+
+    asyncio.run(scenario())
+
+def test_overflow_is_summarized_in_background(tmp_path):
+    async def scenario():
+        summarizer = SlowSummarizer(delay=0.05)
+        store = ConversationStore(str(tmp_path), token_budget=13, summarizer=summarizer)
+        for index in range(3):
+            await store.add_turn("c", *turn(index))
+
+        # add_turn returned before the summary was written
+        assert "Summary" not in await store.get_history("c")
+        await store.add_turn("c", *turn(3))
+        await store.drain()
+
+        # Turns that overflowed while a summary was running are folded in by the next one, in order
+        assert "".join(question for _, turns in summarizer.calls for question, _ in turns) == \
+            "q0 one twoq1 one two"
+        history = await store.get_history("c")
+        assert history.startswith("Summary of earlier conversation: q0 one two q1 one two")
+        assert store.get_stats()["summarized_turns"] == 2
+
+    asyncio.run(scenario())
+
+def test_requests_without_an_id_have_no_memory(tmp_path):
+    async def scenario():
+        store = ConversationStore(str(tmp_path))
+        await store.add_turn(None, "q", "a")
+        assert await store.get_history(None) == ""
+        assert store.get_stats()["in_memory"] == 0
+
+    asyncio.run(scenario())
+
+def test_idle_conversations_round_trip_through_disk(tmp_path):
+    async def scenario():
+        store = ConversationStore(str(tmp_path), token_budget=13, idle_seconds=0,
+                                  summarizer=SlowSummarizer())
+        for index in range(3):
+            await store.add_turn("c", *turn(index))
+        await store.drain()
+        history = await store.get_history("c")
+
+        assert await store.evict_idle() == 1
+        assert store.get_stats()["in_memory"] == 0
+        assert len(os.listdir(tmp_path)) == 1
+
+        assert await store.get_history("c") == history
+        assert store.get_stats()["loaded_from_disk"] == 1
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(scenario())
+
+def test_pending_summaries_are_not_lost_on_eviction(tmp_path):
+    async def scenario():
+        summarizer = SlowSummarizer(delay=0.05)
+        store = ConversationStore(str(tmp_path), token_budget=13, idle_seconds=0, summarizer=summarizer)
+        for index in range(4):
+            await store.add_turn("c", *turn(index))
+
+        # A summary is running and another is queued: the conversation stays in memory
+        assert await store.evict_idle() == 0
+        await store.drain()
+        assert await store.evict_idle() == 1
+
+        conversation = conversation_store.Conversation.from_dict(
+            {"turns": [turn(3)], "summary": "", "unsummarized": [turn(2)]}
+        )
+        assert conversation.to_dict()["unsummarized"] == [turn(2)]
+
+    asyncio.run(scenario())
+
+def test_reloaded_unsummarized_turns_are_summarized(tmp_path):
+    async def scenario():
+        summarizer = SlowSummarizer()
+        store = ConversationStore(str(tmp_path), summarizer=summarizer)
+        store._write(store._path("c"), {"turns": [turn(1)], "summary": "", "unsummarized": [turn(0)]})
+
+        await store.get_turns("c")
+        await store.drain()
+        assert (await store.get_history("c")).startswith("Summary of earlier conversation: q0 one two")
+
+    asyncio.run(scenario())
+
+def test_clear_one_or_all_conversations(tmp_path):
+    async def scenario():
+        store = ConversationStore(str(tmp_path), idle_seconds=0)
+        await store.add_turn("a", "q", "a")
+        await store.add_turn("b", "q", "a")
+        await store.evict_idle()
+        await store.add_turn("c", "q", "a")
+
+        await store.clear("a")
+        assert await store.get_turns("a") == []
+        assert await store.get_turns("b") == [("q", "a")]
+
+        await store.clear()
+        assert await store.get_turns("b") == [] and await store.get_turns("c") == []
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from services.embedding_backends import (
+    EMBEDDING_MODEL_KEY, _DynamicBatcher, check_collection_model, collection_name_for
+)
+
+class RecordingEncoder:
+    """Encodes texts to their length and records each batch"""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.fail_on in texts:
+            raise RuntimeError("encoder failed")
+        return [[float(len(text))] for text in texts]
+
+def test_default_model_keeps_the_configured_collection():
+    assert collection_name_for("text-embedding-ada-002", "finance") == "finance"
+
+def test_other_models_get_their_own_collection():
+    assert collection_name_for("local:sentence-transformers/all-MiniLM-L6-v2", "finance") == \
+        "finance_sentence-transformers-all-minilm-l6-v2"
+    assert collection_name_for("text-embedding-3-small", "finance") == "finance_text-embedding-3-small"
+    assert len(collection_name_for("x" * 100, "finance")) == 63
+
+def test_collection_built_with_another_model_is_rejected():
+    check_collection_model("finance", None, "text-embedding-ada-002")
+    check_collection_model("finance", {EMBEDDING_MODEL_KEY: "text-embedding-ada-002"}, "text-embedding-ada-002")
+    with pytest.raises(ValueError, match="all-MiniLM"):
+        check_collection_model("finance", {EMBEDDING_MODEL_KEY: "text-embedding-ada-002"}, "all-MiniLM-L6-v2")
+
+def test_concurrent_submissions_share_a_batch():
+    encoder = RecordingEncoder()
+    batcher = _DynamicBatcher(encoder, max_batch_size=3, max_wait_ms=200)
+    futures = [batcher.submit(text) for text in ("a", "bb", "ccc", "dddd")]
+
+    assert [future.result(5) for future in futures] == [[1.0], [2.0], [3.0], [4.0]]
+    # The full batch goes out at once; the rest waits out the window
+    assert encoder.batches == [["a", "bb", "ccc"], ["dddd"]]
+    assert batcher.batches == 2 and batcher.items == 4
+
+def test_cancelled_callers_are_skipped_and_worker_survives():
+    encoder = RecordingEncoder()
+    batcher = _DynamicBatcher(encoder, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("gone")))
+        kept = asyncio.wrap_future(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await kept
+
+    assert asyncio.run(scenario()) == [4.0]
+    assert encoder.batches == [["kept"]]
+    assert batcher.submit("again").result(5) == [5.0]
+
+def test_failed_batch_fails_its_callers_only():
+    encoder = RecordingEncoder(fail_on="bad")
+    batcher = _DynamicBatcher(encoder, max_batch_size=8, max_wait_ms=20)
+    failed = [batcher.submit("bad"), batcher.submit("ok")]
+
+    for future in failed:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+    assert batcher.submit("later").result(5) == [5.0]
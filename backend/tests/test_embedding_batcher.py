@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.embedding_batcher import QueryEmbeddingBatcher
+
+class CountingEmbeddings:
+    """Fake backend recording the texts of every batched call"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+        self.release = threading.Event()
+        self.release.set()
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+def test_requests_within_the_window_share_one_call():
+    async def scenario():
+        embeddings = CountingEmbeddings()
+        batcher = QueryEmbeddingBatcher(embeddings, max_batch_size=8, max_wait_ms=20)
+
+        vectors = await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "a", "ccc"]))
+
+        assert vectors == [[1.0], [2.0], [1.0], [3.0]]
+        assert embeddings.calls == [["a", "bb", "ccc"]]
+        assert batcher.deduplicated == 1
+
+        # A request after the window has closed starts a new batch
+        assert await batcher.embed("dddd") == [4.0]
+        assert embeddings.calls[1:] == [["dddd"]]
+        assert batcher.get_stats()["batches"] == 2
+
+    asyncio.run(scenario())
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    async def scenario():
+        embeddings = CountingEmbeddings()
+        batcher = QueryEmbeddingBatcher(embeddings, max_batch_size=2, max_wait_ms=60000)
+
+        vectors = await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "ccc", "dddd"])), 5
+        )
+
+        assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+        assert embeddings.calls == [["a", "bb"], ["ccc", "dddd"]]
+        assert batcher.full_batches == 2
+
+    asyncio.run(scenario())
+
+def test_backend_error_reaches_every_waiter():
+    async def scenario():
+        batcher = QueryEmbeddingBatcher(CountingEmbeddings(error=RuntimeError("rate limited")), max_wait_ms=5)
+
+        results = await asyncio.gather(*(batcher.embed(text) for text in ["a", "b", "a"]),
+                                       return_exceptions=True)
+
+        assert [str(result) for result in results] == ["rate limited"] * 3
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
+
+def test_cancelled_caller_does_not_disturb_the_rest_of_its_batch():
+    async def scenario():
+        embeddings = CountingEmbeddings()
+        embeddings.release.clear()
+        batcher = QueryEmbeddingBatcher(embeddings, max_wait_ms=5)
+
+        cancelled = asyncio.create_task(batcher.embed("a"))
+        sibling = asyncio.create_task(batcher.embed("a"))
+        other = asyncio.create_task(batcher.embed("bb"))
+
+        # Wait until the batch is inside the backend call, then cancel one caller
+        while not embeddings.calls:
+            await asyncio.sleep(0.005)
+        cancelled.cancel()
+        embeddings.release.set()
+
+        assert await sibling == [1.0]
+        assert await other == [2.0]
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert embeddings.calls == [["a", "bb"]]
+
+    asyncio.run(scenario())
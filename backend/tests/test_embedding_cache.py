@@ -0,0 +1,78 @@
+import itertools
+
+import pytest
+
+from services import embedding_cache
+from services.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return [float(len(text)), 0.0]
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    # Every access gets a distinct time so LRU order is deterministic
+    clock = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(clock)))
+
+def key(text):
+    return EmbeddingCache.make_key("model", text)
+
+def test_evicts_least_recently_used_past_capacity(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=10)
+    for index in range(10):
+        cache.put_many("model", {key(f"text {index}"): [float(index)]})
+
+    # Touch the oldest entry so it is no longer the least recently used
+    assert cache.get_many([key("text 0")]) == {key("text 0"): [0.0]}
+    cache.put_many("model", {key("text 10"): [10.0]})
+
+    # Over budget: evict down to 90% (9 entries), oldest access first
+    stats = cache.get_stats()
+    assert stats["entries"] == 9
+    assert stats["evictions"] == 2
+    remaining = cache.get_many([key(f"text {index}") for index in range(11)])
+    assert key("text 0") in remaining
+    assert key("text 1") not in remaining and key("text 2") not in remaining
+    assert key("text 10") in remaining
+
+def test_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "nested" / "cache.db")
+    cache = EmbeddingCache(path, max_entries=100)
+    cache.put_many("model", {key("apple"): [0.5, -1.25], key("msft"): [2.0]})
+    # Inserting an existing key again does not double count it
+    cache.put_many("model", {key("apple"): [9.0]})
+    cache.close()
+
+    reopened = EmbeddingCache(path, max_entries=100)
+    assert reopened.get_stats()["entries"] == 2
+    assert reopened.get_many([key("apple"), key("missing")]) == {key("apple"): [0.5, -1.25]}
+    assert reopened.get_stats()["hits"] == 1
+    assert reopened.get_stats()["misses"] == 1
+
+    reopened.clear()
+    assert reopened.get_many([key("apple")]) == {}
+    assert reopened.get_stats()["entries"] == 0
+
+def test_cached_embeddings_only_embed_misses_once(tmp_path):
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, "model", EmbeddingCache(str(tmp_path / "cache.db")))
+
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    second = embeddings.embed_documents(["bb", "ccc"])
+
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[2.0, 1.0], [3.0, 1.0]]
+    assert backend.calls == [["a", "bb"], ["ccc"]]
+
+    assert embeddings.embed_query("dddd") == [4.0, 0.0]
+    assert embeddings.embed_query("dddd") == [4.0, 0.0]
+    assert backend.calls[-1] == ["dddd"] and len(backend.calls) == 3
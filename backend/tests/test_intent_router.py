@@ -0,0 +1,34 @@
+import pytest
+
+from services.intent_router import Intent, classify, extract_tickers
+
+@pytest.mark.parametrize("text", [
+    "Should I move my IRA into an ETF?",
+    "What ROI should I expect if CPI beats and the FOMC holds?",
+    "Is the EPS guidance in the 10-K any good?",
+    "Is IT a good buy?"
+])
+def test_unknown_capitalised_words_are_not_tickers(text):
+    match = classify(text)
+    assert match.tickers == []
+    assert match.intent == Intent.OPEN
+
+def test_known_symbols_company_names_and_cashtags():
+    assert extract_tickers("Compare AAPL with microsoft and $pltr") == ["PLTR", "AAPL", "MSFT"]
+    assert extract_tickers("Price of V and JPM?") == ["V", "JPM"]
+
+def test_confirmed_symbols_are_recognised():
+    assert extract_tickers("AMD and SNOW price") == ["AMD"]
+    assert extract_tickers("AMD and SNOW price", {"AMD", "SNOW"}) == ["AMD", "SNOW"]
+    # Common words stay words even when a listed symbol shares the spelling
+    assert extract_tickers("IT is ON sale", {"IT", "ON"}) == []
+
+@pytest.mark.parametrize("text, intent", [
+    ("What is the AAPL stock price?", Intent.QUOTE),
+    ("Should I buy NVDA?", Intent.RECOMMENDATION),
+    ("Latest news on Tesla", Intent.NEWS),
+    ("Why did MSFT fall after earnings?", Intent.OPEN),
+    ("What's the price of gold?", Intent.OPEN)
+])
+def test_classify_intents(text, intent):
+    assert classify(text).intent == intent
@@ -0,0 +1,134 @@
+import math
+
+from services import keyword_index
+from services.keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+def bm25(tf, doc_length, avg_length, doc_count, doc_freq, k1=1.5, b=0.75):
+    idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_length / avg_length))
+
+def make_index(**kwargs):
+    index = KeywordIndex(**kwargs)
+    index.add_many([
+        ("a", "Apple reported record iPhone revenue"),
+        ("b", "Apple Apple services revenue grew"),
+        ("c", "Microsoft cloud revenue"),
+        ("d", "BRK.B filed its 10-K")
+    ])
+    return index
+
+def test_tokenize_keeps_identifiers_and_drops_stopwords():
+    assert tokenize("The BRK.B 10-K is filed by S&P") == ["brk.b", "10-k", "filed", "s&p"]
+
+def test_search_matches_bm25():
+    index = make_index()
+    lengths = {"a": 5, "b": 5, "c": 3, "d": 3}
+    avg_length = sum(lengths.values()) / 4
+
+    results = dict(index.search("apple revenue"))
+
+    assert set(results) == {"a", "b", "c"}
+    expected_b = bm25(2, 5, avg_length, 4, 2) + bm25(1, 5, avg_length, 4, 3)
+    assert math.isclose(results["b"], expected_b)
+    assert math.isclose(results["c"], bm25(1, 3, avg_length, 4, 3))
+    assert index.search("apple revenue", k=1)[0][0] == "b"
+
+def test_search_without_matching_terms():
+    index = make_index()
+    assert index.search("the of and") == []
+    assert index.search("tesla") == []
+    assert KeywordIndex().search("apple") == []
+
+def test_add_many_skips_indexed_ids():
+    index = make_index()
+    index.add("a", "something else entirely")
+    assert len(index) == 4
+    assert index.search("something") == []
+
+def test_removed_chunks_stop_matching_until_compacted():
+    index = make_index()
+
+    assert index.remove(["b", "missing"]) == 1
+    assert len(index) == 3
+    assert index.tombstone_ratio == 0.25
+    assert [doc_id for doc_id, _ in index.search("apple")] == ["a"]
+
+    scores_before = dict(index.search("revenue"))
+    assert index.compact() == 1
+    assert index.tombstone_ratio == 0.0
+    assert index.compact() == 0
+    assert index.get_stats()["tombstones"] == 0
+    assert dict(index.search("revenue")).keys() == scores_before.keys()
+
+    # Renumbered chunks keep their postings and new chunks take fresh slots
+    index.add("e", "Apple earnings")
+    assert {doc_id for doc_id, _ in index.search("apple")} == {"a", "e"}
+
+def test_common_terms_only_score_rarer_matches():
+    index = KeywordIndex(max_postings=2)
+    index.add_many([(f"filler{i}", "market update") for i in range(5)])
+    index.add_many([("rare", "market update nvidia")])
+
+    # "market" is too common to scan, so only the chunk matching "nvidia" is scored
+    assert [doc_id for doc_id, _ in index.search("nvidia market")] == ["rare"]
+    # A query of only common terms scans a bounded prefix of the rarest one
+    assert len(index.search("market", k=10)) == 2
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "index" / "keyword.pkl")
+    index = make_index(path=path)
+    index.remove(["c"])
+    index.save()
+
+    # Changes after the snapshot don't leak into it
+    index.add("e", "Apple earnings")
+
+    expected = make_index()
+    expected.remove(["c"])
+    loaded = KeywordIndex(path=path)
+    assert loaded.load()
+    assert len(loaded) == 3
+    assert loaded.search("apple revenue") == expected.search("apple revenue")
+    assert loaded.search("earnings") == []
+
+def test_indexing_while_snapshot_is_written(tmp_path, monkeypatch):
+    path = str(tmp_path / "keyword.pkl")
+    index = make_index(path=path)
+    dump = keyword_index.pickle.dump
+
+    def dump_while_indexing(state, f, **kwargs):
+        # Runs outside the index lock, like a concurrent ingestion batch
+        index.add("e", "Apple revenue guidance")
+        dump(state, f, **kwargs)
+
+    monkeypatch.setattr(keyword_index.pickle, "dump", dump_while_indexing)
+    index.save()
+
+    loaded = KeywordIndex(path=path)
+    assert loaded.load()
+    assert len(loaded) == 4
+    assert "e" not in dict(loaded.search("apple revenue guidance"))
+    assert "e" in dict(index.search("apple revenue guidance"))
+    assert index.search("apple revenue") != loaded.search("apple revenue")
+
+def test_save_if_dirty_respects_interval(tmp_path):
+    path = tmp_path / "keyword.pkl"
+    index = make_index(path=str(path))
+    index.save_if_dirty(min_interval=3600)
+    assert not path.exists()
+    index.save_if_dirty(min_interval=0)
+    assert path.exists()
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+    scores = dict(fused)
+
+    assert math.isclose(scores["a"], 1 / 61)
+    assert math.isclose(scores["c"], 1 / 63 + 1 / 61)
+    # "b" and "d" tie and keep the order they were first ranked in
+    assert [doc_id for doc_id, _ in fused] == ["c", "a", "b", "d"]
+
+def test_reciprocal_rank_fusion_weights():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"]], weights=[1.0, 2.0], k=0)
+    assert [doc_id for doc_id, _ in fused] == ["b", "a"]
+    assert math.isclose(dict(fused)["b"], 1 / 2 + 2 / 1)
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from services.mcp_server import CircuitBreaker, MCPCallError, MCPServer
+
+def open_breaker(reset_seconds=0.01):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=reset_seconds)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert breaker.times_opened == 1
+
+def test_half_open_lets_one_trial_through():
+    breaker = open_breaker()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_unreported_trial_expires():
+    breaker = open_breaker(reset_seconds=0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+def make_server(post):
+    server = MCPServer()
+    server.session = object()
+    server._post_execute = post
+    return server
+
+def test_cancelled_trial_does_not_leave_breaker_half_open():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang(tool_name, parameters, timeout):
+            started.set()
+            await asyncio.sleep(60)
+
+        server = make_server(hang)
+        server.breaker = open_breaker()
+        await asyncio.sleep(0.02)
+
+        call = asyncio.create_task(server.execute_tool("market_data", {"symbol": "AAPL"}))
+        await started.wait()
+        assert server.breaker.state == "half_open"
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+
+        assert server.breaker.state == "open"
+        # The next call becomes the trial straight away
+        assert server.breaker.allow()
+
+    asyncio.run(scenario())
+
+def test_retries_idempotent_tools_until_success():
+    async def scenario():
+        responses = [MCPCallError("502"), asyncio.TimeoutError(), {"price": 1}]
+
+        async def flaky(tool_name, parameters, timeout):
+            response = responses.pop(0)
+            if isinstance(response, BaseException):
+                raise response
+            return response
+
+        server = make_server(flaky)
+        assert await server.execute_tool("market_data", {"symbol": "AAPL"}) == {"price": 1}
+        assert server.retries == 2
+        assert server.timeouts == 1
+        assert server.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+def test_client_errors_are_not_retried():
+    async def scenario():
+        calls = []
+
+        async def reject(tool_name, parameters, timeout):
+            calls.append(tool_name)
+            raise MCPCallError("Tool execution failed: 404", retryable=False)
+
+        server = make_server(reject)
+        assert await server.execute_tool("market_data", {}) == {"error": "Tool execution failed: 404"}
+        assert len(calls) == 1
+        assert server.breaker.failures == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime
+
+from langchain.schema import Document
+
+from services.ingestion import chunk_id
+from services.keyword_index import KeywordIndex
+from services.rag_service import RAGService
+
+class FakeCollection:
+    """In-memory stand-in for the parts of a Chroma collection the indexer uses"""
+
+    def __init__(self):
+        self.records = {}
+        self.gets = []
+
+    def count(self):
+        return len(self.records)
+
+    def _matches(self, metadata, where):
+        for key, condition in (where or {}).items():
+            value = metadata.get(key)
+            if isinstance(condition, dict):
+                if not value < condition["$lt"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=()):
+        self.gets.append({"ids": ids, "where": where, "limit": limit, "include": list(include)})
+        matched = [
+            doc_id for doc_id, record in self.records.items()
+            if (ids is None or doc_id in ids) and self._matches(record["metadata"], where)
+        ]
+        if limit is not None:
+            matched = matched[offset:offset + limit]
+        result = {"ids": matched}
+        if "documents" in include:
+            result["documents"] = [self.records[doc_id]["document"] for doc_id in matched]
+        return result
+
+    def update(self, ids, metadatas):
+        for doc_id, metadata in zip(ids, metadatas):
+            self.records[doc_id]["metadata"] = dict(metadata)
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.records.pop(doc_id, None)
+
+class FakeVectorStore:
+    def __init__(self, collection):
+        self.collection = collection
+        self.embedded = []
+
+    def add_documents(self, documents, ids):
+        self.embedded.extend(ids)
+        for doc_id, doc in zip(ids, documents):
+            self.collection.records[doc_id] = {"document": doc.page_content, "metadata": dict(doc.metadata)}
+
+def make_service(keyword_index=None):
+    service = RAGService()
+    service.collection = FakeCollection()
+    service.vectorstore = FakeVectorStore(service.collection)
+    service.keyword_index = keyword_index if keyword_index is not None else KeywordIndex()
+    return service
+
+def chunk(text, source="report.txt", **metadata):
+    return Document(page_content=text, metadata={"source": source, **metadata})
+
+def test_upsert_embeds_only_new_or_changed_chunks():
+    service = make_service()
+    assert service._index_chunks([chunk("Revenue grew."), chunk("Margins fell.")]) == 2
+
+    # Unchanged text only gets its metadata refreshed; edited text is a new chunk
+    embedded = service._index_chunks([chunk("Revenue grew.", ticker="aapl"), chunk("Margins rose.")])
+
+    assert embedded == 1
+    assert service.vectorstore.embedded[-1] == chunk_id("report.txt", "Margins rose.")
+    assert service.collection.records[chunk_id("report.txt", "Revenue grew.")]["metadata"]["ticker"] == "AAPL"
+    assert service.index_counts == {"embedded": 3, "unchanged": 1, "removed": 0, "compactions": 0}
+    assert len(service.keyword_index) == 3
+
+def test_reingesting_a_source_prunes_chunks_it_no_longer_has():
+    service = make_service()
+
+    async def scenario():
+        await service.add_document_stream(iter([chunk("Old guidance."), chunk("Revenue grew."),
+                                                chunk("Unrelated.", "other.txt")]))
+        await service.add_document_stream(iter([chunk("Revenue grew."), chunk("New guidance.")]))
+
+    asyncio.run(scenario())
+
+    stored = {record["document"] for record in service.collection.records.values()}
+    assert stored == {"Revenue grew.", "New guidance.", "Unrelated."}
+    assert [doc_id for doc_id, _ in service.keyword_index.search("guidance")] == [
+        chunk_id("report.txt", "New guidance.")
+    ]
+    assert service.index_counts["removed"] == 1
+
+def test_delete_by_source_and_age():
+    service = make_service()
+    service._index_chunks([
+        chunk("Q1 call notes.", "q1.txt", timestamp=datetime(2024, 1, 1).timestamp()),
+        chunk("Q2 call notes.", "q2.txt", timestamp=datetime(2024, 4, 1).timestamp()),
+        chunk("Q3 call notes.", "q3.txt", timestamp=datetime(2024, 7, 1).timestamp())
+    ])
+
+    async def scenario():
+        assert await service.delete_by_source("q3.txt") == 1
+        assert await service.delete_older_than(datetime(2024, 3, 1)) == 1
+        assert await service.delete_by_source("missing.txt") == 0
+
+    asyncio.run(scenario())
+
+    assert [record["document"] for record in service.collection.records.values()] == ["Q2 call notes."]
+    assert [doc_id for doc_id, _ in service.keyword_index.search("call notes")] == [
+        chunk_id("q2.txt", "Q2 call notes.")
+    ]
+    assert service.collection_version == 2
+
+def test_sync_adds_missing_and_drops_stale_keyword_entries(tmp_path):
+    path = str(tmp_path / "keyword.pkl")
+    service = make_service(KeywordIndex(path=path))
+    service._index_chunks([chunk("Kept chunk."), chunk("Deleted chunk.")])
+    service.keyword_index.save()
+
+    # Chroma changed while the snapshot was stale: one chunk gone, two added
+    del service.collection.records[chunk_id("report.txt", "Deleted chunk.")]
+    added = [chunk("Added chunk."), chunk("Another chunk.")]
+    service.vectorstore.add_documents(added, ids=[chunk_id("report.txt", doc.page_content) for doc in added])
+
+    service.keyword_index = KeywordIndex(path=path)
+    service._sync_keyword_index(page_size=1)
+    assert service.keyword_index.doc_ids() == set(service.collection.records)
+
+    # The reconciled snapshot was saved, so the next start doesn't rescan
+    restarted = make_service(KeywordIndex(path=path))
+    restarted.collection = service.collection
+    service.collection.gets.clear()
+    restarted._sync_keyword_index()
+    assert service.collection.gets == []
+    assert restarted.keyword_index.doc_ids() == set(service.collection.records)
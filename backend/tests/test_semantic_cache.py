@@ -0,0 +1,78 @@
+import asyncio
+
+from services import semantic_cache
+from services.semantic_cache import SemanticAnswerCache
+from services.tickers import extract_tickers
+
+def answer(text):
+    return {"type": "done", "answer": text, "sources": [{"title": "10-K", "score": 0.9}]}
+
+def test_hit_requires_same_tickers():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cached_query = "should I buy AMD"
+    cache.store(cached_query, [1.0, 0.0], answer("AMD looks fine"), 1,
+                tickers=extract_tickers(cached_query, known_symbols=None))
+
+    # The embeddings are nearly identical, only the company differs
+    query = "should I buy NVDA"
+    assert cache.lookup([0.999, 0.01], 1, extract_tickers(query, known_symbols=None)) is None
+    hit = cache.lookup([0.999, 0.01], 1, extract_tickers("Should I buy AMD?", known_symbols=None))
+    assert hit["answer"] == "AMD looks fine"
+    assert cache.hits == 1 and cache.misses == 1
+
+def test_picks_best_entry_with_matching_tickers():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("amd outlook", [1.0, 0.0], answer("AMD"), 1, tickers={"AMD"})
+    cache.store("nvda outlook", [0.95, 0.3], answer("NVDA"), 1, tickers={"NVDA"})
+
+    assert cache.lookup([1.0, 0.0], 1, {"NVDA"})["answer"] == "NVDA"
+
+def test_readers_cannot_change_cached_answer():
+    cache = SemanticAnswerCache()
+    response = answer("Buy")
+    cache.store("q", [1.0, 0.0], response, 1)
+
+    # The generating stream keeps annotating the event it yielded
+    response["request_id"] = "first"
+    response["sources"][0]["title"] = "changed"
+
+    hit = cache.lookup([1.0, 0.0], 1)
+    assert "request_id" not in hit
+    assert hit["sources"][0]["title"] == "10-K"
+
+    hit["request_id"] = "second"
+    hit["sources"].clear()
+    again = cache.lookup([1.0, 0.0], 1)
+    assert "request_id" not in again
+    assert again["sources"][0]["title"] == "10-K"
+
+def test_expired_and_stale_version_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store("q", [1.0, 0.0], answer("Buy"), 1)
+
+    assert cache.lookup([1.0, 0.0], 2) is None
+    cache.store("q", [1.0, 0.0], answer("Buy"), 2)
+    assert cache.lookup([1.0, 0.0], 2) is not None
+
+    now[0] += 61
+    assert cache.lookup([1.0, 0.0], 2) is None
+    assert cache.get_stats()["entries"] == 0
+
+def test_waiters_get_a_copy_of_the_result():
+    async def scenario():
+        cache = SemanticAnswerCache()
+        cache.begin("What is a P/E ratio?")
+        pending = cache.get_pending("what is a p/e  ratio?")
+
+        response = answer("Price over earnings")
+        cache.complete("What is a P/E ratio?", response)
+        response["request_id"] = "first"
+
+        result = await pending
+        assert result["answer"] == "Price over earnings"
+        assert "request_id" not in result
+        assert cache.get_pending("What is a P/E ratio?") is None
+
+    asyncio.run(scenario())
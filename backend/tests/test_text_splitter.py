@@ -0,0 +1,83 @@
+import random
+import re
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from services.text_splitter import DEFAULT_LOOKAHEAD_CHARS, StreamingTextSplitter
+
+WORDS = ["alpha", "beta", "revenue", "10-K", "\n", "\n\n", "\n\n\n", " ", "  ", "x" * 50, "y" * 300]
+
+def random_text(rng: random.Random, words: int) -> str:
+    text = "".join(rng.choice(WORDS) + (" " if rng.random() < 0.7 else "") for _ in range(words))
+    if rng.random() < 0.2:
+        text = text.replace("\n\n", "\n")
+    if rng.random() < 0.1:
+        text = text.replace("\n", "")
+    return text
+
+def single_breaks(text: str) -> str:
+    return re.sub(r"\n+", "\n", text)
+
+def random_blocks(rng: random.Random, text: str, max_block: int):
+    """Cut text into randomly sized reads, so separators and chunks straddle read boundaries"""
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, max_block)
+        yield text[position:position + size]
+        position += size
+
+def assert_parity(text: str, splitter: StreamingTextSplitter, blocks):
+    expected = RecursiveCharacterTextSplitter(
+        chunk_size=splitter.chunk_size, chunk_overlap=splitter.chunk_overlap
+    ).split_text(text)
+
+    assert splitter.split_text(text) == expected
+    streamed = list(splitter.iter_chunks(blocks))
+    assert [chunk for chunk, _ in streamed] == expected
+    for chunk, offset in streamed:
+        assert text[offset:offset + len(chunk)] == chunk
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_langchain_on_random_text(seed):
+    rng = random.Random(seed)
+    for _ in range(30):
+        chunk_size = rng.choice([10, 50, 100, 300, 1000])
+        chunk_overlap = rng.choice([0, min(5, chunk_size), chunk_size // 5, chunk_size // 2])
+        text = random_text(rng, rng.randint(0, 400))
+        splitter = StreamingTextSplitter(chunk_size, chunk_overlap)
+        assert_parity(text, splitter, random_blocks(rng, text, rng.choice([1, 7, 40, 4096])))
+
+def test_top_separator_around_lookahead_boundary():
+    rng = random.Random(0)
+    splitter = StreamingTextSplitter(1000, 200)
+    filler = single_breaks(random_text(random.Random(1), 40000))[:DEFAULT_LOOKAHEAD_CHARS]
+    assert len(filler) == DEFAULT_LOOKAHEAD_CHARS
+
+    # The first paragraph break lands just before, and straddling, the lookahead limit
+    for position in (DEFAULT_LOOKAHEAD_CHARS - 3, DEFAULT_LOOKAHEAD_CHARS - 1):
+        text = filler[:position] + "\n\n" + filler[:5000]
+        assert_parity(text, splitter, random_blocks(rng, text, 65536))
+
+def test_no_top_separator_within_lookahead():
+    rng = random.Random(2)
+    splitter = StreamingTextSplitter(1000, 200)
+    text = single_breaks(random_text(random.Random(3), 40000))
+    assert len(text) > DEFAULT_LOOKAHEAD_CHARS and "\n\n" not in text
+    assert_parity(text, splitter, random_blocks(rng, text, 65536))
+
+def test_late_top_separator_keeps_offsets_and_sizes():
+    # Past the lookahead the splitter commits to "\n" and may differ from langchain,
+    # but every chunk must still be a bounded slice of the input
+    splitter = StreamingTextSplitter(100, 20, lookahead_chars=256)
+    text = ("line of text\n" * 40) + "\n\n" + ("tail words " * 30)
+    chunks = list(splitter.iter_chunks(random_blocks(random.Random(4), text, 17)))
+    assert chunks
+    for chunk, offset in chunks:
+        assert len(chunk) <= 100
+        assert text[offset:offset + len(chunk)] == chunk
+    assert chunks[-1][0].endswith("tail words")
+
+def test_overlap_larger_than_chunk_size():
+    with pytest.raises(ValueError):
+        StreamingTextSplitter(chunk_size=100, chunk_overlap=200)
@@ -0,0 +1,274 @@
+import asyncio
+
+import pytest
+
+from services.websocket_manager import (
+    SLOW_CONSUMER_CLOSE_CODE, ConnectionManager, Outbox, SlowConsumerError
+)
+
+class FakeWebSocket:
+    """Records what the manager sends; ``block`` holds sends to simulate a slow client"""
+
+    def __init__(self):
+        self.accepted = None
+        self.sent = []
+        self.closed = None
+        self.block = asyncio.Event()
+        self.block.set()
+
+    async def accept(self, subprotocol=None):
+        self.accepted = subprotocol
+
+    async def send_text(self, message):
+        await self.block.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.block.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+def drain(outbox):
+    return [entry[0] for entry in outbox._entries]
+
+def test_drop_oldest_discards_oldest_broadcast():
+    outbox = Outbox(3, "drop_oldest")
+    for message in ("a", "b", "c", "d"):
+        outbox.put(message)
+
+    assert drain(outbox) == ["b", "c", "d"]
+    assert outbox.dropped == 1
+    assert outbox.max_depth == 3
+
+def test_drop_oldest_keeps_replies():
+    outbox = Outbox(3, "drop_oldest")
+    outbox.put("reply", droppable=False)
+    outbox.put("a")
+    outbox.put("b")
+    outbox.put("c")
+
+    assert drain(outbox) == ["reply", "b", "c"]
+
+def test_full_of_replies_drops_incoming_broadcast():
+    outbox = Outbox(2, "drop_oldest")
+    outbox.put("r1", droppable=False)
+    outbox.put("r2", droppable=False)
+    outbox.put("broadcast")
+
+    assert drain(outbox) == ["r1", "r2"]
+    assert outbox.dropped == 1
+
+def test_full_of_replies_rejects_another_reply():
+    outbox = Outbox(2, "coalesce")
+    outbox.put("r1", droppable=False)
+    outbox.put("r2", droppable=False)
+
+    with pytest.raises(SlowConsumerError):
+        outbox.put("r3", droppable=False)
+    assert drain(outbox) == ["r1", "r2"]
+
+def test_coalesce_replaces_message_with_same_key_in_place():
+    outbox = Outbox(3, "coalesce")
+    outbox.put("AAPL 1", key="AAPL")
+    outbox.put("MSFT 1", key="MSFT")
+    outbox.put("AAPL 2", key="AAPL")
+
+    assert drain(outbox) == ["AAPL 2", "MSFT 1"]
+    assert outbox.coalesced == 1
+    assert outbox.dropped == 0
+
+def test_coalesce_drops_oldest_when_key_is_new():
+    outbox = Outbox(2, "coalesce")
+    outbox.put("AAPL", key="AAPL")
+    outbox.put("MSFT", key="MSFT")
+    outbox.put("NVDA", key="NVDA")
+    # The dropped message's key no longer coalesces
+    outbox.put("AAPL 2", key="AAPL")
+
+    assert drain(outbox) == ["NVDA", "AAPL 2"]
+    assert outbox.dropped == 2
+
+def test_drop_oldest_ignores_keys():
+    outbox = Outbox(3, "drop_oldest")
+    outbox.put("AAPL 1", key="AAPL")
+    outbox.put("AAPL 2", key="AAPL")
+
+    assert drain(outbox) == ["AAPL 1", "AAPL 2"]
+
+def test_disconnect_policy_raises_when_full():
+    outbox = Outbox(1, "disconnect")
+    outbox.put("a")
+
+    with pytest.raises(SlowConsumerError):
+        outbox.put("b")
+
+def test_get_waits_for_messages_and_join_waits_for_sends():
+    async def scenario():
+        outbox = Outbox(4, "drop_oldest")
+        getter = asyncio.create_task(outbox.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+
+        outbox.put("a")
+        assert await getter == "a"
+        outbox.task_done()
+        joined = asyncio.create_task(outbox.join())
+        await asyncio.sleep(0)
+        assert joined.done()
+
+        outbox.put("b")
+        joined = asyncio.create_task(outbox.join())
+        assert await outbox.get() == "b"
+        await asyncio.sleep(0)
+        assert not joined.done()
+        outbox.task_done()
+        await asyncio.wait_for(joined, 1)
+
+    asyncio.run(scenario())
+
+def test_manager_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        ConnectionManager(queue_size=4, policy="block")
+
+def test_slow_consumer_is_disconnected_and_closed():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, policy="disconnect")
+        slow, fast = FakeWebSocket(), FakeWebSocket()
+        slow.block.clear()
+        await manager.connect(slow)
+        await manager.connect(fast)
+
+        for index in range(4):
+            await manager.broadcast(f"tick {index}")
+            await asyncio.sleep(0)
+
+        assert manager.get_connection(slow) is None
+        assert manager.get_connection(fast) is not None
+        assert fast.sent == [f"tick {index}" for index in range(4)]
+        await asyncio.sleep(0)
+        assert slow.closed == SLOW_CONSUMER_CLOSE_CODE
+
+        stats = manager.get_queue_stats()
+        assert stats["slow_disconnects"] == 1
+        assert stats["sent"] == 4
+        assert stats["queued"] == 0
+
+    asyncio.run(scenario())
+
+def test_replies_survive_broadcast_pressure():
+    async def scenario():
+        manager = ConnectionManager(queue_size=3, policy="drop_oldest")
+        websocket = FakeWebSocket()
+        websocket.block.clear()
+        await manager.connect(websocket)
+
+        await manager.send_personal_message("reply", websocket)
+        for index in range(5):
+            await manager.broadcast(f"tick {index}")
+        assert manager.get_queue_stats()["dropped"] == 3
+
+        websocket.block.set()
+        await manager.close(websocket)
+        assert websocket.sent[0] == "reply"
+        assert websocket.sent[1:] == ["tick 3", "tick 4"]
+
+    asyncio.run(scenario())
+
+def test_indexes_follow_connect_subscribe_and_disconnect():
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, policy="drop_oldest")
+        alice_phone, alice_laptop, bob = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        phone_id = await manager.connect(alice_phone, user_id="alice", subprotocol="msgpack")
+        laptop_id = await manager.connect(alice_laptop, user_id="alice")
+        bob_id = await manager.connect(bob)
+
+        assert alice_phone.accepted == "msgpack"
+        assert len(manager) == 3
+        assert manager.get_connection(bob).id == bob_id
+        assert manager._by_user == {"alice": {phone_id, laptop_id}}
+
+        manager.set_user_id(bob, "bob")
+        manager.subscribe(alice_phone, "AAPL")
+        manager.subscribe(bob, "AAPL")
+        manager.subscribe(bob, "MSFT")
+        assert manager._by_topic == {"AAPL": {phone_id, bob_id}, "MSFT": {bob_id}}
+        assert manager.get_connection(bob).topics == {"AAPL", "MSFT"}
+
+        manager.unsubscribe(bob, "MSFT")
+        assert "MSFT" not in manager._by_topic
+
+        manager.disconnect(alice_phone)
+        assert phone_id not in manager.connections
+        assert manager.get_connection(alice_phone) is None
+        assert manager._by_user == {"alice": {laptop_id}, "bob": {bob_id}}
+        assert manager._by_topic == {"AAPL": {bob_id}}
+
+        # Disconnecting twice, or something never connected, is a no-op
+        manager.disconnect(alice_phone)
+        manager.disconnect(FakeWebSocket())
+        manager.subscribe(alice_phone, "NVDA")
+        assert "NVDA" not in manager._by_topic
+
+        manager.disconnect(bob)
+        manager.disconnect(alice_laptop)
+        assert manager.connections == {}
+        assert manager._by_socket == {} and manager._by_user == {} and manager._by_topic == {}
+
+    asyncio.run(scenario())
+
+def test_set_user_id_moves_connection_between_users():
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, policy="drop_oldest")
+        websocket = FakeWebSocket()
+        connection_id = await manager.connect(websocket, user_id="alice")
+
+        manager.set_user_id(websocket, "bob")
+        assert manager._by_user == {"bob": {connection_id}}
+        manager.set_user_id(websocket, None)
+        assert manager._by_user == {}
+        assert manager.get_connection(websocket).user_id is None
+
+    asyncio.run(scenario())
+
+def test_user_and_topic_fan_out_reach_only_their_connections():
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, policy="drop_oldest")
+        alice, bob, carol = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(alice, user_id="alice")
+        await manager.connect(bob, user_id="bob")
+        await manager.connect(carol)
+        manager.subscribe(bob, "AAPL")
+        manager.subscribe(carol, "AAPL")
+
+        assert await manager.send_to_user("alice", "hi alice") == 1
+        assert await manager.publish("AAPL", {"symbol": "AAPL"}) == 2
+        assert await manager.publish("TSLA", "nobody") == 0
+        assert await manager.send_to_user("dave", "nobody") == 0
+        await asyncio.sleep(0)
+
+        assert alice.sent == ["hi alice"]
+        assert bob.sent == ['{"symbol":"AAPL"}']
+        assert carol.sent == ['{"symbol":"AAPL"}']
+
+    asyncio.run(scenario())
+
+def test_connection_stats_use_running_counters():
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, policy="drop_oldest")
+        sockets = [FakeWebSocket() for _ in range(3)]
+        for index, websocket in enumerate(sockets):
+            await manager.connect(websocket, user_id=f"user{index % 2}")
+        manager.subscribe(sockets[0], "AAPL")
+
+        stats = manager.get_connection_stats(details=2)
+        assert stats["total_connections"] == 3
+        assert stats["users"] == 2
+        assert stats["topics"] == 1
+        assert stats["backplane"] is None
+        assert len(stats["connection_details"]) == 2
+        assert stats["connection_details"][0]["topics"] == ["AAPL"]
+        assert "connection_details" not in manager.get_connection_stats()
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+
+import msgpack
+import pytest
+
+from services import wire_format
+from services.wire_format import JSON, MSGPACK, decode_frame, negotiate
+
+class FakeWebSocket:
+    def __init__(self, subprotocols=(), query_params=None):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.query_params = query_params or {}
+
+EVENTS = [
+    {"type": "sources", "sources": [{"title": "10-K", "source": "aapl.txt", "score": 0.82}],
+     "request_id": "r1", "conversation_id": "c1", "timestamp": 12.5},
+    {"type": "token", "content": "Apple's revenue grew 8% — driven by services.", "request_id": "r1"},
+    {"type": "done", "answer": "Buy", "sources": [], "processing_time": 1.25, "time_to_first_token": None,
+     "confidence": 0.7, "cached": True, "live_data": [{"source": "quote", "symbol": "AAPL",
+                                                         "status": "ok", "elapsed": 0.2}]},
+    {"type": "error", "message": "An error occurred"},
+    {"type": "cancelled", "request_id": "r2"},
+    {"type": "pong"},
+]
+
+def test_offered_subprotocol_wins():
+    websocket = FakeWebSocket(["graphql-ws", "msgpack", "json"], {"format": "json"})
+    assert negotiate(websocket) == (MSGPACK, "msgpack")
+
+    assert negotiate(FakeWebSocket(["json"])) == (JSON, "json")
+
+def test_query_parameter_selects_format_without_subprotocol():
+    assert negotiate(FakeWebSocket(query_params={"format": "msgpack"})) == (MSGPACK, None)
+    assert negotiate(FakeWebSocket(["graphql-ws"], {"format": "json"})) == (JSON, None)
+
+def test_falls_back_to_json():
+    assert negotiate(FakeWebSocket()) == (JSON, None)
+    assert negotiate(FakeWebSocket(["graphql-ws"], {"format": "protobuf"})) == (JSON, None)
+
+def test_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire_format, "_get_msgpack", lambda: None)
+
+    assert negotiate(FakeWebSocket(["msgpack"], {"format": "msgpack"})) == (JSON, None)
+    with pytest.raises(ValueError):
+        decode_frame(msgpack.packb({"type": "ping"}))
+
+@pytest.mark.parametrize("event", EVENTS, ids=[event["type"] for event in EVENTS])
+def test_event_round_trip(event):
+    packed = MSGPACK.encode(event)
+    assert isinstance(packed, bytes)
+    assert decode_frame(packed) == event
+
+    text = JSON.encode(event)
+    assert isinstance(text, str)
+    assert decode_frame(text) == event
+
+def test_unserializable_values_are_sent_as_strings():
+    event = {"type": "done", "published": datetime(2024, 5, 1, 9, 30)}
+
+    assert decode_frame(MSGPACK.encode(event))["published"] == "2024-05-01 09:30:00"
+    assert decode_frame(JSON.encode(event))["published"] == "2024-05-01 09:30:00"
+
+@pytest.mark.parametrize("payload", [b"\xc1", b"\x92\x01", b"\x81\xa1a\x01\x02"],
+                         ids=["reserved-byte", "truncated", "trailing-data"])
+def test_malformed_binary_frame_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_frame(payload)
+
+def test_malformed_text_frame_raises_value_error():
+    with pytest.raises(json.JSONDecodeError):
+        decode_frame("{\"type\": ")